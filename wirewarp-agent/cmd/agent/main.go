@@ -69,6 +69,7 @@ func main() {
 			log.Fatalf("Failed to initialise server handlers: %v", err)
 		}
 		srv.Register(client.Exec())
+		client.SetAuthInfo(srv.AuthInfo)
 		shutdownFn = srv.Shutdown
 	case "client":
 		cli, err := handlers.NewClient(cfg, *cfgPath)
@@ -7,6 +7,7 @@ import (
 	"log"
 	"os/exec"
 	"strings"
+	"sync"
 
 	"github.com/wirewarp/agent/internal/config"
 	"github.com/wirewarp/agent/internal/executor"
@@ -19,6 +20,15 @@ type ServerHandlers struct {
 	cfgPath string
 	cfg     *config.Config
 	wg      *wireguard.Server
+
+	// Desired-state generation applied since this process started. Kept in
+	// memory only: WireGuard peers do not survive a restart, so a restarted
+	// agent must not claim an old generation and skip the replay.
+	mu           sync.Mutex
+	hasApplied   bool
+	appliedGen   int64
+	appliedHash  string
+	chunkFailure bool // an earlier chunk of the current apply_state failed
 }
 
 // NewServer initialises the WireGuard server from config and returns a handler set.
@@ -76,10 +86,49 @@ func (h *ServerHandlers) Shutdown() {
 // Register binds all server-mode command handlers onto the given executor.
 func (h *ServerHandlers) Register(exec *executor.Executor) {
 	exec.Register("wg_init", h.handleWGInit)
-	exec.Register("wg_add_peer", h.handleAddPeer)
-	exec.Register("wg_remove_peer", h.handleRemovePeer)
-	exec.Register("iptables_add_forward", h.handleAddForward)
-	exec.Register("iptables_remove_forward", h.handleRemoveForward)
+	exec.Register("wg_add_peer", h.tracked(h.handleAddPeer))
+	exec.Register("wg_remove_peer", h.tracked(h.handleRemovePeer))
+	exec.Register("iptables_add_forward", h.tracked(h.handleAddForward))
+	exec.Register("iptables_remove_forward", h.tracked(h.handleRemoveForward))
+	exec.Register("apply_state", h.handleApplyState)
+	exec.Register("report_state", h.handleReportState)
+}
+
+// AuthInfo returns the state generation and hash to report when authenticating,
+// so the control server can skip or shorten the reconnect replay.
+func (h *ServerHandlers) AuthInfo() map[string]any {
+	h.mu.Lock()
+	defer h.mu.Unlock()
+	if !h.hasApplied {
+		return nil
+	}
+	return map[string]any{"generation": h.appliedGen, "state_hash": h.appliedHash}
+}
+
+type stateMeta struct {
+	Generation *int64 `json:"generation"`
+	StateHash  string `json:"state_hash"`
+}
+
+// tracked wraps a single forward/peer command so that, when it carries the
+// generation right after the one already applied, the agent advances to it.
+func (h *ServerHandlers) tracked(fn executor.Handler) executor.Handler {
+	return func(raw json.RawMessage) (string, error) {
+		out, err := fn(raw)
+		if err != nil {
+			return out, err
+		}
+		var meta stateMeta
+		if json.Unmarshal(raw, &meta) == nil && meta.Generation != nil {
+			h.mu.Lock()
+			if h.hasApplied && *meta.Generation == h.appliedGen+1 {
+				h.appliedGen = *meta.Generation
+				h.appliedHash = meta.StateHash
+			}
+			h.mu.Unlock()
+		}
+		return out, nil
+	}
 }
 
 // --- command handlers ---
@@ -113,6 +162,11 @@ func (h *ServerHandlers) handleWGInit(raw json.RawMessage) (string, error) {
 	}
 	h.wg = wgSrv
 
+	// Peers were reset with the interface; whatever generation we had no longer holds
+	h.mu.Lock()
+	h.hasApplied = false
+	h.mu.Unlock()
+
 	// Enable forwarding and NAT so tunnel traffic can reach the internet
 	if err := iptables.EnableIPForward(); err != nil {
 		log.Printf("[server] WARN: %v", err)
@@ -167,10 +221,7 @@ func (h *ServerHandlers) handleAddPeer(raw json.RawMessage) (string, error) {
 	// wg syncconf doesn't add kernel routes like wg-quick does.
 	// Add routes for non-tunnel AllowedIPs (e.g. LAN subnets) so the
 	// VPS can reach LAN devices through the gateway peer.
-	iface := "wg0"
-	if h.cfg.Server != nil && h.cfg.Server.WGInterface != "" {
-		iface = h.cfg.Server.WGInterface
-	}
+	iface := h.wgInterface()
 	for _, subnet := range p.AllowedIPs {
 		if subnet != p.TunnelIP+"/32" {
 			addRouteIfMissing(subnet, iface)
@@ -250,6 +301,168 @@ func (h *ServerHandlers) handleRemoveForward(raw json.RawMessage) (string, error
 	return fmt.Sprintf("forward %s:%d → %s:%d removed", p.Protocol, p.PublicPort, p.DestIP, p.DestPort), nil
 }
 
+type applyStateParams struct {
+	stateMeta
+	Mode           string             `json:"mode"` // "full" | "delta"
+	Chunk          int                `json:"chunk"`
+	Chunks         int                `json:"chunks"`
+	Forwards       []addForwardParams `json:"forwards"`
+	Peers          []addPeerParams    `json:"peers"`
+	RemoveForwards []addForwardParams `json:"remove_forwards"`
+	RemovePeers    []removePeerParams `json:"remove_peers"`
+}
+
+// handleApplyState applies a batch of forwards and peers sent on reconnect,
+// either a full snapshot or a delta of removals and additions. Rules are
+// applied idempotently; iptables rules are saved and the WireGuard config is
+// synced once per batch instead of once per entry. Once the last chunk of a
+// batch applies cleanly the agent records its generation and state hash.
+func (h *ServerHandlers) handleApplyState(raw json.RawMessage) (string, error) {
+	var p applyStateParams
+	if err := json.Unmarshal(raw, &p); err != nil {
+		return "", fmt.Errorf("parse params: %w", err)
+	}
+
+	var failures []string
+
+	publicIP := ""
+	if h.cfg.Server != nil {
+		publicIP = h.cfg.Server.PublicIP
+	}
+	for _, f := range p.RemoveForwards {
+		_ = iptables.RemoveForward(publicIP, iptables.ForwardRule{
+			Protocol:   f.Protocol,
+			PublicPort: f.PublicPort,
+			DestIP:     f.DestIP,
+			DestPort:   f.DestPort,
+		})
+	}
+	if len(p.RemovePeers) > 0 && h.wg != nil {
+		keys := make([]string, 0, len(p.RemovePeers))
+		for _, peer := range p.RemovePeers {
+			keys = append(keys, peer.PublicKey)
+		}
+		if err := h.wg.RemovePeers(keys); err != nil {
+			failures = append(failures, fmt.Sprintf("remove peers: %v", err))
+		}
+	}
+	for _, f := range p.Forwards {
+		if err := iptables.AddForward(publicIP, iptables.ForwardRule{
+			Protocol:   f.Protocol,
+			PublicPort: f.PublicPort,
+			DestIP:     f.DestIP,
+			DestPort:   f.DestPort,
+		}); err != nil {
+			failures = append(failures, fmt.Sprintf("forward %s:%d: %v", f.Protocol, f.PublicPort, err))
+		}
+	}
+	if len(p.Forwards) > 0 || len(p.RemoveForwards) > 0 {
+		if saveErr := iptables.SaveRules(); saveErr != nil {
+			log.Printf("[server] WARN: iptables save failed: %v", saveErr)
+		}
+	}
+
+	if len(p.Peers) > 0 {
+		if h.wg == nil {
+			failures = append(failures, "peers: WireGuard not initialised — send wg_init first")
+		} else {
+			peers := make([]wireguard.Peer, 0, len(p.Peers))
+			for _, peer := range p.Peers {
+				peers = append(peers, wireguard.Peer{
+					Name:       peer.Name,
+					PublicKey:  peer.PublicKey,
+					TunnelIP:   peer.TunnelIP,
+					AllowedIPs: peer.AllowedIPs,
+				})
+			}
+			if err := h.wg.AddPeers(peers); err != nil {
+				failures = append(failures, fmt.Sprintf("peers: %v", err))
+			} else {
+				for _, peer := range p.Peers {
+					for _, subnet := range peer.AllowedIPs {
+						if subnet != peer.TunnelIP+"/32" {
+							addRouteIfMissing(subnet, h.wgInterface())
+						}
+					}
+				}
+			}
+		}
+	}
+
+	h.mu.Lock()
+	if p.Chunk == 0 {
+		h.chunkFailure = false
+	}
+	if len(failures) > 0 {
+		h.chunkFailure = true
+	}
+	if p.Chunk == p.Chunks-1 && !h.chunkFailure && p.Generation != nil {
+		h.hasApplied = true
+		h.appliedGen = *p.Generation
+		h.appliedHash = p.StateHash
+	}
+	h.mu.Unlock()
+
+	summary := fmt.Sprintf("%s state chunk %d/%d: %d forward(s), %d peer(s), %d removal(s)",
+		p.Mode, p.Chunk+1, p.Chunks, len(p.Forwards), len(p.Peers), len(p.RemoveForwards)+len(p.RemovePeers))
+	if len(failures) > 0 {
+		return "", fmt.Errorf("%s; %d failure(s): %s", summary, len(failures), strings.Join(failures, "; "))
+	}
+	return summary + " applied", nil
+}
+
+type stateReport struct {
+	Forwards []addForwardParams `json:"forwards"`
+	Peers    []reportedPeer     `json:"peers"`
+}
+
+type reportedPeer struct {
+	PublicKey  string   `json:"public_key"`
+	AllowedIPs []string `json:"allowed_ips"`
+}
+
+// handleReportState returns the DNAT rules and WireGuard peers actually present
+// on this host, as JSON, so the control server can reconcile them against the DB.
+func (h *ServerHandlers) handleReportState(_ json.RawMessage) (string, error) {
+	report := stateReport{Forwards: []addForwardParams{}, Peers: []reportedPeer{}}
+
+	rules, err := iptables.ListForwards()
+	if err != nil {
+		return "", err
+	}
+	for _, r := range rules {
+		report.Forwards = append(report.Forwards, addForwardParams{
+			Protocol:   r.Protocol,
+			PublicPort: r.PublicPort,
+			DestIP:     r.DestIP,
+			DestPort:   r.DestPort,
+		})
+	}
+
+	if h.wg != nil {
+		peers, err := h.wg.ListPeers()
+		if err != nil {
+			return "", err
+		}
+		for _, p := range peers {
+			report.Peers = append(report.Peers, reportedPeer{PublicKey: p.PublicKey, AllowedIPs: p.AllowedIPs})
+		}
+	}
+
+	out, err := json.Marshal(report)
+	if err != nil {
+		return "", err
+	}
+	return string(out), nil
+}
+
+func (h *ServerHandlers) wgInterface() string {
+	if h.cfg.Server != nil && h.cfg.Server.WGInterface != "" {
+		return h.cfg.Server.WGInterface
+	}
+	return "wg0"
+}
+
 // addRouteIfMissing adds a kernel route for a subnet via a WireGuard interface.
 // Silently ignores "file exists" errors (route already present from wg-quick up).
 func addRouteIfMissing(subnet, iface string) {
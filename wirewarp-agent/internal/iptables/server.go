@@ -36,6 +36,49 @@ func RemoveForward(publicIP string, r ForwardRule) error {
 	return nil
 }
 
+// ListForwards returns the DNAT rules currently in the nat PREROUTING chain.
+func ListForwards() ([]ForwardRule, error) {
+	out, err := exec.Command("iptables", "-t", "nat", "-S", "PREROUTING").Output()
+	if err != nil {
+		return nil, fmt.Errorf("iptables -t nat -S PREROUTING: %w", err)
+	}
+	var rules []ForwardRule
+	for _, line := range strings.Split(string(out), "\n") {
+		if r, ok := parseDNAT(line); ok {
+			rules = append(rules, r)
+		}
+	}
+	return rules, nil
+}
+
+// parseDNAT parses an `iptables -S` line such as
+// "-A PREROUTING -d 1.2.3.4/32 -p tcp -m tcp --dport 80 -j DNAT --to-destination 10.0.0.2:80".
+func parseDNAT(line string) (ForwardRule, bool) {
+	fields := strings.Fields(line)
+	var r ForwardRule
+	isDNAT := false
+	for i := 0; i < len(fields)-1; i++ {
+		switch fields[i] {
+		case "-p":
+			r.Protocol = fields[i+1]
+		case "--dport":
+			fmt.Sscanf(fields[i+1], "%d", &r.PublicPort)
+		case "-j":
+			isDNAT = fields[i+1] == "DNAT"
+		case "--to-destination":
+			host, port, found := strings.Cut(fields[i+1], ":")
+			r.DestIP = host
+			if found {
+				fmt.Sscanf(port, "%d", &r.DestPort)
+			}
+		}
+	}
+	if !isDNAT || r.Protocol == "" || r.PublicPort == 0 || r.DestIP == "" || r.DestPort == 0 {
+		return ForwardRule{}, false
+	}
+	return r, true
+}
+
 // EnsureMasquerade adds a POSTROUTING MASQUERADE rule for the given interface if absent.
 func EnsureMasquerade(iface string) error {
 	args := []string{"-t", "nat", "POSTROUTING", "-o", iface, "-j", "MASQUERADE"}
@@ -3,6 +3,7 @@ package websocket
 import (
 	"context"
 	"encoding/json"
+	"errors"
 	"fmt"
 	"io"
 	"log"
@@ -32,6 +33,7 @@ type Client struct {
 	sendFn   func(v any) error
 	hostname string
 	version  string
+	authInfo func() map[string]any
 }
 
 func New(cfg *config.Config, cfgPath string, version string) *Client {
@@ -47,6 +49,43 @@ func New(cfg *config.Config, cfgPath string, version string) *Client {
 	return c
 }
 
+// handshakeReply is the server's answer to an auth or register message.
+type handshakeReply struct {
+	Type       string  `json:"type"`
+	Message    string  `json:"message"`
+	AgentID    string  `json:"agent_id"`
+	JWT        string  `json:"jwt"`
+	RetryAfter float64 `json:"retry_after"` // seconds, on "retry"
+}
+
+// retryAfterError means the server is busy admitting other agents (e.g. after
+// a restart) and asked us to come back later instead of backing off blindly.
+type retryAfterError struct {
+	after time.Duration
+}
+
+func (e *retryAfterError) Error() string {
+	return fmt.Sprintf("server busy, asked to retry in %s", e.after)
+}
+
+// readHandshake reads the reply to auth/register, turning a retry hint into a retryAfterError.
+func readHandshake(ctx context.Context, conn *websocket.Conn) (handshakeReply, error) {
+	var resp handshakeReply
+	if err := wsjson.Read(ctx, conn, &resp); err != nil {
+		return resp, err
+	}
+	if resp.Type == "retry" {
+		return resp, &retryAfterError{after: time.Duration(resp.RetryAfter * float64(time.Second))}
+	}
+	return resp, nil
+}
+
+// SetAuthInfo registers a function whose fields are added to the auth message
+// on every (re)connect, e.g. the desired-state generation already applied.
+func (c *Client) SetAuthInfo(fn func() map[string]any) {
+	c.authInfo = fn
+}
+
 // Exec returns the executor so callers can register real handlers.
 func (c *Client) Exec() *executor.Executor {
 	return c.exec
@@ -60,6 +99,18 @@ func (c *Client) Run(ctx context.Context) {
 		if ctx.Err() != nil {
 			return
 		}
+		// The server is shedding a reconnect storm: wait for the turn it gave us
+		// (already jittered server-side) rather than our own backoff.
+		var busy *retryAfterError
+		if errors.As(err, &busy) && busy.after > 0 {
+			log.Printf("[ws] %v", err)
+			select {
+			case <-ctx.Done():
+				return
+			case <-time.After(busy.after):
+			}
+			continue
+		}
 		if err != nil {
 			log.Printf("[ws] disconnected: %v — retrying in %s", err, backoff)
 		}
@@ -91,18 +142,24 @@ func (c *Client) connect(ctx context.Context) error {
 	defer func() { c.sendFn = nil }()
 
 	if c.cfg.AgentJWT != "" {
-		if err := send(map[string]string{"type": "auth", "jwt": c.cfg.AgentJWT}); err != nil {
+		auth := map[string]any{"type": "auth", "jwt": c.cfg.AgentJWT}
+		if c.authInfo != nil {
+			for k, v := range c.authInfo() {
+				auth[k] = v
+			}
+		}
+		if err := send(auth); err != nil {
 			return err
 		}
-		var resp map[string]string
-		if err := wsjson.Read(ctx, conn, &resp); err != nil {
+		resp, err := readHandshake(ctx, conn)
+		if err != nil {
 			return err
 		}
-		if resp["type"] != "authenticated" {
+		if resp.Type != "authenticated" {
 			// JWT expired — clear it and re-register on the next attempt
 			c.cfg.AgentJWT = ""
 			_ = c.cfg.Save(c.cfgPath)
-			return fmt.Errorf("auth rejected: %s", resp["message"])
+			return fmt.Errorf("auth rejected: %s", resp.Message)
 		}
 		log.Printf("[ws] authenticated as agent %s", c.cfg.AgentID)
 	} else {
@@ -114,15 +171,15 @@ func (c *Client) connect(ctx context.Context) error {
 		}); err != nil {
 			return err
 		}
-		var resp map[string]string
-		if err := wsjson.Read(ctx, conn, &resp); err != nil {
+		resp, err := readHandshake(ctx, conn)
+		if err != nil {
 			return err
 		}
-		if resp["type"] != "registered" {
-			return fmt.Errorf("registration failed: %s", resp["message"])
+		if resp.Type != "registered" {
+			return fmt.Errorf("registration failed: %s", resp.Message)
 		}
-		c.cfg.AgentID = resp["agent_id"]
-		c.cfg.AgentJWT = resp["jwt"]
+		c.cfg.AgentID = resp.AgentID
+		c.cfg.AgentJWT = resp.JWT
 		c.cfg.AgentToken = ""
 		if err := c.cfg.Save(c.cfgPath); err != nil {
 			log.Printf("[ws] warning: failed to save config: %v", err)
@@ -166,6 +223,20 @@ func (c *Client) connect(ctx context.Context) error {
 				log.Printf("[ws] failed to unmarshal command: %v", err)
 				continue
 			}
+			if cmd.Type == "batch" {
+				// Commands queued while we were offline, delivered in order
+				var batch struct {
+					Commands []executor.Command `json:"commands"`
+				}
+				if err := json.Unmarshal(raw, &batch); err != nil {
+					log.Printf("[ws] failed to unmarshal command batch: %v", err)
+					continue
+				}
+				for _, queued := range batch.Commands {
+					c.exec.Dispatch(queued)
+				}
+				continue
+			}
 			c.exec.Dispatch(cmd)
 		}
 	}()
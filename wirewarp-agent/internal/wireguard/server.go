@@ -84,6 +84,29 @@ func (s *Server) AddPeer(p Peer) error {
 	return wgSyncConf(s.cfg.Interface, configFile)
 }
 
+// AddPeers adds or replaces several peers and syncs the config once.
+func (s *Server) AddPeers(peers []Peer) error {
+	for _, p := range peers {
+		s.peers[p.PublicKey] = p
+	}
+	if err := s.writeConfig(); err != nil {
+		return err
+	}
+	return wgSyncConf(s.cfg.Interface, configFile)
+}
+
+// RemovePeers removes any of the given peers that are present and syncs the config once.
+// Unknown keys are ignored.
+func (s *Server) RemovePeers(publicKeys []string) error {
+	for _, k := range publicKeys {
+		delete(s.peers, k)
+	}
+	if err := s.writeConfig(); err != nil {
+		return err
+	}
+	return wgSyncConf(s.cfg.Interface, configFile)
+}
+
 // RemovePeer removes a peer by public key and syncs the config.
 func (s *Server) RemovePeer(publicKey string) error {
 	if _, ok := s.peers[publicKey]; !ok {
@@ -96,6 +119,30 @@ func (s *Server) RemovePeer(publicKey string) error {
 	return wgSyncConf(s.cfg.Interface, configFile)
 }
 
+// ListPeers returns the peers currently configured on the interface, as seen
+// by `wg show <iface> allowed-ips` (Name is not known to the kernel and is empty).
+func (s *Server) ListPeers() ([]Peer, error) {
+	out, err := exec.Command("wg", "show", s.cfg.Interface, "allowed-ips").Output()
+	if err != nil {
+		return nil, fmt.Errorf("wg show %s allowed-ips: %w", s.cfg.Interface, err)
+	}
+	var peers []Peer
+	for _, line := range strings.Split(strings.TrimSpace(string(out)), "\n") {
+		fields := strings.Fields(line)
+		if len(fields) == 0 {
+			continue
+		}
+		p := Peer{PublicKey: fields[0]}
+		for _, ip := range fields[1:] {
+			if ip != "(none)" {
+				p.AllowedIPs = append(p.AllowedIPs, ip)
+			}
+		}
+		peers = append(peers, p)
+	}
+	return peers, nil
+}
+
 // Down tears down the WireGuard interface.
 func (s *Server) Down() error {
 	return wgQuickDown(s.cfg.Interface)
@@ -0,0 +1,42 @@
+"""Add desired-state generations and the state_changes journal
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("tunnel_servers", sa.Column("state_generation", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("tunnel_servers", sa.Column("state_hash", sa.String(), nullable=True))
+
+    op.create_table(
+        "state_changes",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("tunnel_server_id", postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey("tunnel_servers.id", ondelete="CASCADE")),
+        sa.Column("generation", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("op", sa.String(), nullable=False),
+        sa.Column("params", postgresql.JSONB()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_state_changes_server_generation", "state_changes", ["tunnel_server_id", "generation"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_state_changes_server_generation", table_name="state_changes")
+    op.drop_table("state_changes")
+    op.drop_column("tunnel_servers", "state_hash")
+    op.drop_column("tunnel_servers", "state_generation")
@@ -0,0 +1,36 @@
+"""Add agent_outbox for commands sent to offline agents
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "agent_outbox",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("agent_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("agents.id", ondelete="CASCADE")),
+        sa.Column("command_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("command_type", sa.String(), nullable=False),
+        sa.Column("params", postgresql.JSONB()),
+        sa.Column("coalesce_key", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_agent_outbox_agent_id_id", "agent_outbox", ["agent_id", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_agent_outbox_agent_id_id", table_name="agent_outbox")
+    op.drop_table("agent_outbox")
@@ -0,0 +1,91 @@
+"""Range-partition metrics by day on timestamp
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16
+
+"""
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created up front beyond today; the server keeps extending this
+DAYS_AHEAD = 3
+# Samples older than the server's retention window would be dropped by its first
+# partition maintenance run anyway, so they are not carried over
+RETENTION_DAYS = int(os.environ.get("METRICS_RETENTION_DAYS", "30"))
+
+
+def _create_partition(day: date) -> None:
+    op.execute(
+        f"CREATE TABLE metrics_p{day:%Y%m%d} PARTITION OF metrics "
+        f"FOR VALUES FROM ('{day.isoformat()} 00:00:00+00') TO ('{day + timedelta(days=1)} 00:00:00+00')"
+    )
+
+
+def upgrade() -> None:
+    op.rename_table("metrics", "metrics_unpartitioned")
+    # Free the names the new table's sequence and primary key will use
+    op.execute("ALTER SEQUENCE metrics_id_seq RENAME TO metrics_unpartitioned_id_seq")
+    op.execute("ALTER INDEX metrics_pkey RENAME TO metrics_unpartitioned_pkey")
+
+    op.create_table(
+        "metrics",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("agent_id", postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey("agents.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("data", postgresql.JSONB(), nullable=False),
+        sa.PrimaryKeyConstraint("id", "timestamp"),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    op.create_index("ix_metrics_agent_id_timestamp", "metrics", ["agent_id", "timestamp"])
+
+    # One partition per day from the oldest retained sample up to DAYS_AHEAD
+    today = datetime.now(timezone.utc).date()
+    cutoff = today - timedelta(days=RETENTION_DAYS)
+    oldest = op.get_bind().execute(
+        sa.text("SELECT min(timestamp) FROM metrics_unpartitioned WHERE timestamp >= :cutoff"),
+        {"cutoff": datetime.combine(cutoff, datetime.min.time(), tzinfo=timezone.utc)},
+    ).scalar()
+    start = min(oldest.astimezone(timezone.utc).date(), today) if oldest else today
+    day = start
+    while day <= today + timedelta(days=DAYS_AHEAD):
+        _create_partition(day)
+        day += timedelta(days=1)
+    op.execute("CREATE TABLE metrics_default PARTITION OF metrics DEFAULT")
+
+    op.execute(
+        "INSERT INTO metrics (agent_id, timestamp, data) "
+        "SELECT agent_id, timestamp, data FROM metrics_unpartitioned "
+        f"WHERE agent_id IS NOT NULL AND timestamp >= '{cutoff.isoformat()} 00:00:00+00' ORDER BY id"
+    )
+    op.drop_table("metrics_unpartitioned")
+
+
+def downgrade() -> None:
+    op.rename_table("metrics", "metrics_partitioned")
+    op.execute("ALTER SEQUENCE metrics_id_seq RENAME TO metrics_partitioned_id_seq")
+    op.execute("ALTER INDEX metrics_pkey RENAME TO metrics_partitioned_pkey")
+    op.create_table(
+        "metrics",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("agent_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("agents.id", ondelete="CASCADE")),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("data", postgresql.JSONB(), nullable=False),
+    )
+    op.execute(
+        "INSERT INTO metrics (agent_id, timestamp, data) "
+        "SELECT agent_id, timestamp, data FROM metrics_partitioned ORDER BY timestamp, id"
+    )
+    # Dropping the parent drops every partition with it
+    op.drop_table("metrics_partitioned")
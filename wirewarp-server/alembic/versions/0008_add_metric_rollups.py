@@ -0,0 +1,46 @@
+"""Add metric_rollups for downsampled metrics queries
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "metric_rollups",
+        sa.Column("agent_id", postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey("agents.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("resolution", sa.String(), primary_key=True),
+        sa.Column("bucket", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("samples", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cpu_min", sa.Float()),
+        sa.Column("cpu_max", sa.Float()),
+        sa.Column("cpu_sum", sa.Float()),
+        sa.Column("cpu_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("mem_min", sa.Float()),
+        sa.Column("mem_max", sa.Float()),
+        sa.Column("mem_sum", sa.Float()),
+        sa.Column("mem_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("disk_min", sa.Float()),
+        sa.Column("disk_max", sa.Float()),
+        sa.Column("disk_sum", sa.Float()),
+        sa.Column("disk_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("rx_bytes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("tx_bytes", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("metric_rollups")
@@ -0,0 +1,51 @@
+"""Add peer_traffic, per-peer counters split out of metrics
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-16
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created up front beyond today; the server keeps extending this
+DAYS_AHEAD = 3
+
+
+def upgrade() -> None:
+    op.create_table(
+        "peer_traffic",
+        sa.Column("tunnel_client_id", postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey("tunnel_clients.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("rx_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("tx_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("rx_delta", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("tx_delta", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("last_handshake", sa.DateTime(timezone=True)),
+        sa.PrimaryKeyConstraint("tunnel_client_id", "timestamp"),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    op.create_index("ix_peer_traffic_timestamp", "peer_traffic", ["timestamp"])
+
+    today = datetime.now(timezone.utc).date()
+    for offset in range(DAYS_AHEAD + 1):
+        day = today + timedelta(days=offset)
+        op.execute(
+            f"CREATE TABLE peer_traffic_p{day:%Y%m%d} PARTITION OF peer_traffic "
+            f"FOR VALUES FROM ('{day.isoformat()} 00:00:00+00') TO ('{day + timedelta(days=1)} 00:00:00+00')"
+        )
+    op.execute("CREATE TABLE peer_traffic_default PARTITION OF peer_traffic DEFAULT")
+
+
+def downgrade() -> None:
+    op.drop_table("peer_traffic")
@@ -0,0 +1,52 @@
+"""Add alert_rules and alerts
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "alert_rules",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("name", sa.String(), unique=True, nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("threshold", sa.Float(), nullable=False),
+        sa.Column("duration_seconds", sa.Integer(), server_default="0"),
+        sa.Column("enabled", sa.Boolean(), server_default="true"),
+        sa.Column("is_builtin", sa.Boolean(), server_default="false"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "alerts",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("rule_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("alert_rules.id", ondelete="CASCADE")),
+        sa.Column("agent_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("agents.id", ondelete="CASCADE")),
+        sa.Column("subject", sa.String()),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("value", sa.Float()),
+        sa.Column("message", sa.String(), nullable=False),
+        sa.Column("fired_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("resolved_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_alerts_state_fired_at", "alerts", ["state", "fired_at"])
+    op.create_index("ix_alerts_rule_agent_subject", "alerts", ["rule_id", "agent_id", "subject"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alerts_rule_agent_subject", table_name="alerts")
+    op.drop_index("ix_alerts_state_fired_at", table_name="alerts")
+    op.drop_table("alerts")
+    op.drop_table("alert_rules")
@@ -0,0 +1,43 @@
+"""Add keyset pagination indexes on list endpoints
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PAGINATED_TABLES = ("agents", "tunnel_servers", "tunnel_clients", "port_forwards")
+
+INDEXES = [
+    ("ix_agents_created_at_id", "agents", ["created_at", "id"]),
+    ("ix_agents_status_created_at_id", "agents", ["status", "created_at", "id"]),
+    ("ix_tunnel_servers_created_at_id", "tunnel_servers", ["created_at", "id"]),
+    ("ix_tunnel_clients_created_at_id", "tunnel_clients", ["created_at", "id"]),
+    ("ix_tunnel_clients_tunnel_server_id_created_at_id", "tunnel_clients", ["tunnel_server_id", "created_at", "id"]),
+    ("ix_port_forwards_created_at_id", "port_forwards", ["created_at", "id"]),
+    ("ix_port_forwards_tunnel_server_id_created_at_id", "port_forwards", ["tunnel_server_id", "created_at", "id"]),
+]
+
+
+def upgrade() -> None:
+    # The (created_at, id) cursor comparison skips NULLs, so created_at must always be set
+    for table in PAGINATED_TABLES:
+        op.execute(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL")
+        op.alter_column(table, "created_at", nullable=False)
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    for table in PAGINATED_TABLES:
+        op.alter_column(table, "created_at", nullable=True)
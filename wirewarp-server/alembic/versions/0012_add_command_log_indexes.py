@@ -0,0 +1,34 @@
+"""Add command_log indexes for the command query API
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0012"
+down_revision: Union[str, None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The (executed_at, id) cursor comparison skips NULLs, so executed_at must always be set
+    op.execute("UPDATE command_log SET executed_at = now() WHERE executed_at IS NULL")
+    op.alter_column("command_log", "executed_at", nullable=False)
+    op.create_index("ix_command_log_executed_at_id", "command_log", ["executed_at", "id"])
+    op.create_index("ix_command_log_agent_id_executed_at_id", "command_log", ["agent_id", "executed_at", "id"])
+    op.create_index(
+        "ix_command_log_pending", "command_log", ["executed_at"], postgresql_where=sa.text("success IS NULL")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_command_log_pending", table_name="command_log")
+    op.drop_index("ix_command_log_agent_id_executed_at_id", table_name="command_log")
+    op.drop_index("ix_command_log_executed_at_id", table_name="command_log")
+    op.alter_column("command_log", "executed_at", nullable=True)
@@ -0,0 +1,41 @@
+"""Move large command outputs to command_outputs; index for command_log retention
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0013"
+down_revision: Union[str, None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("command_log", sa.Column("output_external", sa.Boolean(), server_default="false", nullable=False))
+    op.create_table(
+        "command_outputs",
+        sa.Column(
+            "command_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("command_log.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+    )
+    op.create_index(
+        "ix_command_log_agent_id_command_type_executed_at", "command_log", ["agent_id", "command_type", "executed_at"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_command_log_agent_id_command_type_executed_at", table_name="command_log")
+    op.drop_table("command_outputs")
+    op.drop_column("command_log", "output_external")
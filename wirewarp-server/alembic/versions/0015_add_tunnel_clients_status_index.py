@@ -0,0 +1,23 @@
+"""Add the tunnel_clients status index for filtered keyset pagination
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-16
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0015"
+down_revision: Union[str, None] = "0014"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_tunnel_clients_status_created_at_id", "tunnel_clients", ["status", "created_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tunnel_clients_status_created_at_id", table_name="tunnel_clients")
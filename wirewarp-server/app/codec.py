@@ -0,0 +1,78 @@
+import json
+import logging
+import uuid
+from datetime import date, datetime
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib codec is used instead
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _default(obj: Any) -> Any:
+    # What orjson serializes natively, so both codecs accept the same payloads
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class StdlibCodec:
+    name = "json"
+
+    def dumps(self, obj: Any, default: Callable[[Any], Any] | None = None) -> str:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=default or _default)
+
+    def dumpb(self, obj: Any, default: Callable[[Any], Any] | None = None) -> bytes:
+        return self.dumps(obj, default).encode()
+
+    def loads(self, data: str | bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def dumps(self, obj: Any, default: Callable[[Any], Any] | None = None) -> str:
+        return orjson.dumps(obj, default=default).decode()
+
+    def dumpb(self, obj: Any, default: Callable[[Any], Any] | None = None) -> bytes:
+        return orjson.dumps(obj, default=default)
+
+    def loads(self, data: str | bytes) -> Any:
+        return orjson.loads(data)
+
+
+# Raised by both codecs on malformed input (orjson.JSONDecodeError subclasses it)
+DecodeError = json.JSONDecodeError
+
+
+def get_codec(name: str = "auto") -> StdlibCodec | OrjsonCodec:
+    """'orjson', 'json', or 'auto' for orjson when it is installed."""
+    if name == "json" or (name == "auto" and orjson is None):
+        return StdlibCodec()
+    if name in ("auto", "orjson"):
+        if orjson is None:
+            logger.warning("JSON_CODEC=orjson but orjson is not installed — using the stdlib codec")
+            return StdlibCodec()
+        return OrjsonCodec()
+    raise ValueError(f"Unknown JSON codec: {name}")
+
+
+# Module-level codec for agent frames and REST responses
+codec = get_codec(settings.JSON_CODEC)
+
+
+class CodecJSONResponse(JSONResponse):
+    """Default response class: renders through the configured codec instead of json.dumps."""
+
+    def render(self, content: Any) -> bytes:
+        return codec.dumpb(content)
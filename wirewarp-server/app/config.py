@@ -7,6 +7,98 @@ class Settings(BaseSettings):
     AGENT_TOKEN_EXPIRY_HOURS: int = 24
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
 
+    # Per-agent outbound WebSocket queues
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SEND_OVERFLOW_POLICY: str = "drop"  # drop | disconnect | block (send waits for room)
+    WS_SEND_BLOCK_TIMEOUT: float = 2.0  # seconds, only used by the "block" policy
+    WS_BROADCAST_TIMEOUT: float = 5.0  # seconds per agent
+    # JSON codec for agent frames and REST responses: auto (orjson if installed) | orjson | json
+    JSON_CODEC: str = "auto"
+    # Inbound frames already buffered are dispatched together, in one transaction, up to this many
+    WS_DISPATCH_BATCH_SIZE: int = 100
+
+    # Max forwards + peers per apply_state frame on reconnect replay
+    STATE_REPLAY_CHUNK_SIZE: int = 1000
+    # Generations of forward/peer changes kept per server for delta replay
+    STATE_JOURNAL_MAX_GENERATIONS: int = 500
+    # How often connected server agents are asked to report their rules for reconciliation
+    RECONCILE_INTERVAL_SECONDS: int = 300
+    # Queued commands per frame when draining an agent's outbox on reconnect
+    OUTBOX_BATCH_SIZE: int = 100
+
+    # Sent commands with no command_result after this long are marked failed
+    COMMAND_TIMEOUT_SECONDS: int = 120
+    COMMAND_SWEEP_INTERVAL_SECONDS: int = 10
+    COMMAND_WAIT_MAX_SECONDS: float = 30.0  # cap for ?wait= on REST endpoints
+
+    # How often in-memory agent last_seen timestamps are flushed to the agents table
+    PRESENCE_FLUSH_INTERVAL_SECONDS: int = 5
+    # The API shows last_seen to this resolution, so the agents list (and its ETag) changes at most this often
+    PRESENCE_LAST_SEEN_RESOLUTION_SECONDS: int = 60
+
+    # Metrics ingestion: samples are queued and written in bulk by a background task
+    METRICS_QUEUE_SIZE: int = 10000  # samples beyond this are dropped
+    METRICS_BATCH_SIZE: int = 500
+    METRICS_FLUSH_INTERVAL: float = 2.0  # seconds
+
+    # Daily metrics and peer_traffic partitions: kept this many days, created this many days ahead
+    METRICS_RETENTION_DAYS: int = 30
+    PARTITIONS_AHEAD_DAYS: int = 3
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+
+    # Metrics rollup retention per resolution (0 keeps forever)
+    ROLLUP_1M_RETENTION_DAYS: int = 7
+    ROLLUP_1H_RETENTION_DAYS: int = 180
+    ROLLUP_1D_RETENTION_DAYS: int = 0
+    METRICS_QUERY_MAX_POINTS: int = 500
+
+    # In-memory ring buffers behind /api/metrics/{agent_id}/live
+    LIVE_METRICS_WINDOW_SECONDS: int = 3600
+    LIVE_METRICS_SAMPLE_SECONDS: int = 10  # expected agent metrics interval
+
+    # Fleet traffic view: peers unreported this long are ignored, handshakes older than this are stale
+    FLEET_PEER_TTL_SECONDS: int = 600
+    FLEET_STALE_HANDSHAKE_SECONDS: int = 180
+
+    # Fired/resolved alert transitions waiting to be stored
+    ALERT_QUEUE_SIZE: int = 10000
+
+    # /ws/dashboard: events within this window are merged into one frame; slower tabs are dropped
+    DASHBOARD_COALESCE_SECONDS: float = 0.25
+    DASHBOARD_QUEUE_SIZE: int = 256  # frames buffered per browser tab
+
+    # Identical list reads share one query; the serialized result is reused this long unless a write lands
+    READ_CACHE_TTL_SECONDS: float = 1.0
+
+    # Keyset-paginated list endpoints: rows per page by default and at most
+    LIST_PAGE_SIZE: int = 200
+    LIST_PAGE_SIZE_MAX: int = 1000
+
+    # command_log retention: results older than this are pruned, except the latest N per agent and command type
+    COMMAND_LOG_RETENTION_DAYS: int = 30  # 0 disables pruning
+    COMMAND_LOG_KEEP_PER_TYPE: int = 20
+    COMMAND_LOG_PRUNE_BATCH: int = 1000  # rows deleted per transaction
+    COMMAND_LOG_PRUNE_INTERVAL_SECONDS: int = 3600
+    # Outputs longer than this many characters are compressed into command_outputs
+    COMMAND_OUTPUT_INLINE_MAX: int = 4096
+
+    # Cross-worker relay over Postgres LISTEN/NOTIFY, needed when running more than one
+    # uvicorn worker (WEB_CONCURRENCY); may be turned off for a single worker
+    RELAY_ENABLED: bool = True
+    # Seconds to wait for the owning worker to queue a relayed send; kept above
+    # WS_SEND_BLOCK_TIMEOUT so a full queue under the "block" policy is not mistaken for a dead worker
+    RELAY_ACK_TIMEOUT: float = 3.0
+    RELAY_MAINTENANCE_INTERVAL_SECONDS: int = 60
+    RELAY_MESSAGE_TTL_SECONDS: int = 300  # oversized broadcast messages are kept this long
+
+    # /ws/agent admission: agents authenticating and replaying state at once (kept below the DB
+    # pool size so connected agents and the API still get connections); more wait in a FIFO
+    # queue, and past that are sent a retry_after hint spacing them out behind the backlog
+    ADMISSION_MAX_ACTIVE: int = 10
+    ADMISSION_MAX_WAITING: int = 200
+    ADMISSION_RETRY_MIN_SECONDS: float = 2.0
+    ADMISSION_RETRY_JITTER: float = 1.0  # seconds; hints are randomly up to this much earlier or later
+
     model_config = {"env_file": ".env"}
 
 
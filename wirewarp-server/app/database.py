@@ -1,3 +1,6 @@
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
@@ -15,3 +18,22 @@ class Base(DeclarativeBase):
 async def get_db():
     async with SessionLocal() as session:
         yield session
+
+
+# Advisory lock keys for work that only one worker may run at a time
+SCHEMA_LOCK = 0x77770001  # create_all, partition DDL, built-in rule seeding
+
+
+@asynccontextmanager
+async def advisory_lock(key: int):
+    """Hold a Postgres session-level advisory lock on a dedicated connection, waiting for it if taken.
+
+    Sessions used inside the block may commit freely; the lock lives on its own
+    connection rather than one the pool hands back between transactions.
+    """
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": key})
+        try:
+            yield
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
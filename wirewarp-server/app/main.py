@@ -1,6 +1,5 @@
-import json
+import asyncio
 import logging
-import os
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -10,25 +9,68 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
-from app.database import engine, Base, SessionLocal
-from app.routers import auth, agents, tunnel_servers, tunnel_clients, port_forwards, service_templates, settings
+from app import config
+from app.codec import codec, CodecJSONResponse, DecodeError
+from app.database import engine, Base, SessionLocal, SCHEMA_LOCK, advisory_lock
+from app.routers import auth, agents, tunnel_servers, tunnel_clients, port_forwards, service_templates, settings, commands, metrics, fleet, alerts
+from app.websocket.dashboard import dashboard
 from app.websocket.hub import manager
+from app.websocket.relay import relay
 from app.websocket.handlers import dispatch
-from app.services.agent_commands import send_command
+from app.websocket.unit_of_work import AgentContext, UnitOfWork, next_batch
+from app.services import outbox
+from app.services.admission import admission, AdmissionRejected
+from app.services.agent_state import sync_agent_state
+from app.services.alerts import alerts as alert_pipeline
+from app.services.command_log import run_command_log_retention
+from app.services.metrics import metrics_ingest
+from app.services.partitions import maintain_partitions, run_partition_maintenance
+from app.services.pending_commands import run_timeout_sweeper
+from app.services.presence import presence, flush_presence, run_presence_flusher
+from app.services.reconciler import request_state_report, run_periodic_reconcile
 
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create tables on startup (migrations handle production schema)
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Every uvicorn worker runs this; schema creation and built-in rule seeding
+    # take turns so concurrent workers do not race on DDL or unique names
+    async with advisory_lock(SCHEMA_LOCK):
+        # Create tables on startup (migrations handle production schema)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with SessionLocal() as db:
+            await alert_pipeline.load(db)
+    # Partitioned tables need today's partition before the first insert (takes the lock itself)
+    await maintain_partitions()
+    await relay.start()
+    background = [
+        asyncio.create_task(run_periodic_reconcile(), name="reconcile"),
+        asyncio.create_task(run_timeout_sweeper(), name="command-timeouts"),
+        asyncio.create_task(run_presence_flusher(), name="presence"),
+        asyncio.create_task(metrics_ingest.run(), name="metrics-ingest"),
+        asyncio.create_task(run_partition_maintenance(), name="partitions"),
+        asyncio.create_task(alert_pipeline.run(), name="alerts"),
+        asyncio.create_task(run_command_log_retention(), name="command-log-retention"),
+        asyncio.create_task(relay.run(), name="relay"),
+    ]
     yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await flush_presence()
+    await metrics_ingest.drain()
+    await relay.stop()
     await engine.dispose()
 
 
-app = FastAPI(title="WireWarp Control Server", version="0.1.0", lifespan=lifespan)
+app = FastAPI(
+    title="WireWarp Control Server",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=CodecJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -45,6 +87,10 @@ app.include_router(tunnel_clients.router, prefix="/api/tunnel-clients", tags=["t
 app.include_router(port_forwards.router, prefix="/api/port-forwards", tags=["port-forwards"])
 app.include_router(service_templates.router, prefix="/api/service-templates", tags=["service-templates"])
 app.include_router(settings.router, prefix="/api/settings", tags=["settings"])
+app.include_router(commands.router, prefix="/api/commands", tags=["commands"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
+app.include_router(fleet.router, prefix="/api/fleet", tags=["fleet"])
+app.include_router(alerts.router, prefix="/api/alerts", tags=["alerts"])
 
 
 @app.get("/api/health")
@@ -63,182 +109,233 @@ async def agent_websocket(websocket: WebSocket):
 
     await websocket.accept()
     agent_id: str | None = None
+    agent_type: str | None = None
+    # Desired-state generation and hash the agent reports having applied (auth only)
+    reported_generation: int | None = None
+    reported_hash: str | None = None
 
     try:
         # First message must be either registration (token) or auth (jwt)
         raw = await websocket.receive_text()
-        msg = json.loads(raw)
+        msg = codec.loads(raw)
         msg_type = msg.get("type")
 
-        async with SessionLocal() as db:
-            if msg_type == "register":
-                # First-run: validate token, create agent record, issue JWT
-                token_str = msg.get("token", "")
-                hostname = msg.get("hostname", "")
-                agent_type = msg.get("agent_type", "")  # 'server' | 'client'
-
-                result = await db.execute(
-                    select(RegistrationToken).where(RegistrationToken.token == token_str)
-                )
-                token = result.scalar_one_or_none()
-
-                if (
-                    token is None
-                    or token.used
-                    or token.expires_at.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc)
-                ):
-                    await websocket.send_text(json.dumps({"type": "error", "message": "Invalid or expired token"}))
-                    await websocket.close()
-                    return
+        # Authentication and the state replay below hit the DB hard; after a server
+        # restart every agent reconnects at once, so only a bounded number run them
+        # concurrently and the rest queue in arrival order (or are told to retry later)
+        async with admission.slot():
+            async with SessionLocal() as db:
+                if msg_type == "register":
+                    # First-run: validate token, create agent record, issue JWT
+                    token_str = msg.get("token", "")
+                    hostname = msg.get("hostname", "")
+                    agent_type = msg.get("agent_type", "")  # 'server' | 'client'
+
+                    result = await db.execute(
+                        select(RegistrationToken).where(RegistrationToken.token == token_str)
+                    )
+                    token = result.scalar_one_or_none()
+
+                    if (
+                        token is None
+                        or token.used
+                        or token.expires_at.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc)
+                    ):
+                        await websocket.send_text(codec.dumps({"type": "error", "message": "Invalid or expired token"}))
+                        await websocket.close()
+                        return
+
+                    # Create agent
+                    agent = Agent(
+                        name=hostname or f"agent-{token_str[:8]}",
+                        type=token.agent_type,
+                        hostname=hostname,
+                        status="connected",
+                        last_seen=datetime.now(timezone.utc),
+                    )
+                    db.add(agent)
+                    token.used = True
 
-                # Create agent
-                agent = Agent(
-                    name=hostname or f"agent-{token_str[:8]}",
-                    type=token.agent_type,
-                    hostname=hostname,
-                    status="connected",
-                    last_seen=datetime.now(timezone.utc),
-                )
-                db.add(agent)
-                token.used = True
-
-                # Create the type-specific config record
-                if token.agent_type == "server":
-                    db.add(TunnelServer(agent=agent))
-                elif token.agent_type == "client":
-                    db.add(TunnelClient(agent=agent))
-
-                await db.commit()
-                await db.refresh(agent)
-                agent_id = str(agent.id)
-
-                from app.auth import create_access_token
-                jwt = create_access_token(agent_id, expires_delta=timedelta(days=3650))
-                await websocket.send_text(json.dumps({"type": "registered", "agent_id": agent_id, "jwt": jwt}))
-
-            elif msg_type == "auth":
-                # Reconnect: validate JWT
-                jwt = msg.get("jwt", "")
-                try:
-                    agent_id = decode_token(jwt)
-                except Exception:
-                    await websocket.send_text(json.dumps({"type": "error", "message": "Invalid JWT"}))
-                    await websocket.close()
-                    return
+                    # Create the type-specific config record
+                    if token.agent_type == "server":
+                        db.add(TunnelServer(agent=agent))
+                    elif token.agent_type == "client":
+                        db.add(TunnelClient(agent=agent))
+
+                    await db.commit()
+                    await db.refresh(agent)
+                    agent_id = str(agent.id)
+                    agent_type = agent.type
+                    presence.seed(agent_id, agent.version, agent.public_ip)
+
+                    from app.auth import create_access_token
+                    jwt = create_access_token(agent_id, expires_delta=timedelta(days=3650))
+                    await websocket.send_text(codec.dumps({"type": "registered", "agent_id": agent_id, "jwt": jwt}))
+
+                elif msg_type == "auth":
+                    # Reconnect: validate JWT
+                    jwt = msg.get("jwt", "")
+                    try:
+                        agent_id = decode_token(jwt)
+                    except Exception:
+                        await websocket.send_text(codec.dumps({"type": "error", "message": "Invalid JWT"}))
+                        await websocket.close()
+                        return
+
+                    result = await db.execute(select(Agent).where(Agent.id == agent_id))
+                    agent = result.scalar_one_or_none()
+                    if agent is None:
+                        await websocket.send_text(codec.dumps({"type": "error", "message": "Agent not found"}))
+                        await websocket.close()
+                        return
+
+                    agent.status = "connected"
+                    agent.last_seen = datetime.now(timezone.utc)
+                    agent_type = agent.type
+                    if isinstance(msg.get("generation"), int):
+                        reported_generation = msg["generation"]
+                    reported_hash = msg.get("state_hash") or None
+                    await db.commit()
+                    presence.seed(agent_id, agent.version, agent.public_ip)
+                    await websocket.send_text(codec.dumps({"type": "authenticated"}))
 
-                result = await db.execute(select(Agent).where(Agent.id == agent_id))
-                agent = result.scalar_one_or_none()
-                if agent is None:
-                    await websocket.send_text(json.dumps({"type": "error", "message": "Agent not found"}))
+                else:
+                    await websocket.send_text(codec.dumps({"type": "error", "message": "Expected register or auth message"}))
                     await websocket.close()
                     return
 
-                agent.status = "connected"
-                agent.last_seen = datetime.now(timezone.utc)
-                await db.commit()
-                await websocket.send_text(json.dumps({"type": "authenticated"}))
-
-            else:
-                await websocket.send_text(json.dumps({"type": "error", "message": "Expected register or auth message"}))
-                await websocket.close()
+            if agent_id is None:
                 return
 
-        if agent_id is None:
-            return
-
-        await manager.connect(agent_id, websocket)
-        logger.info("Agent %s connected", agent_id)
-
-        # Replay active port forwards to server agents on (re)connect so rules
-        # are applied even if the agent restarted or missed earlier commands.
-        async with SessionLocal() as db:
-            from app.models.tunnel_server import TunnelServer
-            from app.models.port_forward import PortForward
-            result = await db.execute(
-                select(TunnelServer).where(TunnelServer.agent_id == agent_id)
-            )
-            server = result.scalar_one_or_none()
-            if server:
-                pf_result = await db.execute(
-                    select(PortForward).where(
-                        PortForward.tunnel_server_id == server.id,
-                        PortForward.active == True,  # noqa: E712
-                    )
-                )
-                active_forwards = pf_result.scalars().all()
-                for pf in active_forwards:
-                    await send_command(
-                        agent_id=agent_id,
-                        command_type="iptables_add_forward",
-                        params={
-                            "protocol": pf.protocol,
-                            "public_port": pf.public_port,
-                            "destination_ip": pf.destination_ip,
-                            "destination_port": pf.destination_port,
-                        },
-                        db=db,
-                    )
-                logger.info(
-                    "Replayed %d active port forward(s) to server agent %s",
-                    len(active_forwards), agent_id,
-                )
-
-                # Replay wg_add_peer for all configured clients to restore peer config and LAN routes
-                from app.models.tunnel_client import TunnelClient
-                clients_result = await db.execute(
-                    select(TunnelClient).where(
-                        TunnelClient.tunnel_server_id == server.id,
-                        TunnelClient.wg_public_key.is_not(None),
-                        TunnelClient.tunnel_ip.is_not(None),
-                    )
-                )
-                clients = clients_result.scalars().all()
-                for client in clients:
-                    allowed_ips = [client.tunnel_ip + "/32"]
-                    if client.is_gateway and client.vm_network:
-                        allowed_ips.append(client.vm_network)
-                    await send_command(
-                        agent_id=agent_id,
-                        command_type="wg_add_peer",
-                        params={
-                            "peer_name": f"client-{client.tunnel_ip}",
-                            "public_key": client.wg_public_key,
-                            "tunnel_ip": client.tunnel_ip,
-                            "allowed_ips": allowed_ips,
-                        },
-                        db=db,
-                    )
-                logger.info(
-                    "Replayed %d peer(s) to server agent %s",
-                    len(clients), agent_id,
-                )
-
-        # Main message loop
+            # Held until the outbox below is drained: sends for this agent that
+            # arrive meanwhile wait rather than overtake older queued commands
+            await manager.connect(agent_id, websocket, agent_type, held=True)
+            try:
+                await relay.route(agent_id)
+                logger.info("Agent %s connected", agent_id)
+                from app.schemas.agent import AgentRead
+                dashboard.publish("agent_status", agent_id, AgentRead.model_validate(agent).model_dump(mode="json"))
+
+                # Deliver commands queued while the agent was offline (e.g. wg_init,
+                # wg_configure) before any state resync that depends on them
+                async with SessionLocal() as db:
+                    await outbox.deliver(agent_id, db, skip_types=outbox.STATE_COMMANDS if agent_type == "server" else set())
+            finally:
+                manager.release(agent_id, websocket)
+
+            # Bring server agents up to date on (re)connect so rules are applied even
+            # if the agent restarted or missed earlier commands. Agents report the
+            # state generation they last applied; depending on the gap they get
+            # nothing, a delta from the change journal, or a full apply_state snapshot.
+            if agent_type == "server":
+                async with SessionLocal() as db:
+                    resync = await sync_agent_state(agent_id, reported_generation, reported_hash, db)
+                    logger.info("State resync for server agent %s: %s (agent at generation %s)",
+                                agent_id, resync, reported_generation)
+                    # Verify against what is actually on the VPS; the agent answers after the resync
+                    await request_state_report(agent_id, db)
+
+        # Main message loop: a reader task buffers decoded frames, and each pass takes
+        # everything already buffered (up to WS_DISPATCH_BATCH_SIZE) and dispatches it
+        # in one session with a single commit
+        ctx = AgentContext(agent)
+        inbox: asyncio.Queue = asyncio.Queue(maxsize=config.settings.WS_DISPATCH_BATCH_SIZE)
+        reader = asyncio.create_task(_read_frames(websocket, inbox))
+        try:
+            while True:
+                batch = await next_batch(inbox, config.settings.WS_DISPATCH_BATCH_SIZE)
+                closed = None
+                async with SessionLocal() as db:
+                    uow = UnitOfWork(ctx, db)
+                    for msg in batch:
+                        if isinstance(msg, Exception):
+                            closed = msg
+                            break
+                        await dispatch(uow, msg)
+                    await uow.commit()
+                if closed is not None:
+                    raise closed
+        finally:
+            reader.cancel()
+
+    except AdmissionRejected as exc:
+        logger.info("Connect queue full — asking agent to retry in %.1fs", exc.retry_after)
+        await websocket.send_text(codec.dumps({"type": "retry", "retry_after": round(exc.retry_after, 1)}))
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    except Exception as exc:
+        logger.exception("WebSocket error for agent %s: %s", agent_id, exc)
+    finally:
+        if agent_id:
+            manager.disconnect(agent_id, websocket)
+            logger.info("Agent %s disconnected", agent_id)
+            # A newer connection for the same agent, on this worker or another one,
+            # keeps it online: only the last owner marks it disconnected
+            if not manager.is_connected(agent_id):
+                last = presence.forget(agent_id)
+                if await relay.unroute(agent_id):
+                    async with SessionLocal() as db:
+                        from sqlalchemy import select
+                        from app.models.agent import Agent
+                        result = await db.execute(select(Agent).where(Agent.id == agent_id))
+                        agent = result.scalar_one_or_none()
+                        if agent:
+                            agent.status = "disconnected"
+                            if last is not None:
+                                agent.last_seen = last.last_seen
+                            await db.commit()
+                            dashboard.publish("agent_status", agent_id, {
+                                "id": agent_id,
+                                "status": "disconnected",
+                                "last_seen": agent.last_seen.isoformat() if agent.last_seen else None,
+                            })
+
+
+async def _read_frames(websocket: WebSocket, inbox: asyncio.Queue) -> None:
+    """Decode agent frames into inbox; the exception that ends the socket is queued last."""
+    try:
         while True:
             raw = await websocket.receive_text()
             try:
-                msg = json.loads(raw)
-            except json.JSONDecodeError:
+                msg = codec.loads(raw)
+            except DecodeError:
                 continue
-            async with SessionLocal() as db:
-                await dispatch(agent_id, msg, db)
+            await inbox.put(msg)
+    except Exception as exc:
+        await inbox.put(exc)
+
+
+@app.websocket("/ws/dashboard")
+async def dashboard_websocket(websocket: WebSocket):
+    """Push channel for the web UI; authenticated with the user JWT in ?token=."""
+    from app.auth import decode_token
+    from app.models.user import User
+    from sqlalchemy import select
+
+    await websocket.accept()
+    try:
+        username = decode_token(websocket.query_params.get("token", ""))
+    except Exception:
+        await websocket.close(code=4401)
+        return
+    async with SessionLocal() as db:
+        result = await db.execute(select(User).where(User.username == username))
+        if result.scalar_one_or_none() is None:
+            await websocket.close(code=4401)
+            return
 
+    client = dashboard.connect(websocket)
+    try:
+        # The UI only listens; reading keeps the socket alive and notices the close
+        while True:
+            await websocket.receive_text()
     except WebSocketDisconnect:
         pass
     except Exception as exc:
-        logger.exception("WebSocket error for agent %s: %s", agent_id, exc)
+        logger.warning("Dashboard WebSocket error: %s", exc)
     finally:
-        if agent_id:
-            manager.disconnect(agent_id)
-            logger.info("Agent %s disconnected", agent_id)
-            async with SessionLocal() as db:
-                from sqlalchemy import select
-                from app.models.agent import Agent
-                result = await db.execute(select(Agent).where(Agent.id == agent_id))
-                agent = result.scalar_one_or_none()
-                if agent:
-                    agent.status = "disconnected"
-                    await db.commit()
+        dashboard.disconnect(client)
 
 
 # Serve React dashboard static files
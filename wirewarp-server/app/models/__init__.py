@@ -5,7 +5,16 @@ from app.models.tunnel_client import TunnelClient
 from app.models.port_forward import PortForward
 from app.models.service_template import ServiceTemplate
 from app.models.command_log import CommandLog
+from app.models.command_output import CommandOutput
 from app.models.metric import Metric
+from app.models.metric_rollup import MetricRollup
+from app.models.peer_traffic import PeerTraffic
+from app.models.alert_rule import AlertRule
+from app.models.alert import Alert
+from app.models.state_change import StateChange
+from app.models.agent_outbox import AgentOutbox
+from app.models.agent_route import AgentRoute
+from app.models.relay_message import RelayMessage
 from app.models.user import User
 
 __all__ = [
@@ -16,6 +25,15 @@ __all__ = [
     "PortForward",
     "ServiceTemplate",
     "CommandLog",
+    "CommandOutput",
     "Metric",
+    "MetricRollup",
+    "PeerTraffic",
+    "AlertRule",
+    "Alert",
+    "StateChange",
+    "AgentOutbox",
+    "AgentRoute",
+    "RelayMessage",
     "User",
 ]
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, DateTime, func
+from sqlalchemy import String, DateTime, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -10,6 +10,11 @@ from app.database import Base
 
 class Agent(Base):
     __tablename__ = "agents"
+    __table_args__ = (
+        # Keyset pagination on the list endpoint, optionally filtered by status
+        Index("ix_agents_created_at_id", "created_at", "id"),
+        Index("ix_agents_status_created_at_id", "status", "created_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String, nullable=False)
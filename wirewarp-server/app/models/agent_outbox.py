@@ -0,0 +1,23 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, String, ForeignKey, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+
+from app.database import Base
+
+
+class AgentOutbox(Base):
+    """Commands addressed to an agent while it was offline, delivered in order on reconnect."""
+
+    __tablename__ = "agent_outbox"
+    __table_args__ = (Index("ix_agent_outbox_agent_id_id", "agent_id", "id"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    agent_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("agents.id", ondelete="CASCADE"))
+    command_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    command_type: Mapped[str] = mapped_column(String, nullable=False)
+    params: Mapped[dict | None] = mapped_column(JSONB)
+    coalesce_key: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
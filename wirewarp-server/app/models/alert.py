@@ -0,0 +1,28 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Float, String, ForeignKey, DateTime, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.database import Base
+
+
+class Alert(Base):
+    """One firing of an alert rule for an agent (or one of its peers), resolved in place."""
+
+    __tablename__ = "alerts"
+    __table_args__ = (
+        Index("ix_alerts_state_fired_at", "state", "fired_at"),
+        Index("ix_alerts_rule_agent_subject", "rule_id", "agent_id", "subject"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    rule_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("alert_rules.id", ondelete="CASCADE"))
+    agent_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("agents.id", ondelete="CASCADE"))
+    subject: Mapped[str | None] = mapped_column(String)  # peer public key for per-peer rules
+    state: Mapped[str] = mapped_column(String, nullable=False)  # 'firing' | 'resolved'
+    value: Mapped[float | None] = mapped_column(Float)
+    message: Mapped[str] = mapped_column(String, nullable=False)
+    fired_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    resolved_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
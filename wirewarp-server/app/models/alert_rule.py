@@ -0,0 +1,21 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import String, Boolean, Float, Integer, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.database import Base
+
+
+class AlertRule(Base):
+    __tablename__ = "alert_rules"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    kind: Mapped[str] = mapped_column(String, nullable=False)  # 'cpu_high' | 'handshake_stale' | 'rx_stalled'
+    threshold: Mapped[float] = mapped_column(Float, nullable=False)  # percent for cpu_high, seconds otherwise
+    duration_seconds: Mapped[int] = mapped_column(Integer, default=0)  # condition must hold this long to fire
+    enabled: Mapped[bool] = mapped_column(Boolean, default=True)
+    is_builtin: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
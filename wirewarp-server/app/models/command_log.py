@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Boolean, Text, ForeignKey, DateTime, func
+from sqlalchemy import String, Boolean, Text, ForeignKey, DateTime, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 
@@ -10,13 +10,23 @@ from app.database import Base
 
 class CommandLog(Base):
     __tablename__ = "command_log"
+    __table_args__ = (
+        # Keyset pagination on (executed_at, id), globally and per agent
+        Index("ix_command_log_executed_at_id", "executed_at", "id"),
+        Index("ix_command_log_agent_id_executed_at_id", "agent_id", "executed_at", "id"),
+        # Commands still waiting for a result: ?pending=true and the timeout sweeper
+        Index("ix_command_log_pending", "executed_at", postgresql_where=text("success IS NULL")),
+        # Retention keeps the latest N results per (agent, command type)
+        Index("ix_command_log_agent_id_command_type_executed_at", "agent_id", "command_type", "executed_at"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     agent_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), ForeignKey("agents.id", ondelete="SET NULL"))
     command_type: Mapped[str] = mapped_column(String, nullable=False)
     params: Mapped[dict | None] = mapped_column(JSONB)
     success: Mapped[bool | None] = mapped_column(Boolean)
-    output: Mapped[str | None] = mapped_column(Text)
+    output: Mapped[str | None] = mapped_column(Text)  # a preview when output_external is set
+    output_external: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
     executed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     agent: Mapped["Agent"] = relationship("Agent", back_populates="command_logs")  # noqa: F821
@@ -0,0 +1,22 @@
+import uuid
+
+from sqlalchemy import Integer, LargeBinary, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.database import Base
+
+
+class CommandOutput(Base):
+    """Full output of a command whose result exceeded COMMAND_OUTPUT_INLINE_MAX, zlib-compressed.
+
+    command_log.output keeps only a preview of such results and output_external is set.
+    """
+
+    __tablename__ = "command_outputs"
+
+    command_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("command_log.id", ondelete="CASCADE"), primary_key=True
+    )
+    size: Mapped[int] = mapped_column(Integer, nullable=False)  # uncompressed length in characters
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
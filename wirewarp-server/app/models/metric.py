@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import BigInteger, ForeignKey, DateTime
+from sqlalchemy import BigInteger, ForeignKey, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 
@@ -9,11 +9,21 @@ import uuid
 
 
 class Metric(Base):
+    """Raw metrics samples, range-partitioned by day on timestamp.
+
+    Partitions are created ahead of time and dropped past the retention window
+    by app.services.partitions; the primary key includes the partition key.
+    """
+
     __tablename__ = "metrics"
+    __table_args__ = (
+        Index("ix_metrics_agent_id_timestamp", "agent_id", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     agent_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("agents.id", ondelete="CASCADE"))
-    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, nullable=False)
     data: Mapped[dict] = mapped_column(JSONB, nullable=False)
 
     agent: Mapped["Agent"] = relationship("Agent", back_populates="metrics")  # noqa: F821
@@ -0,0 +1,37 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Integer, Float, String, ForeignKey, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.database import Base
+
+
+class MetricRollup(Base):
+    """Per-agent metrics aggregated into 1m / 1h / 1d buckets, maintained on ingest."""
+
+    __tablename__ = "metric_rollups"
+
+    agent_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("agents.id", ondelete="CASCADE"), primary_key=True
+    )
+    resolution: Mapped[str] = mapped_column(String, primary_key=True)  # '1m' | '1h' | '1d'
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    samples: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # System stats: min/max plus a running sum and count (avg = sum / count)
+    cpu_min: Mapped[float | None] = mapped_column(Float)
+    cpu_max: Mapped[float | None] = mapped_column(Float)
+    cpu_sum: Mapped[float | None] = mapped_column(Float)
+    cpu_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    mem_min: Mapped[float | None] = mapped_column(Float)
+    mem_max: Mapped[float | None] = mapped_column(Float)
+    mem_sum: Mapped[float | None] = mapped_column(Float)
+    mem_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    disk_min: Mapped[float | None] = mapped_column(Float)
+    disk_max: Mapped[float | None] = mapped_column(Float)
+    disk_sum: Mapped[float | None] = mapped_column(Float)
+    disk_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Bytes transferred across all peers during the bucket (counter deltas)
+    rx_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    tx_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
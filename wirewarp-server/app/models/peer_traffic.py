@@ -0,0 +1,32 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, ForeignKey, DateTime, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.database import Base
+
+
+class PeerTraffic(Base):
+    """Per-peer WireGuard counters split out of metrics samples, range-partitioned by day.
+
+    rx_bytes/tx_bytes are the raw interface counters; rx_delta/tx_delta are the
+    bytes moved since the previous sample, with counter resets already handled.
+    """
+
+    __tablename__ = "peer_traffic"
+    __table_args__ = (
+        Index("ix_peer_traffic_timestamp", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+    tunnel_client_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("tunnel_clients.id", ondelete="CASCADE"), primary_key=True
+    )
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    rx_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    tx_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    rx_delta: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    tx_delta: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    last_handshake: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Integer, Boolean, ForeignKey, DateTime, func, UniqueConstraint
+from sqlalchemy import String, Integer, Boolean, ForeignKey, DateTime, Index, func, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -10,7 +10,11 @@ from app.database import Base
 
 class PortForward(Base):
     __tablename__ = "port_forwards"
-    __table_args__ = (UniqueConstraint("tunnel_server_id", "protocol", "public_port"),)
+    __table_args__ = (
+        UniqueConstraint("tunnel_server_id", "protocol", "public_port"),
+        Index("ix_port_forwards_created_at_id", "created_at", "id"),
+        Index("ix_port_forwards_tunnel_server_id_created_at_id", "tunnel_server_id", "created_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     tunnel_server_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("tunnel_servers.id", ondelete="CASCADE"))
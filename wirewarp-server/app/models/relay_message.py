@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Text, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class RelayMessage(Base):
+    """A cross-worker relay message too large for a NOTIFY payload; the notification carries its id."""
+
+    __tablename__ = "relay_messages"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
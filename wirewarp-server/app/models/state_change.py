@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Integer, String, ForeignKey, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+
+from app.database import Base
+import uuid
+
+
+class StateChange(Base):
+    """Journal of desired-state changes per tunnel server, used to send reconnecting agents a delta."""
+
+    __tablename__ = "state_changes"
+    __table_args__ = (Index("ix_state_changes_server_generation", "tunnel_server_id", "generation"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    tunnel_server_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("tunnel_servers.id", ondelete="CASCADE"))
+    generation: Mapped[int] = mapped_column(Integer, nullable=False)
+    kind: Mapped[str] = mapped_column(String, nullable=False)  # 'forward' | 'peer' | 'reset'
+    op: Mapped[str] = mapped_column(String, nullable=False)  # 'add' | 'remove'
+    params: Mapped[dict | None] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    tunnel_server: Mapped["TunnelServer"] = relationship("TunnelServer", back_populates="state_changes")  # noqa: F821
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Boolean, ForeignKey, DateTime, func
+from sqlalchemy import String, Boolean, ForeignKey, DateTime, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -10,6 +10,11 @@ from app.database import Base
 
 class TunnelClient(Base):
     __tablename__ = "tunnel_clients"
+    __table_args__ = (
+        Index("ix_tunnel_clients_created_at_id", "created_at", "id"),
+        Index("ix_tunnel_clients_tunnel_server_id_created_at_id", "tunnel_server_id", "created_at", "id"),
+        Index("ix_tunnel_clients_status_created_at_id", "status", "created_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     agent_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("agents.id", ondelete="CASCADE"))
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Integer, ForeignKey, DateTime, func
+from sqlalchemy import String, Integer, ForeignKey, DateTime, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -10,6 +10,7 @@ from app.database import Base
 
 class TunnelServer(Base):
     __tablename__ = "tunnel_servers"
+    __table_args__ = (Index("ix_tunnel_servers_created_at_id", "created_at", "id"),)
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     agent_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("agents.id", ondelete="CASCADE"))
@@ -19,8 +20,12 @@ class TunnelServer(Base):
     public_iface: Mapped[str] = mapped_column(String, default="eth0")
     wg_public_key: Mapped[str | None] = mapped_column(String)
     tunnel_network: Mapped[str] = mapped_column(String, default="10.0.0.0/24")
+    # Desired-state generation, bumped on every forward/peer change for this server
+    state_generation: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    state_hash: Mapped[str | None] = mapped_column(String)  # content hash of forwards + peers
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     agent: Mapped["Agent"] = relationship("Agent", back_populates="tunnel_server")  # noqa: F821
     tunnel_clients: Mapped[list["TunnelClient"]] = relationship("TunnelClient", back_populates="tunnel_server", passive_deletes=True)  # noqa: F821
     port_forwards: Mapped[list["PortForward"]] = relationship("PortForward", back_populates="tunnel_server", passive_deletes=True)  # noqa: F821
+    state_changes: Mapped[list["StateChange"]] = relationship("StateChange", back_populates="tunnel_server", passive_deletes=True)  # noqa: F821
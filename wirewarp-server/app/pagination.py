@@ -0,0 +1,59 @@
+import base64
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Sequence
+
+from fastapi import HTTPException, Query
+from sqlalchemy import Select, tuple_
+
+from app.config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass(frozen=True)
+class PageParams:
+    limit: int
+    after: tuple[datetime, uuid.UUID] | None = None  # (sort column, id) of the previous page's last row
+
+    @property
+    def key(self) -> tuple:
+        return self.limit, self.after
+
+
+def encode_cursor(value: datetime, id: uuid.UUID) -> str:
+    return base64.urlsafe_b64encode(f"{value.isoformat()}|{id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        value, id = raw.split("|")
+        return datetime.fromisoformat(value), uuid.UUID(id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_params(
+    cursor: str | None = None,
+    limit: int = Query(settings.LIST_PAGE_SIZE, ge=1, le=settings.LIST_PAGE_SIZE_MAX),
+) -> PageParams:
+    """?cursor= from the previous page's X-Next-Cursor header and ?limit= rows per page."""
+    return PageParams(limit=limit, after=decode_cursor(cursor) if cursor else None)
+
+
+def keyset(query: Select, model: Any, page: PageParams, sort: str = "created_at") -> Select:
+    """Order newest first on (sort, id) and seek past the cursor; fetches one extra row to detect a next page."""
+    column = getattr(model, sort)
+    if page.after is not None:
+        query = query.where(tuple_(column, model.id) < page.after)
+    return query.order_by(column.desc(), model.id.desc()).limit(page.limit + 1)
+
+
+def split_page(rows: Sequence[Any], page: PageParams, sort: str = "created_at") -> tuple[Sequence[Any], str | None]:
+    """The rows of this page and the cursor for the next one (None on the last page)."""
+    if len(rows) <= page.limit:
+        return rows, None
+    rows = rows[:page.limit]
+    return rows, encode_cursor(getattr(rows[-1], sort), rows[-1].id)
@@ -1,22 +1,37 @@
 import secrets
 import string
+import uuid
 from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models.agent import Agent
+from app.models.command_log import CommandLog
 from app.models.user import User
 from app.models.registration_token import RegistrationToken
-from app.schemas.agent import AgentRead, AgentJWTRead
+from app.models.tunnel_client import TunnelClient
+from app.schemas.agent import AgentRead, AgentJWTRead, AgentConnectionStats
+from app.schemas.command_log import CommandLogRead
 from app.schemas.registration_token import TokenCreate, TokenRead
 from app.auth import get_current_user
+from app.pagination import NEXT_CURSOR_HEADER, PageParams, page_params, keyset, split_page
 from app.models.system_settings import SystemSettings
+from app.routers.commands import CommandFilters, command_filters, list_command_page, wait_param
+from app.services.agent_state import collect_client_removal, record_changes
+from app.services.change_versions import changes, etag_headers, not_modified
+from app.services.pending_commands import pending_commands
+from app.services.presence import presence, shown_last_seen
+from app.services.single_flight import reads
+from app.websocket.dashboard import dashboard
 
 router = APIRouter()
 
+_agent_list = TypeAdapter(list[AgentRead])
+
 
 def _generate_token() -> str:
     alphabet = string.ascii_uppercase + string.digits
@@ -24,10 +39,60 @@ def _generate_token() -> str:
     return "-".join(parts)
 
 
+def _with_presence(agent: Agent) -> AgentRead:
+    """AgentRead with liveness taken from the in-memory presence table when the agent is online."""
+    read = AgentRead.model_validate(agent)
+    live = presence.get(str(agent.id))
+    if live is None:
+        if read.last_seen is None:
+            return read
+        return read.model_copy(update={"last_seen": shown_last_seen(read.last_seen)})
+    return read.model_copy(update={
+        "status": "connected",
+        "last_seen": shown_last_seen(live.last_seen),
+        "version": live.version or read.version,
+        "public_ip": live.public_ip or read.public_ip,
+    })
+
+
+async def _load_agents(page: PageParams, status: str | None, type: str | None) -> tuple[bytes, str | None]:
+    q = select(Agent)
+    if status:
+        q = q.where(Agent.status == status)
+    if type:
+        q = q.where(Agent.type == type)
+    async with SessionLocal() as db:
+        result = await db.execute(keyset(q, Agent, page))
+        rows, next_cursor = split_page(result.scalars().all(), page)
+        return _agent_list.dump_json([_with_presence(agent) for agent in rows]), next_cursor
+
+
 @router.get("", response_model=list[AgentRead])
-async def list_agents(db: AsyncSession = Depends(get_db), _: User = Depends(get_current_user)):
-    result = await db.execute(select(Agent).order_by(Agent.created_at.desc()))
-    return result.scalars().all()
+async def list_agents(
+    request: Request,
+    status: str | None = None,
+    type: str | None = None,
+    page: PageParams = Depends(page_params),
+    _: User = Depends(get_current_user),
+):
+    # Status and last_seen come from the presence table, so its version is part of the ETag
+    etag = changes.etag("agents", extra=presence.version)
+    if cached := not_modified(request, etag):
+        return cached
+    body, next_cursor = await reads.get(
+        ("agents", status, type, page.key), etag, lambda: _load_agents(page, status, type)
+    )
+    headers = etag_headers(etag)
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("/connections", response_model=list[AgentConnectionStats])
+async def list_connections(_: User = Depends(get_current_user)):
+    """Per-agent send queue depth and latency for currently connected agents."""
+    from app.websocket.hub import manager
+    return manager.stats()
 
 
 @router.get("/{agent_id}", response_model=AgentRead)
@@ -36,7 +101,7 @@ async def get_agent(agent_id: str, db: AsyncSession = Depends(get_db), _: User =
     agent = result.scalar_one_or_none()
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
-    return agent
+    return _with_presence(agent)
 
 
 @router.delete("/{agent_id}", status_code=204)
@@ -45,8 +110,36 @@ async def delete_agent(agent_id: str, db: AsyncSession = Depends(get_db), _: Use
     agent = result.scalar_one_or_none()
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
+    # A client agent takes its tunnel client, and with it a peer and forwards on a server, along
+    removed = {}
+    client = (await db.execute(select(TunnelClient).where(TunnelClient.agent_id == agent.id))).scalar_one_or_none()
+    if client:
+        removed = await collect_client_removal(client, db)
     await db.delete(agent)
+    await db.flush()
+    await record_changes(removed, db)
     await db.commit()
+    from app.services.alerts import alerts
+    from app.services.fleet import fleet_traffic
+    from app.services.live_metrics import live_metrics
+    live_metrics.forget(agent_id)
+    fleet_traffic.forget(agent_id)
+    alerts.evaluator.forget(agent_id)
+    dashboard.publish("agent_removed", agent_id, {"id": agent_id})
+
+
+@router.get("/{agent_id}/commands", response_model=list[CommandLogRead])
+async def list_agent_commands(
+    agent_id: uuid.UUID,
+    response: Response,
+    filters: CommandFilters = Depends(command_filters),
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(get_current_user),
+):
+    """Commands sent to one agent, newest first; the same filters as /api/commands."""
+    filters.agent_id = agent_id
+    return await list_command_page(filters, page, response, db)
 
 
 @router.post("/{agent_id}/issue-jwt", response_model=AgentJWTRead)
@@ -65,7 +158,12 @@ async def issue_agent_jwt(
 
 
 @router.post("/{agent_id}/update", status_code=202)
-async def update_agent(agent_id: str, db: AsyncSession = Depends(get_db), _: User = Depends(get_current_user)):
+async def update_agent(
+    agent_id: str,
+    wait: float | None = Depends(wait_param),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(get_current_user),
+):
     result = await db.execute(select(Agent).where(Agent.id == agent_id))
     agent = result.scalar_one_or_none()
     if not agent:
@@ -78,7 +176,16 @@ async def update_agent(agent_id: str, db: AsyncSession = Depends(get_db), _: Use
         db=db,
     )
     if not sent:
-        raise HTTPException(status_code=503, detail="Agent not connected")
+        log = await db.get(CommandLog, uuid.UUID(cmd_id))
+        if log is not None and log.success is False:
+            # Connected, but its send queue turned the command away
+            return {"command_id": cmd_id, "success": False, "output": log.output}
+        # Kept in the agent's outbox and run when it reconnects
+        return {"command_id": cmd_id, "queued": True}
+    if wait:
+        outcome = await pending_commands.wait(cmd_id, wait)
+        if outcome is not None:
+            return {"command_id": cmd_id, "success": outcome.success, "output": outcome.output}
     return {"command_id": cmd_id}
 
 
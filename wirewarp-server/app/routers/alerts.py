@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from app.database import get_db
+from app.models.alert import Alert
+from app.models.alert_rule import AlertRule
+from app.models.user import User
+from app.schemas.alert import AlertRead, AlertRuleCreate, AlertRuleRead, AlertRuleUpdate
+from app.auth import get_current_user
+from app.services.alerts import RULE_KINDS, alerts, resolve_rule_alerts
+from app.websocket.relay import relay
+
+router = APIRouter()
+
+
+async def _reload_rules(db: AsyncSession) -> None:
+    """Apply a rule change to this worker's evaluator and the other workers'."""
+    await alerts.reload_rules(db)
+    relay.rules_changed()
+
+
+@router.get("", response_model=list[AlertRead])
+async def list_alerts(
+    state: str | None = Query(None, description="firing or resolved"),
+    agent_id: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(get_current_user),
+):
+    query = select(Alert).order_by(Alert.fired_at.desc()).limit(limit)
+    if state:
+        query = query.where(Alert.state == state)
+    if agent_id:
+        query = query.where(Alert.agent_id == agent_id)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+@router.get("/rules", response_model=list[AlertRuleRead])
+async def list_rules(db: AsyncSession = Depends(get_db), _: User = Depends(get_current_user)):
+    result = await db.execute(select(AlertRule).order_by(AlertRule.name))
+    return result.scalars().all()
+
+
+@router.post("/rules", response_model=AlertRuleRead, status_code=201)
+async def create_rule(body: AlertRuleCreate, db: AsyncSession = Depends(get_db), _: User = Depends(get_current_user)):
+    if body.kind not in RULE_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(sorted(RULE_KINDS))}")
+    result = await db.execute(select(AlertRule).where(AlertRule.name == body.name))
+    if result.scalar_one_or_none():
+        raise HTTPException(status_code=400, detail="Rule name already exists")
+    rule = AlertRule(**body.model_dump(), is_builtin=False)
+    db.add(rule)
+    await db.commit()
+    await db.refresh(rule)
+    await _reload_rules(db)
+    return rule
+
+
+@router.patch("/rules/{rule_id}", response_model=AlertRuleRead)
+async def update_rule(
+    rule_id: str,
+    body: AlertRuleUpdate,
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(get_current_user),
+):
+    rule = await db.get(AlertRule, rule_id)
+    if not rule:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    was_enabled = rule.enabled
+    for field, value in body.model_dump(exclude_unset=True).items():
+        setattr(rule, field, value)
+    if was_enabled and not rule.enabled:
+        # Its evaluator state goes with it; re-enabling starts from a clean slate
+        await resolve_rule_alerts(rule.id, db)
+    await db.commit()
+    await db.refresh(rule)
+    await _reload_rules(db)
+    return rule
+
+
+@router.delete("/rules/{rule_id}", status_code=204)
+async def delete_rule(rule_id: str, db: AsyncSession = Depends(get_db), _: User = Depends(get_current_user)):
+    rule = await db.get(AlertRule, rule_id)
+    if not rule:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    if rule.is_builtin:
+        raise HTTPException(status_code=400, detail="Built-in rules can be disabled but not deleted")
+    await db.delete(rule)
+    await db.commit()
+    await _reload_rules(db)
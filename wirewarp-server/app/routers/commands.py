@@ -0,0 +1,182 @@
+import csv
+import io
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db, SessionLocal
+from app.models.command_log import CommandLog
+from app.models.command_output import CommandOutput
+from app.models.user import User
+from app.schemas.command_log import CommandLogRead
+from app.auth import get_current_user
+from app.codec import codec
+from app.pagination import NEXT_CURSOR_HEADER, PageParams, page_params, keyset, split_page
+from app.services.command_log import decompress_output, full_output
+from app.services.pending_commands import pending_commands, parse_wait
+
+router = APIRouter()
+
+EXPORT_COLUMNS = ("id", "agent_id", "command_type", "params", "success", "output", "executed_at")
+EXPORT_CHUNK_ROWS = 500
+
+
+def wait_param(wait: str | None = None) -> float | None:
+    """?wait=5s / 500ms / 5 — how long to block for the agent's reply."""
+    try:
+        return parse_wait(wait)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+@dataclass
+class CommandFilters:
+    agent_id: uuid.UUID | None = None
+    command_type: str | None = None
+    success: bool | None = None
+    pending: bool | None = None  # no result yet (success IS NULL)
+    since: datetime | None = None
+    until: datetime | None = None
+
+    def apply(self, query: Select) -> Select:
+        if self.agent_id:
+            query = query.where(CommandLog.agent_id == self.agent_id)
+        if self.command_type:
+            query = query.where(CommandLog.command_type == self.command_type)
+        if self.success is not None:
+            query = query.where(CommandLog.success == self.success)
+        if self.pending is not None:
+            query = query.where(CommandLog.success.is_(None) if self.pending else CommandLog.success.is_not(None))
+        if self.since:
+            query = query.where(CommandLog.executed_at >= self.since)
+        if self.until:
+            query = query.where(CommandLog.executed_at < self.until)
+        return query
+
+
+def command_filters(
+    command_type: str | None = None,
+    success: bool | None = None,
+    pending: bool | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> CommandFilters:
+    return CommandFilters(command_type=command_type, success=success, pending=pending, since=since, until=until)
+
+
+async def list_command_page(
+    filters: CommandFilters, page: PageParams, response: Response, db: AsyncSession
+) -> list[CommandLog]:
+    """One page of command_log, newest first on (executed_at, id); sets X-Next-Cursor if there is more."""
+    result = await db.execute(keyset(filters.apply(select(CommandLog)), CommandLog, page, sort="executed_at"))
+    rows, next_cursor = split_page(result.scalars().all(), page, sort="executed_at")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+@router.get("", response_model=list[CommandLogRead])
+async def list_commands(
+    response: Response,
+    agent_id: uuid.UUID | None = None,
+    filters: CommandFilters = Depends(command_filters),
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(get_current_user),
+):
+    filters.agent_id = agent_id
+    return await list_command_page(filters, page, response, db)
+
+
+async def _export_rows(filters: CommandFilters) -> AsyncIterator[dict]:
+    # The session lives in the generator: the response body outlives the request's dependencies
+    async with SessionLocal() as db:
+        query = (
+            filters.apply(select(CommandLog, CommandOutput.data))
+            .outerjoin(CommandOutput, CommandOutput.command_id == CommandLog.id)
+            .order_by(CommandLog.executed_at, CommandLog.id)
+        )
+        result = await db.stream(query.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        async for partition in result.partitions():
+            for row, data in partition:
+                yield _export_values(row, data)
+            # Rows already written out are not needed by the session any more
+            db.expunge_all()
+
+
+def _export_values(row: CommandLog, data: bytes | None) -> dict:
+    return {
+        "id": str(row.id),
+        "agent_id": str(row.agent_id) if row.agent_id else None,
+        "command_type": row.command_type,
+        "params": row.params,
+        "success": row.success,
+        "output": decompress_output(data) if data is not None else row.output,
+        "executed_at": row.executed_at.isoformat() if row.executed_at else None,
+    }
+
+
+async def _ndjson(filters: CommandFilters) -> AsyncIterator[str]:
+    async for values in _export_rows(filters):
+        yield codec.dumps(values) + "\n"
+
+
+async def _csv(filters: CommandFilters) -> AsyncIterator[str]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    n = 0
+    async for values in _export_rows(filters):
+        values["params"] = codec.dumps(values["params"]) if values["params"] is not None else ""
+        writer.writerow(values)
+        n += 1
+        if n % EXPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+@router.get("/export")
+async def export_commands(
+    format: str = "ndjson",
+    agent_id: uuid.UUID | None = None,
+    filters: CommandFilters = Depends(command_filters),
+    _: User = Depends(get_current_user),
+):
+    """Stream matching commands oldest first from a server-side cursor, as NDJSON or CSV."""
+    filters.agent_id = agent_id
+    if format == "ndjson":
+        return StreamingResponse(_ndjson(filters), media_type="application/x-ndjson")
+    if format == "csv":
+        return StreamingResponse(
+            _csv(filters),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="commands.csv"'},
+        )
+    raise HTTPException(status_code=422, detail="format must be ndjson or csv")
+
+
+@router.get("/{command_id}", response_model=CommandLogRead)
+async def get_command(
+    command_id: uuid.UUID,
+    wait: float | None = Depends(wait_param),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(get_current_user),
+):
+    """Fetch a command and its result, optionally blocking until the agent replies."""
+    if wait and pending_commands.is_pending(str(command_id)):
+        await pending_commands.wait(str(command_id), wait)
+    log = await db.get(CommandLog, command_id, populate_existing=True)
+    if not log:
+        raise HTTPException(status_code=404, detail="Command not found")
+    read = CommandLogRead.model_validate(log)
+    if log.output_external:
+        read = read.model_copy(update={"output": await full_output(log, db)})
+    return read
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.models.agent import Agent
+from app.models.tunnel_client import TunnelClient
+from app.models.tunnel_server import TunnelServer
+from app.models.user import User
+from app.schemas.fleet import FleetTraffic
+from app.auth import get_current_user
+from app.services.fleet import fleet_traffic
+
+router = APIRouter()
+
+
+@router.get("/traffic", response_model=FleetTraffic)
+async def get_fleet_traffic(
+    top: int = Query(10, ge=1, le=1000),
+    stale_after: float | None = Query(None, ge=0, description="Seconds without a handshake before a peer is stale"),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(get_current_user),
+):
+    """Fleet throughput per tunnel server, busiest peers and stale handshakes, from live counters."""
+    now = datetime.now(timezone.utc)
+    summary = fleet_traffic.summary(top=top, stale_after=stale_after, now=now.timestamp())
+
+    # Only the rows being returned are resolved to names and client ids
+    agent_ids = [s["agent_id"] for s in summary["servers"]]
+    servers = {}
+    if agent_ids:
+        result = await db.execute(
+            select(TunnelServer.agent_id, TunnelServer.id, Agent.name)
+            .join(Agent, TunnelServer.agent_id == Agent.id)
+            .where(TunnelServer.agent_id.in_(agent_ids))
+        )
+        servers = {str(agent_id): (server_id, name) for agent_id, server_id, name in result.all()}
+    for s in summary["servers"]:
+        s["tunnel_server_id"], s["name"] = servers.get(s["agent_id"], (None, None))
+
+    peers = summary["top_peers"] + summary["stale_peers"]
+    keys = {p["public_key"] for p in peers}
+    clients = {}
+    if keys:
+        result = await db.execute(
+            select(TunnelClient.wg_public_key, TunnelClient.id).where(TunnelClient.wg_public_key.in_(keys))
+        )
+        clients = dict(result.all())
+    for p in peers:
+        p["tunnel_client_id"] = clients.get(p["public_key"])
+
+    return {"generated_at": now, **summary}
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import get_db
+from app.models.agent import Agent
+from app.models.user import User
+from app.schemas.metric import MetricSeries, MetricsIngestStats, LiveMetrics
+from app.auth import get_current_user
+from app.services.live_metrics import live_metrics
+from app.services.metrics import metrics_ingest
+from app.services.rollups import RESOLUTIONS, pick_resolution, query_rollups
+
+router = APIRouter()
+
+
+@router.get("/ingest", response_model=MetricsIngestStats)
+async def ingest_stats(_: User = Depends(get_current_user)):
+    """Metrics ingest queue depth and write/drop counters."""
+    return metrics_ingest.stats()
+
+
+@router.get("/{agent_id}", response_model=MetricSeries)
+async def get_agent_metrics(
+    agent_id: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    resolution: str | None = Query(None, description="1m, 1h or 1d; picked from the range if omitted"),
+    max_points: int = Query(settings.METRICS_QUERY_MAX_POINTS, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(get_current_user),
+):
+    """Downsampled metrics for an agent, read from the rollup tables (default: last 24h)."""
+    if await db.get(Agent, agent_id) is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    # Timestamps without an offset are taken as UTC, like agent-reported ones
+    end = _utc(end) if end else datetime.now(timezone.utc)
+    start = _utc(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    if resolution is None:
+        resolution = pick_resolution(start, end, max_points)
+    elif resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=422, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}")
+
+    points = await query_rollups(agent_id, start, end, resolution, db)
+    return MetricSeries(agent_id=agent_id, resolution=resolution, start=start, end=end, points=points)
+
+
+def _utc(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+@router.get("/{agent_id}/live", response_model=LiveMetrics)
+async def get_live_metrics(
+    agent_id: str,
+    since: float | None = Query(None, description="Only samples newer than this unix timestamp"),
+    _: User = Depends(get_current_user),
+):
+    """Recent samples straight from the in-memory ring buffers — no database read."""
+    snapshot = live_metrics.snapshot(agent_id, since)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No live metrics for this agent")
+    return snapshot
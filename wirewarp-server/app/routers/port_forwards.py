@@ -1,23 +1,40 @@
 import logging
+import uuid
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models.port_forward import PortForward
 from app.models.tunnel_server import TunnelServer
 from app.models.user import User
 from app.schemas.port_forward import PortForwardCreate, PortForwardRead, PortForwardUpdate
 from app.auth import get_current_user
+from app.pagination import NEXT_CURSOR_HEADER, PageParams, page_params, keyset, split_page
 from app.services.agent_commands import send_command
+from app.services.agent_state import forward_params, bump_generation
+from app.services.change_versions import changes, etag_headers, not_modified
+from app.services.single_flight import reads
+from app.websocket.dashboard import dashboard
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+_forward_list = TypeAdapter(list[PortForwardRead])
 
-async def _push_forward(pf: PortForward, command_type: str, db: AsyncSession) -> None:
-    """Send iptables_add_forward or iptables_remove_forward to the tunnel server agent."""
+
+async def _record_forward(pf: PortForward, op: str, db: AsyncSession) -> dict:
+    """Journal a forward add/remove against its tunnel server's desired-state generation."""
+    return await bump_generation(pf.tunnel_server_id, [("forward", op, forward_params(pf))], db)
+
+
+async def _push_forward(pf: PortForward, command_type: str, db: AsyncSession, state: dict | None = None) -> None:
+    """Send iptables_add_forward or iptables_remove_forward to the tunnel server agent.
+
+    state is the generation/hash returned by _record_forward for this change.
+    """
     result = await db.execute(select(TunnelServer).where(TunnelServer.id == pf.tunnel_server_id))
     server = result.scalar_one_or_none()
     if not server:
@@ -25,12 +42,7 @@ async def _push_forward(pf: PortForward, command_type: str, db: AsyncSession) ->
     sent, _ = await send_command(
         agent_id=str(server.agent_id),
         command_type=command_type,
-        params={
-            "protocol": pf.protocol,
-            "public_port": pf.public_port,
-            "destination_ip": pf.destination_ip,
-            "destination_port": pf.destination_port,
-        },
+        params={**forward_params(pf), **(state or {})},
         db=db,
     )
     if not sent:
@@ -40,17 +52,43 @@ async def _push_forward(pf: PortForward, command_type: str, db: AsyncSession) ->
         )
 
 
+async def _load_forwards(page: PageParams, filters: dict) -> tuple[bytes, str | None]:
+    q = select(PortForward)
+    for column, value in filters.items():
+        if value is not None:
+            q = q.where(getattr(PortForward, column) == value)
+    async with SessionLocal() as db:
+        result = await db.execute(keyset(q, PortForward, page))
+        rows, next_cursor = split_page(result.scalars().all(), page)
+        return _forward_list.dump_json(rows), next_cursor
+
+
 @router.get("", response_model=list[PortForwardRead])
 async def list_port_forwards(
-    tunnel_server_id: str | None = None,
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    tunnel_server_id: uuid.UUID | None = None,
+    tunnel_client_id: uuid.UUID | None = None,
+    protocol: str | None = None,
+    active: bool | None = None,
+    page: PageParams = Depends(page_params),
     _: User = Depends(get_current_user),
 ):
-    q = select(PortForward).order_by(PortForward.created_at.desc())
-    if tunnel_server_id:
-        q = q.where(PortForward.tunnel_server_id == tunnel_server_id)
-    result = await db.execute(q)
-    return result.scalars().all()
+    etag = changes.etag("port_forwards")
+    if cached := not_modified(request, etag):
+        return cached
+    filters = {
+        "tunnel_server_id": tunnel_server_id,
+        "tunnel_client_id": tunnel_client_id,
+        "protocol": protocol,
+        "active": active,
+    }
+    body, next_cursor = await reads.get(
+        ("port_forwards", *filters.values(), page.key), etag, lambda: _load_forwards(page, filters)
+    )
+    headers = etag_headers(etag)
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.post("", response_model=PortForwardRead, status_code=201)
@@ -61,10 +99,13 @@ async def create_port_forward(
 ):
     pf = PortForward(**body.model_dump())
     db.add(pf)
+    await db.flush()
+    state = await _record_forward(pf, "add", db) if pf.active else None
     await db.commit()
     await db.refresh(pf)
     if pf.active:
-        await _push_forward(pf, "iptables_add_forward", db)
+        await _push_forward(pf, "iptables_add_forward", db, state)
+    dashboard.publish("port_forward", str(pf.id), {"id": str(pf.id), "op": "created"})
     return pf
 
 
@@ -82,12 +123,17 @@ async def update_port_forward(
     old_active = pf.active
     for field, value in body.model_dump(exclude_none=True).items():
         setattr(pf, field, value)
+    await db.flush()
+    state = None
+    if old_active != pf.active:
+        state = await _record_forward(pf, "add" if pf.active else "remove", db)
     await db.commit()
     await db.refresh(pf)
     if not old_active and pf.active:
-        await _push_forward(pf, "iptables_add_forward", db)
+        await _push_forward(pf, "iptables_add_forward", db, state)
     elif old_active and not pf.active:
-        await _push_forward(pf, "iptables_remove_forward", db)
+        await _push_forward(pf, "iptables_remove_forward", db, state)
+    dashboard.publish("port_forward", str(pf.id), {"id": str(pf.id), "op": "updated"})
     return pf
 
 
@@ -101,7 +147,11 @@ async def delete_port_forward(
     pf = result.scalar_one_or_none()
     if not pf:
         raise HTTPException(status_code=404, detail="Port forward not found")
-    if pf.active:
-        await _push_forward(pf, "iptables_remove_forward", db)
+    was_active = pf.active
     await db.delete(pf)
+    await db.flush()
+    state = await _record_forward(pf, "remove", db) if was_active else None
     await db.commit()
+    if was_active:
+        await _push_forward(pf, "iptables_remove_forward", db, state)
+    dashboard.publish("port_forward", pf_id, {"id": pf_id, "op": "deleted"})
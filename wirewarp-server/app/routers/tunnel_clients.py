@@ -1,6 +1,7 @@
 import logging
+import uuid
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
@@ -10,7 +11,12 @@ from app.models.tunnel_server import TunnelServer
 from app.models.user import User
 from app.schemas.tunnel_client import TunnelClientRead, TunnelClientUpdate
 from app.auth import get_current_user
+from app.pagination import NEXT_CURSOR_HEADER, PageParams, page_params, keyset, split_page
 from app.services.agent_commands import send_command
+from app.services.change_versions import changes, etag_headers, not_modified
+from app.services.agent_state import (
+    peer_params, configured_peer_params, record_peer_change, collect_client_removal, record_changes,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -18,9 +24,29 @@ router = APIRouter()
 
 
 @router.get("", response_model=list[TunnelClientRead])
-async def list_tunnel_clients(db: AsyncSession = Depends(get_db), _: User = Depends(get_current_user)):
-    result = await db.execute(select(TunnelClient).order_by(TunnelClient.created_at.desc()))
-    return result.scalars().all()
+async def list_tunnel_clients(
+    request: Request,
+    response: Response,
+    status: str | None = None,
+    tunnel_server_id: uuid.UUID | None = None,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(get_current_user),
+):
+    etag = changes.etag("tunnel_clients")
+    if cached := not_modified(request, etag):
+        return cached
+    response.headers.update(etag_headers(etag))
+    q = select(TunnelClient)
+    if status:
+        q = q.where(TunnelClient.status == status)
+    if tunnel_server_id:
+        q = q.where(TunnelClient.tunnel_server_id == tunnel_server_id)
+    result = await db.execute(keyset(q, TunnelClient, page))
+    rows, next_cursor = split_page(result.scalars().all(), page)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
 
 
 @router.get("/{client_id}", response_model=TunnelClientRead)
@@ -43,8 +69,11 @@ async def update_tunnel_client(
     client = result.scalar_one_or_none()
     if not client:
         raise HTTPException(status_code=404, detail="Tunnel client not found")
+    old_server_id, old_peer = client.tunnel_server_id, configured_peer_params(client)
     for field, value in body.model_dump(exclude_none=True).items():
         setattr(client, field, value)
+    await db.flush()
+    state = await record_peer_change(old_server_id, old_peer, client, db)
     await db.commit()
     await db.refresh(client)
 
@@ -55,18 +84,16 @@ async def update_tunnel_client(
         )
         server = result.scalar_one_or_none()
         if server:
-            await _configure_tunnel(client, server, db)
+            await _configure_tunnel(client, server, db, state)
 
     return client
 
 
-async def _configure_tunnel(client: TunnelClient, server: TunnelServer, db: AsyncSession):
-    """Send wg_add_peer to the server agent and wg_configure to the client agent."""
+async def _configure_tunnel(client: TunnelClient, server: TunnelServer, db: AsyncSession, state: dict | None = None):
+    """Send wg_add_peer to the server agent and wg_configure to the client agent.
 
-    # Build allowed IPs for this peer on the server side
-    allowed_ips = [client.tunnel_ip + "/32"]
-    if client.is_gateway and client.vm_network:
-        allowed_ips.append(client.vm_network)
+    state is the server's generation/hash for this peer change, if it was one.
+    """
 
     # 1. Tell the server to add this client as a peer
     #    (the client's public key may not be available yet — the client agent
@@ -76,12 +103,7 @@ async def _configure_tunnel(client: TunnelClient, server: TunnelServer, db: Asyn
         sent, cmd_id = await send_command(
             agent_id=str(server.agent_id),
             command_type="wg_add_peer",
-            params={
-                "peer_name": f"client-{client.tunnel_ip}",
-                "public_key": client.wg_public_key,
-                "tunnel_ip": client.tunnel_ip,
-                "allowed_ips": allowed_ips,
-            },
+            params={**peer_params(client), **(state or {})},
             db=db,
         )
         if sent:
@@ -125,5 +147,9 @@ async def delete_tunnel_client(
     client = result.scalar_one_or_none()
     if not client:
         raise HTTPException(status_code=404, detail="Tunnel client not found")
+    # Its peer and forwards leave the server's desired state with it
+    removed = await collect_client_removal(client, db)
     await db.delete(client)
+    await db.flush()
+    await record_changes(removed, db)
     await db.commit()
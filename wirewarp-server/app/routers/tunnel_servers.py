@@ -1,6 +1,6 @@
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
@@ -9,7 +9,9 @@ from app.models.tunnel_server import TunnelServer
 from app.models.user import User
 from app.schemas.tunnel_server import TunnelServerRead, TunnelServerUpdate
 from app.auth import get_current_user
-from app.services.agent_commands import send_command
+from app.pagination import NEXT_CURSOR_HEADER, PageParams, page_params, keyset, split_page
+from app.services.agent_commands import send_command, send_state
+from app.services.agent_state import bump_generation, load_desired_state
 
 logger = logging.getLogger(__name__)
 
@@ -17,9 +19,17 @@ router = APIRouter()
 
 
 @router.get("", response_model=list[TunnelServerRead])
-async def list_tunnel_servers(db: AsyncSession = Depends(get_db), _: User = Depends(get_current_user)):
-    result = await db.execute(select(TunnelServer).order_by(TunnelServer.created_at.desc()))
-    return result.scalars().all()
+async def list_tunnel_servers(
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(get_current_user),
+):
+    result = await db.execute(keyset(select(TunnelServer), TunnelServer, page))
+    rows, next_cursor = split_page(result.scalars().all(), page)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
 
 
 @router.get("/{server_id}", response_model=TunnelServerRead)
@@ -44,6 +54,10 @@ async def update_tunnel_server(
         raise HTTPException(status_code=404, detail="Tunnel server not found")
     for field, value in body.model_dump(exclude_none=True).items():
         setattr(server, field, value)
+    await db.flush()
+    # wg_init rebuilds the agent's interface config, so agents behind this
+    # generation need a full snapshot rather than a delta
+    state = await bump_generation(server.id, [("reset", "add", None)], db)
     await db.commit()
     await db.refresh(server)
 
@@ -65,6 +79,10 @@ async def update_tunnel_server(
     )
     if not sent:
         logger.warning("Agent %s not connected — wg_init queued (cmd=%s)", server.agent_id, cmd_id)
+    else:
+        # Re-apply forwards and peers onto the freshly initialised interface
+        forwards, peers = await load_desired_state(str(server.agent_id), db)
+        await send_state(str(server.agent_id), forwards, peers, db, **state)
 
     return server
 
@@ -5,3 +5,7 @@ from app.schemas.tunnel_client import TunnelClientCreate, TunnelClientRead, Tunn
 from app.schemas.port_forward import PortForwardCreate, PortForwardRead, PortForwardUpdate
 from app.schemas.service_template import ServiceTemplateRead, ServiceTemplateCreate
 from app.schemas.user import UserCreate, UserRead, LoginRequest, TokenResponse
+from app.schemas.command_log import CommandLogRead
+from app.schemas.metric import MetricSeries, MetricPoint, MetricStat, MetricsIngestStats, LiveMetrics
+from app.schemas.fleet import FleetTraffic, FleetServerTraffic, FleetPeerTraffic
+from app.schemas.alert import AlertRead, AlertRuleCreate, AlertRuleRead, AlertRuleUpdate
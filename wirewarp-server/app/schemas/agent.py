@@ -26,3 +26,15 @@ class AgentRead(BaseModel):
 class AgentJWTRead(BaseModel):
     agent_id: uuid.UUID
     jwt: str
+
+
+class AgentConnectionStats(BaseModel):
+    agent_id: str
+    agent_type: str | None
+    queue_depth: int
+    queue_size: int
+    sent: int
+    dropped: int
+    last_send_latency_ms: float | None
+    avg_send_latency_ms: float | None
+    max_send_latency_ms: float | None
@@ -0,0 +1,45 @@
+import uuid
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class AlertRuleCreate(BaseModel):
+    name: str
+    kind: str  # 'cpu_high' | 'handshake_stale' | 'rx_stalled'
+    threshold: float  # percent for cpu_high, seconds otherwise
+    duration_seconds: int = 0
+    enabled: bool = True
+
+
+class AlertRuleUpdate(BaseModel):
+    threshold: float | None = None
+    duration_seconds: int | None = None
+    enabled: bool | None = None
+
+
+class AlertRuleRead(BaseModel):
+    id: uuid.UUID
+    name: str
+    kind: str
+    threshold: float
+    duration_seconds: int
+    enabled: bool
+    is_builtin: bool
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class AlertRead(BaseModel):
+    id: int
+    rule_id: uuid.UUID
+    agent_id: uuid.UUID
+    subject: str | None
+    state: str  # 'firing' | 'resolved'
+    value: float | None
+    message: str
+    fired_at: datetime
+    resolved_at: datetime | None
+
+    model_config = {"from_attributes": True}
@@ -0,0 +1,17 @@
+import uuid
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class CommandLogRead(BaseModel):
+    id: uuid.UUID
+    agent_id: uuid.UUID | None
+    command_type: str
+    params: dict | None
+    success: bool | None
+    output: str | None
+    output_external: bool = False  # output is a preview in lists; GET /api/commands/{id} returns it whole
+    executed_at: datetime
+
+    model_config = {"from_attributes": True}
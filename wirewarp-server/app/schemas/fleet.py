@@ -0,0 +1,33 @@
+import uuid
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class FleetServerTraffic(BaseModel):
+    agent_id: uuid.UUID
+    tunnel_server_id: uuid.UUID | None
+    name: str | None
+    peers: int
+    rx_rate: float  # bytes/s
+    tx_rate: float
+
+
+class FleetPeerTraffic(BaseModel):
+    agent_id: uuid.UUID  # reporting server agent
+    public_key: str
+    tunnel_client_id: uuid.UUID | None
+    rx_rate: float  # bytes/s
+    tx_rate: float
+    last_handshake: datetime | None
+    seconds_since_handshake: float | None = None
+
+
+class FleetTraffic(BaseModel):
+    generated_at: datetime
+    peers: int
+    rx_rate: float
+    tx_rate: float
+    servers: list[FleetServerTraffic]
+    top_peers: list[FleetPeerTraffic]
+    stale_peers: list[FleetPeerTraffic]
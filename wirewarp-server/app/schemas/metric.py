@@ -0,0 +1,54 @@
+import uuid
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class MetricStat(BaseModel):
+    min: float | None
+    max: float | None
+    avg: float | None
+
+
+class MetricPoint(BaseModel):
+    bucket: datetime
+    samples: int
+    cpu: MetricStat
+    mem: MetricStat
+    disk: MetricStat
+    rx_bytes: int
+    tx_bytes: int
+
+
+class MetricSeries(BaseModel):
+    agent_id: uuid.UUID
+    resolution: str  # '1m' | '1h' | '1d'
+    start: datetime
+    end: datetime
+    points: list[MetricPoint]
+
+
+class LivePeerSeries(BaseModel):
+    timestamps: list[float]  # unix seconds
+    rx_rate: list[float | None]  # bytes/s
+    tx_rate: list[float | None]
+
+
+class LiveMetrics(BaseModel):
+    agent_id: uuid.UUID
+    capacity: int
+    timestamps: list[float]  # unix seconds
+    cpu_percent: list[float | None]
+    mem_used_mb: list[float | None]
+    rx_rate: list[float | None]  # bytes/s summed over peers
+    tx_rate: list[float | None]
+    peers: dict[str, LivePeerSeries]  # keyed by peer public key
+
+
+class MetricsIngestStats(BaseModel):
+    queued: int
+    queue_size: int
+    written: int
+    batches: int
+    dropped: int
+    failed: int
@@ -0,0 +1,119 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.config import settings
+
+
+class AdmissionRejected(Exception):
+    """The connect queue is full; the agent should come back after retry_after seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"admission queue full, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounds how many agents run the auth + state replay phase of a connect at once.
+
+    Agents beyond max_active wait in a FIFO queue, so they are admitted in
+    arrival order. Beyond max_waiting they are turned away with a retry_after
+    hint: each rejected agent is given the next free turn after the current
+    backlog (and after earlier rejected agents), so a reconnect storm comes
+    back spread out at the rate slots free up instead of all at once.
+    """
+
+    def __init__(
+        self,
+        max_active: int = settings.ADMISSION_MAX_ACTIVE,
+        max_waiting: int = settings.ADMISSION_MAX_WAITING,
+        retry_min: float = settings.ADMISSION_RETRY_MIN_SECONDS,
+        retry_jitter: float = settings.ADMISSION_RETRY_JITTER,
+    ):
+        self.max_active = max(1, max_active)
+        self.max_waiting = max_waiting
+        self.retry_min = retry_min
+        self.retry_jitter = retry_jitter
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self.avg_hold: float | None = None  # EWMA of seconds an admitted agent holds its slot
+        self._retry_horizon = 0.0  # monotonic time of the last turn handed out to a rejected agent
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> float:
+        """Reserve the next free turn after the backlog; seconds until it, give or take retry_jitter."""
+        # Turns are already spaced apart, so the jitter only has to break up agents
+        # handed out close turns; it is not scaled with the delay, or it would stretch the tail
+        jitter = random.uniform(-self.retry_jitter, self.retry_jitter)
+        if self.avg_hold is None:
+            # Nobody has finished yet, so there is no drain rate to space agents out by
+            return self.retry_min + abs(jitter)
+        now = time.monotonic()
+        step = self.avg_hold / self.max_active  # one slot frees up this often
+        self._retry_horizon = max(self._retry_horizon, now + step * (self.active + self.waiting)) + step
+        return max(self.retry_min, self._retry_horizon - now + jitter)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold an admission slot for the body; raises AdmissionRejected if the queue is full."""
+        await self._acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    async def _acquire(self) -> None:
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_waiting:
+            self.rejected += 1
+            raise AdmissionRejected(self.retry_after())
+        turn = asyncio.get_running_loop().create_future()
+        self._waiters.append(turn)
+        try:
+            await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled():
+                # The slot was handed over just as the agent went away; pass it on
+                self._release(None)
+            else:
+                self._waiters.remove(turn)
+            raise
+        self.admitted += 1
+
+    def _release(self, held: float | None) -> None:
+        if held is not None:
+            self.avg_hold = held if self.avg_hold is None else 0.8 * self.avg_hold + 0.2 * held
+        # Hand the slot straight to the oldest waiter; active stays the same
+        while self._waiters:
+            turn = self._waiters.popleft()
+            if not turn.done():
+                turn.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_active": self.max_active,
+            "max_waiting": self.max_waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_hold_seconds": self.avg_hold,
+        }
+
+
+# Module-level singleton gating /ws/agent connects
+admission = AdmissionController()
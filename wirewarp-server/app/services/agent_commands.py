@@ -3,8 +3,11 @@ from typing import Any
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.models.command_log import CommandLog
-from app.websocket.hub import manager
+from app.services import outbox
+from app.services.pending_commands import pending_commands
+from app.websocket.relay import relay
 
 
 VALID_COMMAND_TYPES = {
@@ -19,6 +22,8 @@ VALID_COMMAND_TYPES = {
     "gateway_up",
     "gateway_down",
     "agent_update",
+    "apply_state",
+    "report_state",
 }
 
 
@@ -32,7 +37,10 @@ async def send_command(
     Build a command message, log it, and send it to the agent.
 
     Returns (sent: bool, command_id: str).
-    sent=False means the agent is not currently connected.
+    sent=False means the agent is not currently connected, in which case the
+    command is kept in the agent's outbox and delivered when it reconnects (see
+    outbox.enqueue), or that its connection's send queue turned the frame away,
+    in which case the command is logged as failed.
     """
     if command_type not in VALID_COMMAND_TYPES:
         raise ValueError(f"Unknown command type: {command_type}")
@@ -56,5 +64,97 @@ async def send_command(
     db.add(log)
     await db.commit()
 
-    sent = await manager.send(agent_id, message)
+    # Registered before sending so a fast reply cannot beat the registration
+    pending_commands.register(command_id, agent_id)
+    sent = await relay.send(agent_id, message)
+    if not sent:
+        await _not_delivered(log, db)
     return sent, command_id
+
+
+async def _not_delivered(log: CommandLog, db: AsyncSession) -> None:
+    """Settle a command whose frame was not sent: fail it, or leave it in the agent's outbox."""
+    agent_id, command_id = str(log.agent_id), str(log.id)
+    pending_commands.discard(command_id)
+    if relay.is_connected(agent_id):
+        # The outbox is only drained on reconnect, so parking it there could hold it indefinitely
+        log.success = False
+        log.output = "Agent send queue full — command not delivered"
+    else:
+        await outbox.enqueue(agent_id, command_id, log.command_type, log.params, db)
+    await db.commit()
+
+
+async def send_state(
+    agent_id: str,
+    forwards: list[dict[str, Any]],
+    peers: list[dict[str, Any]],
+    db: AsyncSession,
+    remove_forwards: list[dict[str, Any]] = (),
+    remove_peers: list[dict[str, Any]] = (),
+    mode: str = "full",
+    generation: int | None = None,
+    state_hash: str | None = None,
+) -> tuple[bool, str]:
+    """
+    Send a server agent a batch of forwards and peers as one apply_state command.
+
+    mode is 'full' (the whole desired state) or 'delta' (changes since the
+    agent's last applied generation, including removals). Logged as a single
+    command_log row (params hold counts, not the full state). Large batches are
+    split into frames of STATE_REPLAY_CHUNK_SIZE entries that share the command
+    id; the agent reports a result per frame and records generation/state_hash
+    once the last frame applies cleanly. The command counts as answered, for
+    pending_commands, once every frame has reported.
+
+    Returns (sent: bool, command_id: str).
+    """
+    command_id = str(uuid.uuid4())
+    chunk_size = max(1, settings.STATE_REPLAY_CHUNK_SIZE)
+    # Removals first so a rule replaced on the same port is torn down before its successor
+    entries = (
+        [("remove_forwards", f) for f in remove_forwards]
+        + [("remove_peers", p) for p in remove_peers]
+        + [("forwards", f) for f in forwards]
+        + [("peers", p) for p in peers]
+    )
+    chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)] or [[]]
+
+    log = CommandLog(
+        id=command_id,
+        agent_id=agent_id,
+        command_type="apply_state",
+        params={
+            "mode": mode,
+            "generation": generation,
+            "forwards": len(forwards),
+            "peers": len(peers),
+            "remove_forwards": len(remove_forwards),
+            "remove_peers": len(remove_peers),
+            "chunks": len(chunks),
+        },
+        success=None,
+        output=None,
+    )
+    db.add(log)
+    await db.commit()
+
+    pending_commands.register(command_id, agent_id, results=len(chunks))
+    for index, chunk in enumerate(chunks):
+        params: dict[str, Any] = {
+            "mode": mode,
+            "generation": generation,
+            "state_hash": state_hash,
+            "chunk": index,
+            "chunks": len(chunks),
+            "forwards": [],
+            "peers": [],
+            "remove_forwards": [],
+            "remove_peers": [],
+        }
+        for kind, entry in chunk:
+            params[kind].append(entry)
+        if not await relay.send(agent_id, {"id": command_id, "type": "apply_state", "params": params}):
+            await _not_delivered(log, db)
+            return False, command_id
+    return True, command_id
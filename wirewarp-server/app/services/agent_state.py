@@ -0,0 +1,307 @@
+import hashlib
+import uuid
+from typing import Any
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.port_forward import PortForward
+from app.models.state_change import StateChange
+from app.models.tunnel_client import TunnelClient
+from app.models.tunnel_server import TunnelServer
+
+
+def forward_params(pf: PortForward) -> dict[str, Any]:
+    """Params for iptables_add_forward / iptables_remove_forward."""
+    return {
+        "protocol": pf.protocol,
+        "public_port": pf.public_port,
+        "destination_ip": pf.destination_ip,
+        "destination_port": pf.destination_port,
+    }
+
+
+def peer_params(client: TunnelClient) -> dict[str, Any]:
+    """Params for wg_add_peer on the client's tunnel server."""
+    allowed_ips = [client.tunnel_ip + "/32"]
+    if client.is_gateway and client.vm_network:
+        allowed_ips.append(client.vm_network)
+    return {
+        "peer_name": f"client-{client.tunnel_ip}",
+        "public_key": client.wg_public_key,
+        "tunnel_ip": client.tunnel_ip,
+        "allowed_ips": allowed_ips,
+    }
+
+
+async def load_desired_state(agent_id: str, db: AsyncSession) -> tuple[list[dict], list[dict]]:
+    """Return (forwards, peers) that a server agent should have applied.
+
+    One query per entity type, joined through tunnel_servers on agent_id.
+    Client agents have no server-side state and get two empty lists.
+    """
+    pf_result = await db.execute(
+        select(PortForward)
+        .join(TunnelServer, PortForward.tunnel_server_id == TunnelServer.id)
+        .where(
+            TunnelServer.agent_id == agent_id,
+            PortForward.active == True,  # noqa: E712
+        )
+    )
+    forwards = [forward_params(pf) for pf in pf_result.scalars()]
+
+    clients_result = await db.execute(
+        select(TunnelClient)
+        .join(TunnelServer, TunnelClient.tunnel_server_id == TunnelServer.id)
+        .where(
+            TunnelServer.agent_id == agent_id,
+            TunnelClient.wg_public_key.is_not(None),
+            TunnelClient.tunnel_ip.is_not(None),
+        )
+    )
+    peers = [peer_params(client) for client in clients_result.scalars()]
+
+    return forwards, peers
+
+
+# --- desired-state generations ---
+
+def entry_key(kind: str, params: dict[str, Any]) -> tuple:
+    """Identity of a forward or peer: what a later change to the same rule replaces.
+
+    Forwards are keyed on the full rule (a DNAT rule is removed by exact match),
+    peers on their public key (wg_add_peer replaces an existing peer).
+    """
+    if kind == "forward":
+        return ("forward", params["protocol"], params["public_port"], params["destination_ip"], params["destination_port"])
+    return ("peer", params["public_key"])
+
+
+def _entry_digest(kind: str, params: dict[str, Any]) -> int:
+    if kind == "forward":
+        canonical = f"forward|{params['protocol']}|{params['public_port']}|{params['destination_ip']}|{params['destination_port']}"
+    else:
+        canonical = f"peer|{params['public_key']}|{','.join(sorted(params.get('allowed_ips') or []))}"
+    return int.from_bytes(hashlib.sha256(canonical.encode()).digest()[:16], "big")
+
+
+def state_hash(forwards: list[dict[str, Any]], peers: list[dict[str, Any]]) -> str:
+    """Order-independent content hash of a forward/peer set (XOR of per-entry digests)."""
+    acc = 0
+    for f in forwards:
+        acc ^= _entry_digest("forward", f)
+    for p in peers:
+        acc ^= _entry_digest("peer", p)
+    return f"{len(forwards)}:{len(peers)}:{acc:032x}"
+
+
+def update_state_hash(current: str, changes: list[tuple[str, str, dict[str, Any] | None]]) -> str:
+    """
+    Apply forward/peer adds and removes to a state_hash without reloading the set.
+
+    XOR is its own inverse, so a removed entry's digest is XORed out the same
+    way an added one is XORed in. Removes must carry the full entry as it was
+    applied (a peer's allowed_ips included), and a changed entry is a remove of
+    the old one plus an add of the new one. 'reset' changes leave the hash alone.
+    """
+    n_forwards, n_peers, digest = current.split(":")
+    counts = {"forward": int(n_forwards), "peer": int(n_peers)}
+    acc = int(digest, 16)
+    for kind, op, params in changes:
+        if kind not in counts:
+            continue
+        acc ^= _entry_digest(kind, params)
+        counts[kind] += 1 if op == "add" else -1
+    return f"{counts['forward']}:{counts['peer']}:{acc:032x}"
+
+
+async def bump_generation(
+    server_id: uuid.UUID | str,
+    changes: list[tuple[str, str, dict[str, Any] | None]],
+    db: AsyncSession,
+) -> dict[str, Any]:
+    """
+    Record forward/peer changes for a tunnel server and bump its state generation.
+
+    changes is a list of (kind, op, params) — kind 'forward' | 'peer' | 'reset',
+    op 'add' | 'remove'. params is the full entry, for removes too (see
+    update_state_hash); peer removes are journaled by public key only. Call
+    after the change is flushed and before commit, so the journal, generation
+    and hash land in the same transaction as the change.
+
+    Returns {"generation", "state_hash"} to attach to the command that carries
+    the change, so a connected agent can advance its applied generation.
+    """
+    server = await db.get(TunnelServer, server_id, with_for_update=True)
+    if server is None:
+        return {}
+    server.state_generation = (server.state_generation or 0) + 1
+    for kind, op, params in changes:
+        if kind == "peer" and op == "remove":
+            params = {"public_key": params["public_key"]}
+        db.add(StateChange(
+            tunnel_server_id=server.id,
+            generation=server.state_generation,
+            kind=kind,
+            op=op,
+            params=params,
+        ))
+
+    if server.state_hash is None:
+        # First change since the hash was introduced: derive it from the (already flushed) state
+        forwards, peers = await load_desired_state(str(server.agent_id), db)
+        server.state_hash = state_hash(forwards, peers)
+    else:
+        server.state_hash = update_state_hash(server.state_hash, changes)
+
+    # Keep the journal bounded; agents further behind than this get a full snapshot
+    await db.execute(
+        delete(StateChange).where(
+            StateChange.tunnel_server_id == server.id,
+            StateChange.generation <= server.state_generation - settings.STATE_JOURNAL_MAX_GENERATIONS,
+        )
+    )
+    return {"generation": server.state_generation, "state_hash": server.state_hash}
+
+
+def configured_peer_params(client: TunnelClient) -> dict[str, Any] | None:
+    """peer_params for a client that currently belongs on a server's peer list, else None."""
+    if client.tunnel_server_id and client.wg_public_key and client.tunnel_ip:
+        return peer_params(client)
+    return None
+
+
+async def record_peer_change(
+    old_server_id: uuid.UUID | None,
+    old_params: dict[str, Any] | None,
+    client: TunnelClient,
+    db: AsyncSession,
+) -> dict[str, Any] | None:
+    """
+    Journal the peer add/remove implied by a client changing server, key or IP.
+
+    old_* describe the client before the change (see configured_peer_params).
+    Returns the new server's generation/hash if a wg_add_peer is now due.
+    """
+    new_params = configured_peer_params(client)
+    if new_params == old_params and old_server_id == client.tunnel_server_id:
+        return None
+    # A peer whose key stays the same is still journaled as remove + add, so the
+    # old entry's digest comes out of the state hash (wg_add_peer replaces it in place)
+    changes: dict[uuid.UUID, list[tuple[str, str, dict[str, Any] | None]]] = {}
+    if old_params:
+        changes.setdefault(old_server_id, []).append(("peer", "remove", old_params))
+    if new_params:
+        changes.setdefault(client.tunnel_server_id, []).append(("peer", "add", new_params))
+
+    state = await record_changes(changes, db)
+    return state.get(client.tunnel_server_id)
+
+
+def client_removal_changes(
+    client: TunnelClient, forwards: list[PortForward]
+) -> dict[uuid.UUID, list[tuple[str, str, dict[str, Any]]]]:
+    """Removes of a client's peer and active forwards, per tunnel server (see collect_client_removal)."""
+    changes: dict[uuid.UUID, list[tuple[str, str, dict[str, Any]]]] = {}
+    if peer := configured_peer_params(client):
+        changes.setdefault(client.tunnel_server_id, []).append(("peer", "remove", peer))
+    for pf in forwards:
+        if pf.active:
+            changes.setdefault(pf.tunnel_server_id, []).append(("forward", "remove", forward_params(pf)))
+    return changes
+
+
+async def collect_client_removal(client: TunnelClient, db: AsyncSession) -> dict[uuid.UUID, list]:
+    """
+    Journal entries for deleting a client, whose forwards go with it by cascade.
+
+    Call before the delete, while the forwards can still be loaded, and pass
+    the result to record_changes once the delete is flushed.
+    """
+    result = await db.execute(select(PortForward).where(PortForward.tunnel_client_id == client.id))
+    return client_removal_changes(client, list(result.scalars()))
+
+
+async def record_changes(
+    changes: dict[uuid.UUID, list[tuple[str, str, dict[str, Any] | None]]], db: AsyncSession
+) -> dict[uuid.UUID, dict[str, Any]]:
+    """bump_generation for each server's changes; returns each server's new generation/hash."""
+    return {
+        server_id: await bump_generation(server_id, server_changes, db)
+        for server_id, server_changes in changes.items()
+    }
+
+
+def collapse_changes(changes: list[StateChange]) -> dict[str, list[dict[str, Any]]]:
+    """A journal slice as one delta: the last change to each rule wins."""
+    latest: dict[tuple, StateChange] = {}
+    for change in changes:
+        latest[entry_key(change.kind, change.params)] = change
+    delta = {"forwards": [], "peers": [], "remove_forwards": [], "remove_peers": []}
+    for change in latest.values():
+        bucket = f"{change.kind}s" if change.op == "add" else f"remove_{change.kind}s"
+        delta[bucket].append(change.params)
+    return delta
+
+
+async def sync_agent_state(
+    agent_id: str,
+    reported_generation: int | None,
+    reported_hash: str | None,
+    db: AsyncSession,
+) -> str:
+    """
+    Bring a reconnecting server agent up to date with as little as possible.
+
+    Sends nothing if the agent already applied the current generation, a delta
+    built from the state_changes journal if the gap is covered by it, and a full
+    snapshot otherwise. Returns 'none', 'delta' or 'full'.
+    """
+    from app.services.agent_commands import send_state
+
+    result = await db.execute(select(TunnelServer).where(TunnelServer.agent_id == agent_id))
+    server = result.scalar_one_or_none()
+    if server is None:
+        return "none"
+    current = server.state_generation or 0
+
+    if reported_generation == current and (reported_hash is None or reported_hash == server.state_hash):
+        return "none"
+
+    changes: list[StateChange] = []
+    if reported_generation is not None and 0 <= reported_generation < current:
+        changes_result = await db.execute(
+            select(StateChange)
+            .where(
+                StateChange.tunnel_server_id == server.id,
+                StateChange.generation > reported_generation,
+            )
+            .order_by(StateChange.generation, StateChange.id)
+        )
+        changes = list(changes_result.scalars())
+
+    journal_covers_gap = (
+        changes
+        and changes[0].generation == reported_generation + 1
+        and not any(c.kind == "reset" for c in changes)
+    )
+    if not journal_covers_gap:
+        forwards, peers = await load_desired_state(agent_id, db)
+        if server.state_hash is None:
+            server.state_hash = state_hash(forwards, peers)
+            await db.commit()
+        await send_state(agent_id, forwards, peers, db, generation=current, state_hash=server.state_hash)
+        return "full"
+
+    delta = collapse_changes(changes)
+
+    await send_state(
+        agent_id, delta["forwards"], delta["peers"], db,
+        remove_forwards=delta["remove_forwards"],
+        remove_peers=delta["remove_peers"],
+        mode="delta",
+        generation=current,
+        state_hash=server.state_hash,
+    )
+    return "delta"
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.alert import Alert
+from app.models.alert_rule import AlertRule
+from app.services.wg_peers import peer_counters, handshake_time
+
+logger = logging.getLogger(__name__)
+
+# Rules evaluated once per metrics frame vs once per reported peer
+AGENT_RULE_KINDS = {"cpu_high"}
+PEER_RULE_KINDS = {"handshake_stale", "rx_stalled"}
+RULE_KINDS = AGENT_RULE_KINDS | PEER_RULE_KINDS
+
+BUILTIN_RULES = [
+    {"name": "Stale handshake", "kind": "handshake_stale", "threshold": 300, "duration_seconds": 0},
+    {"name": "RX stalled", "kind": "rx_stalled", "threshold": 600, "duration_seconds": 0},
+    {"name": "High CPU", "kind": "cpu_high", "threshold": 90, "duration_seconds": 300},
+]
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: uuid.UUID
+    name: str
+    kind: str
+    threshold: float
+    duration: float
+
+
+@dataclass
+class AlertEvent:
+    op: str  # 'fire' | 'resolve'
+    rule_id: uuid.UUID
+    agent_id: str
+    subject: str | None
+    at: float  # unix seconds
+    value: float | None = None
+    message: str = ""
+
+
+class _State:
+    __slots__ = ("since", "firing", "last_rx", "rx_changed_at", "handshake_raw", "handshake")
+
+    def __init__(self):
+        self.since: float | None = None  # when the condition started holding
+        self.firing = False
+        self.last_rx: int | None = None
+        self.rx_changed_at = 0.0
+        # Last handshake string and its parsed value, re-parsed only when it changes
+        self.handshake_raw: str | None = None
+        self.handshake: float | None = None
+
+    def step(self, ts: float, held: bool, duration: float) -> str | None:
+        """Advance the condition; returns 'fire' or 'resolve' on a transition."""
+        if not held:
+            self.since = None
+            if self.firing:
+                self.firing = False
+                return "resolve"
+            return None
+        if self.since is None:
+            self.since = ts
+        if not self.firing and ts - self.since >= duration:
+            self.firing = True
+            return "fire"
+        return None
+
+
+class AlertEvaluator:
+    """Evaluates alert rules against each metrics frame as it arrives.
+
+    Holds a few scalars per (rule, agent, peer) and nothing else — never reads
+    the metrics table. Returns fire/resolve transitions only, so steady state
+    produces no events and formats no messages.
+    """
+
+    def __init__(self, rules: list[Rule] | None = None):
+        self.rules: list[Rule] = rules or []
+        # (rule_id, agent_id) -> subject (peer public key, None for agent rules) -> state
+        self._state: dict[tuple[uuid.UUID, str], dict[str | None, _State]] = {}
+
+    def set_rules(self, rules: list[Rule]) -> None:
+        """Swap the rule set, keeping state for rules that are still present."""
+        ids = {r.id for r in rules}
+        self._state = {k: v for k, v in self._state.items() if k[0] in ids}
+        self.rules = rules
+
+    def mark_firing(self, rule_id: uuid.UUID, agent_id: str, subject: str | None) -> None:
+        """Restore an alert that is already firing in the DB, so it is resolved rather than re-fired."""
+        state = self._state.setdefault((rule_id, agent_id), {}).setdefault(subject, _State())
+        state.firing = True
+
+    def forget(self, agent_id: str) -> None:
+        self._state = {k: v for k, v in self._state.items() if k[1] != agent_id}
+
+    def evaluate(self, agent_id: str, ts: float, data: dict[str, Any]) -> list[AlertEvent]:
+        events: list[AlertEvent] = []
+        peers = None
+        for rule in self.rules:
+            states = self._state.get((rule.id, agent_id))
+            if states is None:
+                states = self._state[(rule.id, agent_id)] = {}
+
+            if rule.kind == "cpu_high":
+                cpu = (data.get("system") or {}).get("cpu_percent")
+                if not isinstance(cpu, (int, float)):
+                    continue
+                state = states.get(None)
+                if state is None:
+                    state = states[None] = _State()
+                op = state.step(ts, cpu > rule.threshold, rule.duration)
+                if op:
+                    events.append(AlertEvent(op, rule.id, agent_id, None, ts, float(cpu),
+                                             f"{rule.name}: CPU at {cpu:.0f}% (threshold {rule.threshold:.0f}%)"))
+                continue
+
+            if peers is None:
+                peers = [(key, rx, peer) for key, rx, _, peer in peer_counters(data.get("peers"))]
+            stale_check = rule.kind == "handshake_stale"
+            for key, rx, peer in peers:
+                state = states.get(key)
+                if state is None:
+                    state = states[key] = _State()
+                if stale_check:
+                    raw = peer.get("last_handshake")
+                    if raw != state.handshake_raw:
+                        state.handshake_raw = raw
+                        handshake = handshake_time(raw)
+                        state.handshake = handshake.timestamp() if handshake else None
+                    value = ts - state.handshake if state.handshake is not None else None
+                    held = value is None or value > rule.threshold
+                else:  # rx_stalled
+                    if rx != state.last_rx:
+                        state.last_rx = rx
+                        state.rx_changed_at = ts
+                    value = ts - state.rx_changed_at
+                    held = value >= rule.threshold
+                op = state.step(ts, held, rule.duration)
+                if op:
+                    events.append(AlertEvent(op, rule.id, agent_id, key, ts, value,
+                                             f"{rule.name}: {_peer_message(rule.kind, value)}"))
+
+            # Peers no longer reported cannot stay in alert
+            if len(states) > len(peers):
+                present = {key for key, _, _ in peers}
+                for key in [k for k in states if k not in present]:
+                    if states[key].firing:
+                        events.append(AlertEvent("resolve", rule.id, agent_id, key, ts, message="Peer removed"))
+                    del states[key]
+        return events
+
+
+def _peer_message(kind: str, value: float | None) -> str:
+    if kind == "handshake_stale":
+        return f"No handshake for {value:.0f}s" if value is not None else "Peer never completed a handshake"
+    return f"No data received for {value:.0f}s"
+
+
+class AlertPipeline:
+    """The evaluator plus a bounded queue of transitions written by a background task."""
+
+    def __init__(self, queue_size: int = settings.ALERT_QUEUE_SIZE):
+        self.evaluator = AlertEvaluator()
+        self.queue: asyncio.Queue[AlertEvent] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def process(self, agent_id: str, timestamp: datetime, data: dict[str, Any]) -> None:
+        for event in self.evaluator.evaluate(agent_id, timestamp.timestamp(), data):
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def load(self, db: AsyncSession) -> None:
+        """Seed built-in rules, load enabled rules and restore alerts that are still firing."""
+        await seed_builtin_rules(db)
+        await self.reload_rules(db)
+        result = await db.execute(
+            select(Alert.rule_id, Alert.agent_id, Alert.subject).where(Alert.state == "firing")
+        )
+        for rule_id, agent_id, subject in result.all():
+            self.evaluator.mark_firing(rule_id, str(agent_id), subject)
+
+    async def reload_rules(self, db: AsyncSession) -> None:
+        result = await db.execute(select(AlertRule).where(AlertRule.enabled == True))  # noqa: E712
+        self.evaluator.set_rules([
+            Rule(r.id, r.name, r.kind, r.threshold, r.duration_seconds or 0)
+            for r in result.scalars() if r.kind in RULE_KINDS
+        ])
+
+    async def run(self) -> None:
+        """Background task: persist fired/resolved transitions in batches."""
+        while True:
+            events = [await self.queue.get()]
+            while not self.queue.empty() and len(events) < 500:
+                events.append(self.queue.get_nowait())
+            try:
+                async with SessionLocal() as db:
+                    await write_events(events, db)
+            except Exception:
+                logger.exception("Failed to store %d alert event(s)", len(events))
+
+
+async def write_events(events: list[AlertEvent], db: AsyncSession) -> None:
+    fired = [
+        {
+            "rule_id": e.rule_id,
+            "agent_id": uuid.UUID(e.agent_id),
+            "subject": e.subject,
+            "state": "firing",
+            "value": e.value,
+            "message": e.message,
+            "fired_at": datetime.fromtimestamp(e.at, tz=timezone.utc),
+        }
+        for e in events if e.op == "fire"
+    ]
+    if fired:
+        await db.execute(insert(Alert), fired)
+    for e in events:
+        if e.op != "resolve":
+            continue
+        await db.execute(
+            update(Alert)
+            .where(
+                Alert.rule_id == e.rule_id,
+                Alert.agent_id == e.agent_id,
+                Alert.subject.is_not_distinct_from(e.subject),
+                Alert.state == "firing",
+            )
+            .values(state="resolved", resolved_at=datetime.fromtimestamp(e.at, tz=timezone.utc))
+        )
+    await db.commit()
+    for e in events:
+        logger.info("Alert %s for agent %s%s", "fired" if e.op == "fire" else "resolved",
+                    e.agent_id, f" peer {e.subject}" if e.subject else "")
+
+
+async def resolve_rule_alerts(rule_id: uuid.UUID, db: AsyncSession) -> None:
+    """Resolve a disabled rule's open alerts: nothing evaluates it any more, so nothing else would. Does not commit."""
+    await db.execute(
+        update(Alert)
+        .where(Alert.rule_id == rule_id, Alert.state == "firing")
+        .values(state="resolved", resolved_at=datetime.now(timezone.utc))
+    )
+
+
+async def seed_builtin_rules(db: AsyncSession) -> None:
+    for rule in BUILTIN_RULES:
+        result = await db.execute(select(AlertRule).where(AlertRule.name == rule["name"]))
+        if not result.scalar_one_or_none():
+            db.add(AlertRule(**rule, is_builtin=True))
+    await db.commit()
+
+
+# Module-level singleton fed by the WebSocket metrics handler
+alerts = AlertPipeline()
@@ -0,0 +1,115 @@
+import secrets
+from functools import lru_cache
+from typing import Callable
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session, ORMExecuteState
+
+from app.database import Base
+
+# Tables list endpoints derive ETags from; only their bumps are worth telling other workers about
+ETAG_TABLES = frozenset({"agents", "tunnel_clients", "port_forwards"})
+
+
+class ChangeVersions:
+    """Per-table change counters, bumped when a session that wrote to the table commits.
+
+    List endpoints derive weak ETags from these so an unchanged list can be
+    answered with 304 before it is queried. Counters are in-process and start
+    over on restart; the random epoch keeps ETags from one run from matching
+    the next. With several workers, bumps are relayed (see websocket.relay) and
+    ETags still differ per worker, which only costs a cache miss.
+    """
+
+    def __init__(self):
+        self.epoch = secrets.token_hex(4)
+        self._versions: dict[str, int] = {}
+        # Set by the cross-worker relay so other processes see this one's writes
+        self.on_bump: Callable[[set[str]], None] | None = None
+
+    def get(self, table: str) -> int:
+        return self._versions.get(table, 0)
+
+    def bump(self, tables: set[str], notify: bool = True) -> None:
+        for table in tables:
+            self._versions[table] = self._versions.get(table, 0) + 1
+        watched = tables & ETAG_TABLES
+        if notify and watched and self.on_bump is not None:
+            self.on_bump(watched)
+
+    def etag(self, *tables: str, extra: int | None = None) -> str:
+        parts = [str(self.get(t)) for t in tables]
+        if extra is not None:
+            parts.append(str(extra))
+        return f'W/"{self.epoch}-{".".join(parts)}"'
+
+
+@lru_cache
+def _cascades(table: str) -> frozenset[str]:
+    """Tables whose rows Postgres may delete or update when a row of table is deleted (FK cascades)."""
+    found: set[str] = set()
+    todo = [table]
+    while todo:
+        name = todo.pop()
+        for other in Base.metadata.tables.values():
+            if other.name in found:
+                continue
+            if any(fk.target_fullname.split(".")[0] == name and fk.ondelete for fk in other.foreign_keys):
+                found.add(other.name)
+                todo.append(other.name)
+    return frozenset(found)
+
+
+def _pending(session: Session) -> set[str]:
+    return session.info.setdefault("changed_tables", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session: Session, flush_context) -> None:
+    pending = _pending(session)
+    for obj in session.new | session.dirty:
+        pending.add(obj.__table__.name)
+    for obj in session.deleted:
+        pending.add(obj.__table__.name)
+        pending |= _cascades(obj.__table__.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed(state: ORMExecuteState) -> None:
+    # Bulk insert()/update()/delete() statements bypass the unit of work
+    if state.is_insert or state.is_update or state.is_delete:
+        table = state.statement.table.name
+        pending = _pending(state.session)
+        pending.add(table)
+        if state.is_delete:
+            pending |= _cascades(table)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed(session: Session) -> None:
+    pending = session.info.pop("changed_tables", None)
+    if pending:
+        changes.bump(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    session.info.pop("changed_tables", None)
+
+
+def etag_headers(etag: str) -> dict[str, str]:
+    # no-cache makes the browser revalidate every poll instead of guessing a freshness lifetime
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """A 304 response if the client's If-None-Match already names etag, else None."""
+    header = request.headers.get("if-none-match")
+    if header and (header.strip() == "*" or etag in (t.strip() for t in header.split(","))):
+        return Response(status_code=304, headers=etag_headers(etag))
+    return None
+
+
+# Module-level singleton updated by the session events above
+changes = ChangeVersions()
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.command_log import CommandLog
+from app.models.command_output import CommandOutput
+
+logger = logging.getLogger(__name__)
+
+# Characters of an out-of-line output kept in command_log.output
+PREVIEW_CHARS = 512
+
+
+def compress_output(output: str) -> bytes:
+    return zlib.compress(output.encode(), 6)
+
+
+def decompress_output(data: bytes) -> str:
+    return zlib.decompress(data).decode()
+
+
+async def store_output(log: CommandLog, output: str | None, db: AsyncSession) -> None:
+    """Set a command's output, moving it to command_outputs (compressed) if it is large."""
+    if output is None or len(output) <= settings.COMMAND_OUTPUT_INLINE_MAX:
+        if log.output_external:
+            await db.execute(delete(CommandOutput).where(CommandOutput.command_id == log.id))
+        log.output, log.output_external = output, False
+        return
+    row = {"command_id": log.id, "size": len(output), "data": compress_output(output)}
+    stmt = insert(CommandOutput).values(row)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["command_id"], set_={"size": stmt.excluded.size, "data": stmt.excluded.data},
+    ))
+    log.output, log.output_external = output[:PREVIEW_CHARS], True
+
+
+async def full_output(log: CommandLog, db: AsyncSession) -> str | None:
+    """The complete output of a command, reading command_outputs when it was stored out of line."""
+    if not log.output_external:
+        return log.output
+    # store_output upserts outside the ORM, so a copy in the identity map may be stale
+    stored = await db.get(CommandOutput, log.id, populate_existing=True)
+    return decompress_output(stored.data) if stored else log.output
+
+
+# Finished results older than the cutoff, unless they are among the latest :keep of
+# their (agent, command type). Results of deleted agents are not kept.
+_EXPIRED_SQL = text(
+    """
+    DELETE FROM command_log WHERE id IN (
+        SELECT c.id FROM command_log c
+        WHERE c.executed_at < :cutoff
+          AND c.success IS NOT NULL
+          AND (
+            c.agent_id IS NULL
+            OR (
+                SELECT count(*) FROM (
+                    SELECT 1 FROM command_log n
+                    WHERE n.agent_id = c.agent_id
+                      AND n.command_type = c.command_type
+                      AND n.executed_at > c.executed_at
+                    LIMIT :keep
+                ) newer
+            ) >= :keep
+          )
+        ORDER BY c.executed_at
+        LIMIT :batch
+    )
+    """
+)
+
+
+async def prune_command_log() -> int:
+    """Delete expired command_log rows in batches of COMMAND_LOG_PRUNE_BATCH, one transaction each."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.COMMAND_LOG_RETENTION_DAYS)
+    params = {"cutoff": cutoff, "keep": settings.COMMAND_LOG_KEEP_PER_TYPE, "batch": settings.COMMAND_LOG_PRUNE_BATCH}
+    total = 0
+    while True:
+        async with SessionLocal() as db:
+            result = await db.execute(_EXPIRED_SQL, params)
+            await db.commit()
+        total += result.rowcount
+        if result.rowcount < settings.COMMAND_LOG_PRUNE_BATCH:
+            return total
+        # Let request handlers in between batches
+        await asyncio.sleep(0.1)
+
+
+async def run_command_log_retention() -> None:
+    """Background task: prune command_log every COMMAND_LOG_PRUNE_INTERVAL_SECONDS."""
+    if settings.COMMAND_LOG_RETENTION_DAYS <= 0:
+        return
+    while True:
+        try:
+            pruned = await prune_command_log()
+            if pruned:
+                logger.info("Pruned %d command_log row(s)", pruned)
+        except Exception:
+            logger.exception("command_log retention failed")
+        await asyncio.sleep(settings.COMMAND_LOG_PRUNE_INTERVAL_SECONDS)
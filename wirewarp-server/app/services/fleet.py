@@ -0,0 +1,163 @@
+import math
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+import numpy as np
+
+from app.config import settings
+from app.services.wg_peers import peer_counters, counter_delta, handshake_time
+
+
+class FleetTraffic:
+    """Latest WireGuard counters for every peer in the fleet, one row per (server agent, peer).
+
+    Counters live in preallocated NumPy columns that grow by doubling; the
+    metrics stream writes one row per peer, and rates, per-server totals, top-N
+    and handshake staleness are computed over whole columns at query time.
+    """
+
+    # column -> (dtype, fill value for unused rows)
+    COLUMNS = {
+        "agent": (np.int32, -1),  # index into _agents, -1 for a free row
+        "rx": (np.int64, 0),
+        "tx": (np.int64, 0),
+        "prev_rx": (np.int64, 0),
+        "prev_tx": (np.int64, 0),
+        "ts": (np.float64, np.nan),  # unix seconds of the latest sample
+        "prev_ts": (np.float64, np.nan),
+        "handshake": (np.float64, np.nan),
+    }
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._rows: dict[tuple[str, str], int] = {}  # (agent_id, public_key) -> row
+        self._keys: list[tuple[str, str]] = []
+        self._agents: list[str] = []
+        self._agent_index: dict[str, int] = {}
+        self.capacity = initial_capacity
+        for name, (dtype, fill) in self.COLUMNS.items():
+            setattr(self, name, np.full(initial_capacity, fill, dtype=dtype))
+
+    def _grow(self) -> None:
+        capacity = self.capacity * 2
+        for name, (dtype, fill) in self.COLUMNS.items():
+            column = np.full(capacity, fill, dtype=dtype)
+            column[:self.capacity] = getattr(self, name)
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _row(self, agent_id: str, public_key: str) -> int:
+        row = self._rows.get((agent_id, public_key))
+        if row is not None:
+            return row
+        row = len(self._keys)
+        if row >= self.capacity:
+            self._grow()
+        agent = self._agent_index.get(agent_id)
+        if agent is None:
+            agent = self._agent_index[agent_id] = len(self._agents)
+            self._agents.append(agent_id)
+        self._rows[(agent_id, public_key)] = row
+        self._keys.append((agent_id, public_key))
+        self.agent[row] = agent
+        return row
+
+    def update(self, agent_id: str, timestamp: datetime, peers: list[dict[str, Any]]) -> None:
+        """Record the peers array of one server agent's metrics frame."""
+        ts = timestamp.timestamp()
+        for key, rx, tx, peer in peer_counters(peers):
+            row = self._row(agent_id, key)
+            self.prev_rx[row], self.prev_tx[row], self.prev_ts[row] = self.rx[row], self.tx[row], self.ts[row]
+            self.rx[row], self.tx[row], self.ts[row] = rx, tx, ts
+            handshake = handshake_time(peer.get("last_handshake"))
+            self.handshake[row] = handshake.timestamp() if handshake else math.nan
+
+    def forget(self, agent_id: str) -> None:
+        """Drop an agent's peers by compacting the remaining rows."""
+        agent = self._agent_index.get(agent_id)
+        if agent is None:
+            return
+        n = len(self._keys)
+        keep = np.flatnonzero(self.agent[:n] != agent)
+        for name, (_, fill) in self.COLUMNS.items():
+            column = getattr(self, name)
+            column[:len(keep)] = column[keep]
+            column[len(keep):n] = fill
+        self._keys = [self._keys[i] for i in keep]
+        self._rows = {key: i for i, key in enumerate(self._keys)}
+        # The agent's index stays allocated but owns no rows, so it drops out of server totals
+
+    def rates(self) -> tuple[np.ndarray, np.ndarray]:
+        """rx/tx bytes per second for every row; 0 where there is no earlier sample."""
+        n = len(self._keys)
+        dt = self.ts[:n] - self.prev_ts[:n]
+        valid = np.isfinite(dt) & (dt > 0)
+        rx_delta = counter_delta(self.rx[:n], self.prev_rx[:n])
+        tx_delta = counter_delta(self.tx[:n], self.prev_tx[:n])
+        safe_dt = np.where(valid, dt, 1.0)
+        return np.where(valid, rx_delta / safe_dt, 0.0), np.where(valid, tx_delta / safe_dt, 0.0)
+
+    def summary(self, top: int = 10, stale_after: float | None = None, now: float | None = None) -> dict[str, Any]:
+        """Per-server throughput, the top-N busiest peers and peers with a stale handshake.
+
+        Peers not reported for FLEET_PEER_TTL_SECONDS are left out entirely.
+        """
+        now = time.time() if now is None else now
+        stale_after = settings.FLEET_STALE_HANDSHAKE_SECONDS if stale_after is None else stale_after
+        n = len(self._keys)
+        rx_rate, tx_rate = self.rates()
+        live = np.isfinite(self.ts[:n]) & (self.ts[:n] >= now - settings.FLEET_PEER_TTL_SECONDS)
+        live &= self.agent[:n] >= 0
+        rows = np.flatnonzero(live)
+        agents = self.agent[rows]
+        total = rx_rate + tx_rate
+
+        n_agents = len(self._agents)
+        per_rx = np.bincount(agents, weights=rx_rate[rows], minlength=n_agents)
+        per_tx = np.bincount(agents, weights=tx_rate[rows], minlength=n_agents)
+        per_peers = np.bincount(agents, minlength=n_agents)
+        servers = [
+            {"agent_id": self._agents[a], "peers": int(per_peers[a]),
+             "rx_rate": float(per_rx[a]), "tx_rate": float(per_tx[a])}
+            for a in np.flatnonzero(per_peers)
+        ]
+
+        top_rows = rows
+        if top < len(rows):
+            top_rows = rows[np.argpartition(-total[rows], top)[:top]]
+        top_rows = top_rows[np.argsort(-total[top_rows], kind="stable")]
+
+        handshake = self.handshake[rows]
+        stale_mask = ~np.isfinite(handshake) | (handshake < now - stale_after)
+        stale_rows = rows[stale_mask]
+        stale_rows = stale_rows[np.argsort(np.nan_to_num(self.handshake[stale_rows], nan=-np.inf))]
+
+        return {
+            "peers": int(len(rows)),
+            "rx_rate": float(rx_rate[rows].sum()),
+            "tx_rate": float(tx_rate[rows].sum()),
+            "servers": servers,
+            "top_peers": [self._peer(r, rx_rate, tx_rate) for r in top_rows],
+            "stale_peers": [self._peer(r, rx_rate, tx_rate, now) for r in stale_rows],
+        }
+
+    def _peer(self, row: int, rx_rate: np.ndarray, tx_rate: np.ndarray, now: float | None = None) -> dict[str, Any]:
+        agent_id, public_key = self._keys[row]
+        handshake = float(self.handshake[row])
+        peer = {
+            "agent_id": agent_id,
+            "public_key": public_key,
+            "rx_rate": float(rx_rate[row]),
+            "tx_rate": float(tx_rate[row]),
+            "last_handshake": None if math.isnan(handshake) else datetime.fromtimestamp(handshake, tz=timezone.utc),
+        }
+        if now is not None:
+            peer["seconds_since_handshake"] = None if math.isnan(handshake) else now - handshake
+        return peer
+
+
+# Module-level singleton fed by the WebSocket metrics handler
+fleet_traffic = FleetTraffic()
@@ -0,0 +1,138 @@
+import math
+import uuid
+from array import array
+from datetime import datetime
+from typing import Any
+
+from app.config import settings
+from app.services.wg_peers import peer_counters, counter_delta
+
+
+class RingBuffer:
+    """Fixed-capacity time series backed by preallocated array('d') columns.
+
+    Memory is allocated once — capacity * (1 + len(fields)) doubles — and the
+    oldest sample is overwritten when the buffer is full. Missing values are NaN.
+    """
+
+    def __init__(self, capacity: int, fields: tuple[str, ...]):
+        self.capacity = capacity
+        self.fields = fields
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.columns = {name: array("d", [math.nan]) * capacity for name in fields}
+        self.head = 0  # next slot to write
+        self.count = 0
+
+    def append(self, timestamp: float, **values: float) -> None:
+        i = self.head
+        self.timestamps[i] = timestamp
+        for name, column in self.columns.items():
+            column[i] = values.get(name, math.nan)
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    @property
+    def last_timestamp(self) -> float | None:
+        return self.timestamps[self.head - 1] if self.count else None
+
+    def _ordered(self, column: array) -> list[float]:
+        start = (self.head - self.count) % self.capacity
+        if start + self.count <= self.capacity:
+            return column[start:start + self.count].tolist()
+        return column[start:].tolist() + column[:self.head].tolist()
+
+    def series(self, since: float | None = None) -> dict[str, list]:
+        """Columns oldest-first; NaN is returned as None so the result is valid JSON."""
+        timestamps = self._ordered(self.timestamps)
+        skip = 0
+        if since is not None:
+            while skip < len(timestamps) and timestamps[skip] < since:
+                skip += 1
+        out: dict[str, list] = {"timestamps": timestamps[skip:]}
+        for name, column in self.columns.items():
+            out[name] = [None if math.isnan(v) else v for v in self._ordered(column)[skip:]]
+        return out
+
+
+class _PeerRing:
+    __slots__ = ("ring", "last_rx", "last_tx", "last_ts")
+
+    def __init__(self, capacity: int):
+        self.ring = RingBuffer(capacity, ("rx_rate", "tx_rate"))
+        self.last_rx: int | None = None
+        self.last_tx: int | None = None
+        self.last_ts: float | None = None
+
+
+class LiveMetrics:
+    """Recent metrics per agent and per peer, kept in memory for live charts.
+
+    Agents get cpu/mem, peers get rx/tx rates in bytes per second derived from
+    consecutive counter samples. Buffers hold LIVE_METRICS_WINDOW_SECONDS at
+    LIVE_METRICS_SAMPLE_SECONDS resolution; peers not heard from for a whole
+    window are evicted.
+    """
+
+    AGENT_FIELDS = ("cpu_percent", "mem_used_mb", "rx_rate", "tx_rate")
+
+    def __init__(
+        self,
+        window_seconds: int = settings.LIVE_METRICS_WINDOW_SECONDS,
+        sample_seconds: int = settings.LIVE_METRICS_SAMPLE_SECONDS,
+    ):
+        self.window = window_seconds
+        self.capacity = max(1, window_seconds // max(1, sample_seconds))
+        self._agents: dict[str, RingBuffer] = {}
+        self._peers: dict[str, dict[str, _PeerRing]] = {}
+
+    def record(self, agent_id: str, timestamp: datetime, data: dict[str, Any]) -> None:
+        ts = timestamp.timestamp()
+        system = data.get("system") or {}
+        rx_total = tx_total = 0.0
+        have_rates = False
+
+        peers = self._peers.setdefault(agent_id, {})
+        for key, rx, tx, _ in peer_counters(data.get("peers")):
+            state = peers.get(key)
+            if state is None:
+                state = peers[key] = _PeerRing(self.capacity)
+            if state.last_ts is not None and ts > state.last_ts:
+                dt = ts - state.last_ts
+                rx_rate = counter_delta(rx, state.last_rx) / dt
+                tx_rate = counter_delta(tx, state.last_tx) / dt
+                state.ring.append(ts, rx_rate=rx_rate, tx_rate=tx_rate)
+                rx_total += rx_rate
+                tx_total += tx_rate
+                have_rates = True
+            state.last_rx, state.last_tx, state.last_ts = rx, tx, ts
+
+        for key in [k for k, s in peers.items() if s.last_ts is not None and ts - s.last_ts > self.window]:
+            del peers[key]
+
+        ring = self._agents.get(agent_id)
+        if ring is None:
+            ring = self._agents[agent_id] = RingBuffer(self.capacity, self.AGENT_FIELDS)
+        values = {name: float(system[name]) for name in ("cpu_percent", "mem_used_mb")
+                  if isinstance(system.get(name), (int, float))}
+        if have_rates:
+            values.update(rx_rate=rx_total, tx_rate=tx_total)
+        ring.append(ts, **values)
+
+    def forget(self, agent_id: str) -> None:
+        self._agents.pop(agent_id, None)
+        self._peers.pop(agent_id, None)
+
+    def snapshot(self, agent_id: str, since: float | None = None) -> dict[str, Any] | None:
+        ring = self._agents.get(agent_id)
+        if ring is None:
+            return None
+        return {
+            "agent_id": uuid.UUID(agent_id),
+            "capacity": self.capacity,
+            **ring.series(since),
+            "peers": {key: state.ring.series(since) for key, state in self._peers.get(agent_id, {}).items()},
+        }
+
+
+# Module-level singleton fed by the WebSocket metrics handler
+live_metrics = LiveMetrics()
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import select, insert
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.agent import Agent
+from app.models.metric import Metric
+from app.services.peer_traffic import TrafficCounters, insert_peer_traffic
+from app.services.rollups import aggregate, upsert_rollups
+
+logger = logging.getLogger(__name__)
+
+MetricRow = tuple[uuid.UUID, datetime, dict[str, Any]]
+
+
+class MetricsIngest:
+    """Bounded queue of metrics samples drained by a single background writer.
+
+    Handlers submit without touching the database; the writer bulk-inserts
+    with COPY once METRICS_BATCH_SIZE samples are waiting or
+    METRICS_FLUSH_INTERVAL seconds have passed. When the queue is full new
+    samples are dropped and counted rather than buffered without bound.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = settings.METRICS_QUEUE_SIZE,
+        batch_size: int = settings.METRICS_BATCH_SIZE,
+        flush_interval: float = settings.METRICS_FLUSH_INTERVAL,
+    ):
+        self.queue: asyncio.Queue[MetricRow] = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self._reported_dropped = 0
+        self.counters = TrafficCounters()
+
+    def submit(self, agent_id: str, timestamp: datetime, data: dict[str, Any]) -> bool:
+        """Queue one sample. Returns False (and counts a drop) if the queue is full."""
+        if timestamp.tzinfo is None:
+            # Agents may report naive ISO timestamps; they are UTC, and a batch mixing both cannot be sorted
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        try:
+            self.queue.put_nowait((uuid.UUID(agent_id), timestamp, data))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def _next_batch(self) -> list[MetricRow]:
+        """Wait for one sample, then collect more until the batch is full or the interval elapses."""
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _take_queued(self) -> list[MetricRow]:
+        batch = []
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def write(self, batch: list[MetricRow]) -> None:
+        """Bulk-insert a batch with COPY, falling back to a multi-row INSERT.
+
+        Peer counters are split out into peer_traffic and the batch's 1m/1h/1d
+        rollups are upserted, all in the same transaction.
+        """
+        if not batch:
+            return
+        # Counters must advance in sample order for the deltas to be right
+        batch.sort(key=lambda row: row[1])
+        peer_samples = [self.counters.split(agent_id, ts, data.get("peers")) for agent_id, ts, data in batch]
+        rollups = aggregate(batch, peer_samples)
+        peers = [p for samples in peer_samples for p in samples]
+        # The raw JSONB keeps everything except the peers array, which now has its own table
+        batch = [(agent_id, ts, {k: v for k, v in data.items() if k != "peers"}) for agent_id, ts, data in batch]
+        try:
+            await _copy_rows(batch, rollups, peers)
+            written = len(batch)
+        except Exception as exc:
+            # COPY is all-or-nothing: one sample from a deleted agent fails the batch
+            logger.warning("COPY of %d metric(s) failed (%s), retrying with INSERT", len(batch), exc)
+            try:
+                written = await _insert_rows(batch, rollups, peers)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("Dropping %d metric(s) after INSERT failed", len(batch))
+                return
+        # Counted once committed; samples from agents deleted meanwhile are failures
+        self.written += written
+        self.failed += len(batch) - written
+        self.batches += 1
+
+    async def _write_logged(self, batch: list[MetricRow]) -> None:
+        try:
+            await self.write(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to store %d metric(s)", len(batch))
+
+    async def run(self) -> None:
+        """Background task: drain the queue into the metrics table."""
+        while True:
+            batch = await self._next_batch()
+            await self._write_logged(batch)
+            if self.dropped != self._reported_dropped:
+                logger.warning("Metrics queue full — %d sample(s) dropped so far", self.dropped)
+                self._reported_dropped = self.dropped
+
+    async def drain(self) -> None:
+        """Write whatever is still queued (used on shutdown)."""
+        while batch := self._take_queued():
+            await self._write_logged(batch)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+async def _copy_rows(batch: list[MetricRow], rollups: list[dict[str, Any]], peers: list[dict[str, Any]]) -> None:
+    async with SessionLocal() as db:
+        conn = await db.connection()
+        raw = await conn.get_raw_connection()
+        # The dialect's jsonb codec takes the JSON text
+        await raw.driver_connection.copy_records_to_table(
+            Metric.__tablename__,
+            records=[(agent_id, ts, json.dumps(data)) for agent_id, ts, data in batch],
+            columns=["agent_id", "timestamp", "data"],
+        )
+        await upsert_rollups(rollups, db)
+        await insert_peer_traffic(peers, db)
+        await db.commit()
+
+
+async def _insert_rows(batch: list[MetricRow], rollups: list[dict[str, Any]], peers: list[dict[str, Any]]) -> int:
+    """INSERT the samples of agents that still exist; returns how many were written."""
+    async with SessionLocal() as db:
+        result = await db.execute(select(Agent.id).where(Agent.id.in_({row[0] for row in batch})))
+        known = set(result.scalars())
+        rows = [
+            {"agent_id": agent_id, "timestamp": ts, "data": data}
+            for agent_id, ts, data in batch if agent_id in known
+        ]
+        if rows:
+            await db.execute(insert(Metric).values(rows))
+        await upsert_rollups([r for r in rollups if r["agent_id"] in known], db)
+        await insert_peer_traffic(peers, db)
+        await db.commit()
+    return len(rows)
+
+
+# Module-level singleton fed by the WebSocket metrics handler
+metrics_ingest = MetricsIngest()
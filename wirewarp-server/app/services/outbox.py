@@ -0,0 +1,141 @@
+import logging
+from typing import Any
+
+from sqlalchemy import select, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.agent_outbox import AgentOutbox
+from app.models.command_log import CommandLog
+from app.services.pending_commands import pending_commands
+from app.websocket.hub import manager
+
+logger = logging.getLogger(__name__)
+
+FORWARD_COMMANDS = {"iptables_add_forward", "iptables_remove_forward"}
+PEER_COMMANDS = {"wg_add_peer", "wg_remove_peer"}
+
+# Forward/peer commands only ever go to server agents, whose forwards and peers
+# are brought up to date by the state resync on reconnect (see
+# agent_state.sync_agent_state); they are superseded by it rather than queued.
+STATE_COMMANDS = FORWARD_COMMANDS | PEER_COMMANDS
+
+# Commands that are never worth queueing for an offline agent
+NOT_QUEUED = {"apply_state", "report_state"}
+
+
+def coalesce_key(command_type: str, params: dict[str, Any]) -> str:
+    """Entries with the same key set the same piece of agent config; the latest one wins."""
+    if command_type in ("gateway_up", "gateway_down"):
+        return "gateway"
+    return command_type
+
+
+async def enqueue(
+    agent_id: str,
+    command_id: str,
+    command_type: str,
+    params: dict[str, Any],
+    db: AsyncSession,
+) -> bool:
+    """
+    Queue a command for an offline agent, replacing pending entries with the same coalesce_key.
+
+    Superseded commands, forward/peer commands (see STATE_COMMANDS) and
+    NOT_QUEUED commands are marked failed in command_log. Does not commit.
+    Returns True if the command is now pending in the outbox.
+    """
+    if command_type in NOT_QUEUED:
+        await _mark_superseded([command_id], "agent not connected — not queued", db)
+        return False
+    if command_type in STATE_COMMANDS:
+        await _mark_superseded([command_id], "superseded by state resync on reconnect", db)
+        return False
+
+    key = coalesce_key(command_type, params)
+    result = await db.execute(
+        select(AgentOutbox)
+        .where(AgentOutbox.agent_id == agent_id, AgentOutbox.coalesce_key == key)
+        .order_by(AgentOutbox.id)
+    )
+    superseded = []
+    for p in result.scalars():
+        await db.delete(p)
+        superseded.append(p.command_id)
+
+    db.add(AgentOutbox(
+        agent_id=agent_id,
+        command_id=command_id,
+        command_type=command_type,
+        params=params,
+        coalesce_key=key,
+    ))
+    if superseded:
+        await _mark_superseded(superseded, "superseded by a later command while the agent was offline", db)
+    return True
+
+
+async def deliver(agent_id: str, db: AsyncSession, skip_types: set[str] = frozenset()) -> int:
+    """
+    Send an agent's pending outbox to it in order, OUTBOX_BATCH_SIZE commands per frame.
+
+    Called on the worker holding the agent's socket, while the connection is
+    held (see ConnectionManager.connect) so newer commands cannot overtake.
+    Entries whose type is in skip_types (say, forward/peer commands queued
+    before those stopped being queued) are dropped and marked superseded.
+    Sent entries stay until the agent's command_result for them arrives (see
+    acknowledge), so a socket dying before they reach the agent only means
+    they go out again on the next reconnect. Returns the number of commands sent.
+    """
+    result = await db.execute(
+        select(AgentOutbox).where(AgentOutbox.agent_id == agent_id).order_by(AgentOutbox.id)
+    )
+    rows = list(result.scalars())
+    if not rows:
+        return 0
+
+    skipped = [r for r in rows if r.command_type in skip_types]
+    to_send = [r for r in rows if r.command_type not in skip_types]
+    sent = 0
+
+    batch_size = max(1, settings.OUTBOX_BATCH_SIZE)
+    for i in range(0, len(to_send), batch_size):
+        batch = to_send[i:i + batch_size]
+        frame = {
+            "type": "batch",
+            "commands": [
+                {"id": str(r.command_id), "type": r.command_type, "params": r.params or {}}
+                for r in batch
+            ],
+        }
+        for r in batch:
+            pending_commands.register(str(r.command_id), agent_id)
+        if not await manager.send(agent_id, frame, priority=True):
+            for r in batch:
+                pending_commands.discard(str(r.command_id))
+            break
+        sent += len(batch)
+
+    if skipped:
+        await _mark_superseded([r.command_id for r in skipped], "superseded by state resync on reconnect", db)
+        await db.execute(delete(AgentOutbox).where(AgentOutbox.id.in_([r.id for r in skipped])))
+        await db.commit()
+
+    if sent or skipped:
+        logger.info("Delivered %d queued command(s) to agent %s (%d superseded)", sent, agent_id, len(skipped))
+    return sent
+
+
+async def acknowledge(agent_id: str, command_id: str, db: AsyncSession) -> None:
+    """Remove a delivered command from the outbox once the agent has reported its result. Does not commit."""
+    await db.execute(
+        delete(AgentOutbox).where(AgentOutbox.agent_id == agent_id, AgentOutbox.command_id == command_id)
+    )
+
+
+async def _mark_superseded(command_ids: list, reason: str, db: AsyncSession) -> None:
+    await db.execute(
+        update(CommandLog)
+        .where(CommandLog.id.in_(command_ids), CommandLog.success.is_(None))
+        .values(success=False, output=reason)
+    )
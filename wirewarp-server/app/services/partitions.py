@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import SessionLocal, SCHEMA_LOCK, advisory_lock
+from app.services.rollups import prune_rollups
+
+logger = logging.getLogger(__name__)
+
+# Day-partitioned tables and their retention, in days
+PARTITIONED_TABLES = {
+    "metrics": lambda: settings.METRICS_RETENTION_DAYS,
+    "peer_traffic": lambda: settings.METRICS_RETENTION_DAYS,
+}
+
+
+def partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def partition_bounds(day: date) -> str:
+    """The FOR VALUES clause of a day's partition, spelled in UTC so the session's TimeZone cannot shift it."""
+    return f"FOR VALUES FROM ('{day.isoformat()} 00:00:00+00') TO ('{day + timedelta(days=1)} 00:00:00+00')"
+
+
+def _partition_day(table: str, name: str) -> date | None:
+    prefix = f"{table}_p"
+    if not name.startswith(prefix):
+        return None
+    try:
+        return datetime.strptime(name[len(prefix):], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+async def list_partitions(table: str, db: AsyncSession) -> list[str]:
+    result = await db.execute(
+        text(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = :table
+            """
+        ),
+        {"table": table},
+    )
+    return list(result.scalars())
+
+
+async def ensure_partitions(table: str, db: AsyncSession, days_ahead: int | None = None) -> list[str]:
+    """Create the daily partitions for today through days_ahead, plus the default partition."""
+    days_ahead = settings.PARTITIONS_AHEAD_DAYS if days_ahead is None else days_ahead
+    existing = set(await list_partitions(table, db))
+    created = []
+    today = datetime.now(timezone.utc).date()
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        name = partition_name(table, day)
+        if name in existing:
+            continue
+        if f"{table}_default" in existing:
+            await _create_partition_from_default(table, name, day, db)
+        else:
+            await db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {partition_bounds(day)}"))
+        created.append(name)
+    if f"{table}_default" not in existing:
+        # Catches samples outside the pre-created range (e.g. agent clock skew)
+        await db.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    await db.commit()
+    return created
+
+
+async def _create_partition_from_default(table: str, name: str, day: date, db: AsyncSession) -> None:
+    """
+    Create a day's partition when the default partition may already hold rows for that day.
+
+    Postgres refuses to create a partition whose range overlaps rows in the
+    default partition (e.g. samples from an agent whose clock ran ahead), so
+    those rows are moved aside, the partition created, and the rows put back
+    into it — all in the caller's transaction.
+    """
+    bounds = {
+        "start": datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc),
+        "end": datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc),
+    }
+    in_range = "timestamp >= :start AND timestamp < :end"
+    stray = await db.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {in_range})"), bounds)
+    if stray:
+        await db.execute(text(f"CREATE TEMPORARY TABLE {name}_moved (LIKE {table}) ON COMMIT DROP"))
+        await db.execute(text(
+            f"WITH moved AS (DELETE FROM {table}_default WHERE {in_range} RETURNING *) "
+            f"INSERT INTO {name}_moved SELECT * FROM moved"
+        ), bounds)
+    await db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {partition_bounds(day)}"))
+    if stray:
+        await db.execute(text(f"INSERT INTO {name} SELECT * FROM {name}_moved"))
+        logger.info("Moved rows for %s out of %s_default into %s", day, table, name)
+
+
+async def drop_expired_partitions(table: str, retention_days: int, db: AsyncSession) -> list[str]:
+    """Drop whole partitions older than the retention window — no DELETE, no bloat."""
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=retention_days)
+    dropped = []
+    for name in await list_partitions(table, db):
+        day = _partition_day(table, name)
+        # A partition holds [day, day + 1); drop it once all of it is past the cutoff
+        if day is not None and day + timedelta(days=1) <= cutoff:
+            await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    # Stragglers in the default partition are few; trim them by row
+    await db.execute(
+        text(f"DELETE FROM {table}_default WHERE timestamp < :cutoff"),
+        {"cutoff": datetime.combine(cutoff, datetime.min.time(), tzinfo=timezone.utc)},
+    )
+    await db.commit()
+    return dropped
+
+
+async def maintain_partitions() -> None:
+    """Create upcoming partitions, drop expired ones and prune rollups.
+
+    Each step runs on its own, so one failing (say, creating a partition) does
+    not keep retention from running. Workers take turns, so concurrent DDL on
+    the same partitions cannot collide.
+    """
+    async with advisory_lock(SCHEMA_LOCK), SessionLocal() as db:
+        for table, retention in PARTITIONED_TABLES.items():
+            created = await _step(f"creating partitions of {table}", ensure_partitions(table, db), db)
+            dropped = await _step(f"dropping expired partitions of {table}",
+                                  drop_expired_partitions(table, retention(), db), db)
+            if created or dropped:
+                logger.info("Partitions of %s: created %s, dropped %s", table, created or [], dropped or [])
+        # Rollups are small and unpartitioned; age them out by row
+        await _step("pruning rollups", prune_rollups(db), db)
+
+
+async def _step(description: str, step: Awaitable[Any], db: AsyncSession) -> Any:
+    try:
+        return await step
+    except Exception:
+        logger.exception("Partition maintenance failed %s", description)
+        await db.rollback()
+        return None
+
+
+async def run_partition_maintenance() -> None:
+    """Background task: keep future partitions created and expired ones dropped.
+
+    The lifespan runs maintenance once before startup, so this waits an interval first.
+    """
+    while True:
+        await asyncio.sleep(settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            await maintain_partitions()
+        except Exception:
+            logger.exception("Partition maintenance failed")
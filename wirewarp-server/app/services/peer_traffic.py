@@ -0,0 +1,76 @@
+import uuid
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.peer_traffic import PeerTraffic
+from app.models.tunnel_client import TunnelClient
+from app.services.wg_peers import peer_counters, counter_delta, handshake_time
+
+# asyncpg rejects statements with more bind parameters than this
+MAX_BIND_PARAMS = 32767
+
+
+class TrafficCounters:
+    """Turns cumulative WireGuard rx/tx counters into per-sample deltas.
+
+    Keeps the last value seen per (agent, peer public key); see counter_delta
+    for counter resets. The first sample for a peer has no baseline and a
+    delta of 0.
+    """
+
+    def __init__(self):
+        self._last: dict[tuple[uuid.UUID, str], tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._last)
+
+    def split(self, agent_id: uuid.UUID, timestamp: datetime, peers: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Typed per-peer samples (with deltas) from a metrics frame's peers array."""
+        samples = []
+        for key, rx, tx, peer in peer_counters(peers):
+            prev = self._last.get((agent_id, key))
+            self._last[(agent_id, key)] = (rx, tx)
+            if prev is None:
+                rx_delta = tx_delta = 0
+            else:
+                rx_delta, tx_delta = counter_delta(rx, prev[0]), counter_delta(tx, prev[1])
+            samples.append({
+                "public_key": key,
+                "timestamp": timestamp,
+                "rx_bytes": rx,
+                "tx_bytes": tx,
+                "rx_delta": rx_delta,
+                "tx_delta": tx_delta,
+                "last_handshake": handshake_time(peer.get("last_handshake")),
+            })
+        return samples
+
+
+async def insert_peer_traffic(samples: list[dict[str, Any]], db: AsyncSession) -> int:
+    """Store peer samples keyed by tunnel client; peers that match no client are skipped.
+
+    Public keys are resolved to tunnel clients with one query per batch.
+    Does not commit. Returns the number of rows written.
+    """
+    keys = {s["public_key"] for s in samples}
+    if not keys:
+        return 0
+    result = await db.execute(
+        select(TunnelClient.wg_public_key, TunnelClient.id).where(TunnelClient.wg_public_key.in_(keys))
+    )
+    clients = dict(result.all())
+    rows = [
+        {"tunnel_client_id": clients[s["public_key"]], **{k: v for k, v in s.items() if k != "public_key"}}
+        for s in samples if s["public_key"] in clients
+    ]
+    # Multi-row INSERT rather than COPY so a peer reported twice for the same
+    # instant keeps the first row instead of failing the batch; chunked to stay
+    # under the driver's bind-parameter limit
+    chunk = MAX_BIND_PARAMS // len(PeerTraffic.__table__.columns)
+    for i in range(0, len(rows), chunk):
+        await db.execute(insert(PeerTraffic).values(rows[i:i + chunk]).on_conflict_do_nothing())
+    return len(rows)
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import and_, or_, update
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.command_log import CommandLog
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CommandOutcome:
+    success: bool
+    output: str
+    timed_out: bool = False
+
+
+@dataclass
+class _Pending:
+    agent_id: str
+    deadline: float  # time.monotonic()
+    future: asyncio.Future
+    remaining: int = 1  # results still to come; a chunked apply_state reports one per frame
+
+
+class PendingCommands:
+    """In-memory registry of sent commands awaiting a command_result, keyed by command id.
+
+    Lets REST callers await an agent's reply without polling command_log.
+    """
+
+    def __init__(self):
+        self._pending: dict[str, _Pending] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def register(self, command_id: str, agent_id: str, timeout: float | None = None, results: int = 1) -> None:
+        """Track a command until all of its results have arrived or its timeout passes."""
+        timeout = settings.COMMAND_TIMEOUT_SECONDS if timeout is None else timeout
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = _Pending(agent_id, time.monotonic() + timeout, future, max(1, results))
+
+    def resolve(self, command_id: str, success: bool, output: str) -> bool:
+        """Wake the waiters of a command; False if it was not registered in this process.
+
+        A command registered for several results only wakes its waiters on the
+        last one, with that result's success and output.
+        """
+        entry = self._pending.get(command_id)
+        if entry is None:
+            return False
+        entry.remaining -= 1
+        if entry.remaining > 0:
+            return True
+        del self._pending[command_id]
+        if not entry.future.done():
+            entry.future.set_result(CommandOutcome(success=success, output=output))
+        return True
+
+    def discard(self, command_id: str) -> None:
+        entry = self._pending.pop(command_id, None)
+        if entry is not None and not entry.future.done():
+            entry.future.cancel()
+
+    def is_pending(self, command_id: str) -> bool:
+        return command_id in self._pending
+
+    async def wait(self, command_id: str, timeout: float) -> CommandOutcome | None:
+        """Wait up to timeout seconds for a result. None if unknown here or still pending."""
+        entry = self._pending.get(command_id)
+        if entry is None:
+            return None
+        try:
+            # shield: one caller giving up must not cancel the future for everyone else
+            return await asyncio.wait_for(asyncio.shield(entry.future), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def expire(self) -> list[str]:
+        """Drop commands past their deadline, failing their waiters. Returns their ids."""
+        now = time.monotonic()
+        expired = [cid for cid, entry in self._pending.items() if entry.deadline <= now]
+        for cid in expired:
+            entry = self._pending.pop(cid)
+            if not entry.future.done():
+                entry.future.set_result(CommandOutcome(success=False, output="timed out", timed_out=True))
+        return expired
+
+
+# Module-level singleton shared by send_command, the result handler and the REST layer
+pending_commands = PendingCommands()
+
+_WAIT_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(ms|s)?\s*$")
+
+
+def parse_wait(value: str | None) -> float | None:
+    """Parse a ?wait= value like '5s', '500ms' or '5' into seconds, capped at COMMAND_WAIT_MAX_SECONDS."""
+    if value is None or value == "":
+        return None
+    match = _WAIT_RE.match(value)
+    if not match:
+        raise ValueError(f"Invalid wait value: {value!r}")
+    seconds = float(match.group(1))
+    if match.group(2) == "ms":
+        seconds /= 1000
+    return min(seconds, settings.COMMAND_WAIT_MAX_SECONDS)
+
+
+async def run_timeout_sweeper() -> None:
+    """Background task: fail commands that never got a result, in one UPDATE per sweep."""
+    while True:
+        await asyncio.sleep(settings.COMMAND_SWEEP_INTERVAL_SECONDS)
+        expired = pending_commands.expire()
+        if not expired:
+            continue
+        try:
+            async with SessionLocal() as db:
+                await db.execute(
+                    update(CommandLog)
+                    .where(
+                        CommandLog.id.in_(expired),
+                        or_(
+                            CommandLog.success.is_(None),
+                            # A chunked apply_state whose later frames never reported
+                            and_(CommandLog.command_type == "apply_state", CommandLog.success.is_(True)),
+                        ),
+                    )
+                    .values(success=False, output=f"timed out after {settings.COMMAND_TIMEOUT_SECONDS}s")
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            logger.info("Marked %d command(s) as timed out", len(expired))
+        except Exception:
+            logger.exception("Command timeout sweep failed")
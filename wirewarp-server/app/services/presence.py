@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.types import DateTime
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.change_versions import changes
+from app.websocket.dashboard import dashboard
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AgentPresence:
+    last_seen: datetime
+    version: str | None = None
+    public_ip: str | None = None
+    dirty: bool = True  # last_seen not yet flushed to agents
+    flushed_seen: datetime | None = None  # shown_last_seen as of the last flush
+
+
+def shown_last_seen(last_seen: datetime) -> datetime:
+    """last_seen as the API shows it: floored to PRESENCE_LAST_SEEN_RESOLUTION_SECONDS."""
+    resolution = max(1, settings.PRESENCE_LAST_SEEN_RESOLUTION_SECONDS)
+    return last_seen - timedelta(seconds=last_seen.timestamp() % resolution)
+
+
+class PresenceTable:
+    """In-memory liveness of connected agents, flushed to the agents table in batches.
+
+    Every inbound frame bumps last_seen here instead of in Postgres; only real
+    changes (a new version or public IP) are written through by the caller.
+    """
+
+    def __init__(self):
+        self._agents: dict[str, AgentPresence] = {}
+        # Part of the agents list ETag: bumped when an agent comes or goes, its version
+        # or public IP changes, or its shown last_seen moves on — not per frame or per flush
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def get(self, agent_id: str) -> AgentPresence | None:
+        return self._agents.get(agent_id)
+
+    def seed(self, agent_id: str, version: str | None, public_ip: str | None) -> None:
+        """Start tracking an agent with the values currently stored in the DB."""
+        self.version += 1
+        self._agents[agent_id] = AgentPresence(
+            last_seen=datetime.now(timezone.utc), version=version, public_ip=public_ip, dirty=False,
+        )
+
+    def touch(self, agent_id: str, version: str | None = None, public_ip: str | None = None) -> bool:
+        """
+        Record that an agent was just heard from.
+
+        Returns True if the version or public IP differs from what is known (or
+        the agent is not tracked yet), i.e. the caller should write it through.
+        """
+        now = datetime.now(timezone.utc)
+        entry = self._agents.get(agent_id)
+        if entry is None:
+            entry = self._agents[agent_id] = AgentPresence(last_seen=now, version=version, public_ip=public_ip)
+            changed = True
+        else:
+            if shown_last_seen(now) != shown_last_seen(entry.last_seen):
+                self.version += 1
+            entry.last_seen = now
+            entry.dirty = True
+            changed = False
+            if version and version != entry.version:
+                entry.version = version
+                changed = True
+            if public_ip and public_ip != entry.public_ip:
+                entry.public_ip = public_ip
+                changed = True
+        if changed:
+            self.version += 1
+        dashboard.publish("agent_status", agent_id, {
+            "id": agent_id,
+            "status": "connected",
+            "last_seen": now.isoformat(),
+            "version": entry.version,
+            "public_ip": entry.public_ip,
+        })
+        return changed
+
+    def forget(self, agent_id: str) -> AgentPresence | None:
+        self.version += 1
+        return self._agents.pop(agent_id, None)
+
+    def drain_dirty(self) -> list[tuple[str, datetime]]:
+        """(agent_id, last_seen) for every agent touched since the last flush."""
+        dirty = []
+        for agent_id, entry in self._agents.items():
+            if entry.dirty:
+                entry.dirty = False
+                dirty.append((agent_id, entry.last_seen))
+        return dirty
+
+    def shown_moved(self, rows: list[tuple[str, datetime]]) -> bool:
+        """Whether flushing rows moves any agent's shown last_seen, i.e. other workers' lists go stale."""
+        moved = False
+        for agent_id, last_seen in rows:
+            entry = self._agents.get(agent_id)
+            shown = shown_last_seen(last_seen)
+            if entry is None or entry.flushed_seen != shown:
+                moved = True
+                if entry is not None:
+                    entry.flushed_seen = shown
+        return moved
+
+
+# Module-level singleton shared by the WebSocket handlers and the agents API
+presence = PresenceTable()
+
+# One statement for the whole batch: the arrays are zipped back into rows by unnest
+_FLUSH_SQL = text(
+    """
+    UPDATE agents AS a
+    SET last_seen = GREATEST(a.last_seen, v.last_seen)
+    FROM unnest(:ids, :last_seen) AS v(id, last_seen)
+    WHERE a.id = v.id
+    """
+).bindparams(
+    bindparam("ids", type_=ARRAY(UUID(as_uuid=True))),
+    bindparam("last_seen", type_=ARRAY(DateTime(timezone=True))),
+)
+
+
+async def flush_presence(rows: list[tuple[str, datetime]] | None = None) -> int:
+    """Write pending last_seen values to the agents table in a single UPDATE."""
+    rows = presence.drain_dirty() if rows is None else rows
+    if not rows:
+        return 0
+    async with SessionLocal() as db:
+        await db.execute(_FLUSH_SQL, {
+            "ids": [uuid.UUID(agent_id) for agent_id, _ in rows],
+            "last_seen": [last_seen for _, last_seen in rows],
+        })
+        await db.commit()
+    # Raw SQL is invisible to the session events; other workers serve agents from the DB,
+    # but only need a new ETag once the last_seen they show has moved on
+    if presence.shown_moved(rows):
+        changes.bump({"agents"})
+    return len(rows)
+
+
+async def run_presence_flusher() -> None:
+    """Background task: flush last_seen for every active agent every PRESENCE_FLUSH_INTERVAL_SECONDS."""
+    while True:
+        await asyncio.sleep(settings.PRESENCE_FLUSH_INTERVAL_SECONDS)
+        rows = presence.drain_dirty()
+        try:
+            await flush_presence(rows)
+        except Exception:
+            # Put the timestamps back so the next flush retries them
+            for agent_id, _ in rows:
+                if (entry := presence.get(agent_id)) is not None:
+                    entry.dirty = True
+            logger.exception("Presence flush failed")
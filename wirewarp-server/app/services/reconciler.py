@@ -0,0 +1,156 @@
+import asyncio
+import ipaddress
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.tunnel_client import TunnelClient
+from app.models.tunnel_server import TunnelServer
+from app.services.agent_commands import send_command, send_state
+from app.services.agent_state import load_desired_state, state_hash
+from app.websocket.hub import manager
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StateDiff:
+    add_forwards: list[dict[str, Any]] = field(default_factory=list)
+    remove_forwards: list[dict[str, Any]] = field(default_factory=list)
+    add_peers: list[dict[str, Any]] = field(default_factory=list)
+    remove_peers: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.add_forwards or self.remove_forwards or self.add_peers or self.remove_peers)
+
+
+def _forward_key(f: dict[str, Any]) -> tuple:
+    return (f["protocol"], int(f["public_port"]), f["destination_ip"], int(f["destination_port"]))
+
+
+def _peer_key(p: dict[str, Any]) -> tuple:
+    return (p["public_key"], frozenset(p.get("allowed_ips") or ()))
+
+
+def diff_state(
+    desired_forwards: list[dict[str, Any]],
+    desired_peers: list[dict[str, Any]],
+    actual_forwards: list[dict[str, Any]],
+    actual_peers: list[dict[str, Any]],
+    managed_networks: list[ipaddress.IPv4Network | ipaddress.IPv6Network] | None = None,
+) -> StateDiff:
+    """
+    Minimal set of adds/removes that turns the actual state into the desired one.
+
+    Compares hashed key sets, so cost is linear in the number of rules. Forwards
+    whose destination lies outside managed_networks are assumed to be someone
+    else's DNAT rules and are never removed.
+    """
+    diff = StateDiff()
+
+    desired_f = {_forward_key(f): f for f in desired_forwards}
+    actual_f = {_forward_key(f): f for f in actual_forwards}
+    diff.add_forwards = [desired_f[k] for k in desired_f.keys() - actual_f.keys()]
+    for k in actual_f.keys() - desired_f.keys():
+        if managed_networks is None or _in_networks(k[2], managed_networks):
+            diff.remove_forwards.append(actual_f[k])
+
+    desired_p = {_peer_key(p): p for p in desired_peers}
+    actual_p = {_peer_key(p): p for p in actual_peers}
+    diff.add_peers = [desired_p[k] for k in desired_p.keys() - actual_p.keys()]
+    # A peer whose allowed IPs drifted is fixed by re-adding it; only remove unknown keys
+    desired_keys = {k[0] for k in desired_p}
+    diff.remove_peers = [
+        {"public_key": k[0]} for k in actual_p.keys() - desired_p.keys() if k[0] not in desired_keys
+    ]
+    return diff
+
+
+def _in_networks(ip: str, networks: list[ipaddress.IPv4Network | ipaddress.IPv6Network]) -> bool:
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(addr in net for net in networks)
+
+
+async def _managed_networks(server: TunnelServer, db: AsyncSession) -> list:
+    """Networks wirewarp forwards into: the tunnel network plus each client's LAN."""
+    result = await db.execute(
+        select(TunnelClient.vm_network).where(
+            TunnelClient.tunnel_server_id == server.id,
+            TunnelClient.vm_network.is_not(None),
+        )
+    )
+    networks = []
+    for cidr in [server.tunnel_network, *result.scalars()]:
+        try:
+            networks.append(ipaddress.ip_network(cidr, strict=False))
+        except ValueError:
+            continue
+    return networks
+
+
+async def reconcile(agent_id: str, report: dict[str, Any], db: AsyncSession) -> StateDiff:
+    """Diff a server agent's reported DNAT rules and peers against the DB and send the fix-up."""
+    result = await db.execute(select(TunnelServer).where(TunnelServer.agent_id == agent_id))
+    server = result.scalar_one_or_none()
+    if server is None:
+        return StateDiff()
+
+    actual_forwards = report.get("forwards") or []
+    actual_peers = report.get("peers") or []
+    desired_forwards, desired_peers = await load_desired_state(agent_id, db)
+
+    # Fast path: identical content hashes mean nothing to diff
+    if state_hash(actual_forwards, actual_peers) == state_hash(desired_forwards, desired_peers):
+        return StateDiff()
+
+    diff = diff_state(
+        desired_forwards, desired_peers, actual_forwards, actual_peers,
+        managed_networks=await _managed_networks(server, db),
+    )
+    if diff.empty:
+        return diff
+
+    logger.info(
+        "Reconciling server agent %s: +%d/-%d forward(s), +%d/-%d peer(s)",
+        agent_id, len(diff.add_forwards), len(diff.remove_forwards),
+        len(diff.add_peers), len(diff.remove_peers),
+    )
+    await send_state(
+        agent_id, diff.add_forwards, diff.add_peers, db,
+        remove_forwards=diff.remove_forwards,
+        remove_peers=diff.remove_peers,
+        mode="delta",
+        generation=server.state_generation,
+        state_hash=server.state_hash,
+    )
+    return diff
+
+
+async def request_state_report(agent_id: str, db: AsyncSession) -> bool:
+    """Ask a server agent to report its current rules; the result is reconciled on arrival."""
+    sent, _ = await send_command(agent_id=agent_id, command_type="report_state", params={}, db=db)
+    return sent
+
+
+async def run_periodic_reconcile() -> None:
+    """Background task: request a state report from every connected server agent."""
+    while True:
+        await asyncio.sleep(settings.RECONCILE_INTERVAL_SECONDS)
+        agent_ids = manager.agent_ids_of_type("server")
+        if not agent_ids:
+            continue
+        try:
+            async with SessionLocal() as db:
+                for agent_id in agent_ids:
+                    await request_state_report(agent_id, db)
+        except Exception:
+            logger.exception("Periodic reconcile failed")
@@ -0,0 +1,178 @@
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.metric_rollup import MetricRollup
+
+# Resolutions from finest to coarsest
+RESOLUTIONS: dict[str, timedelta] = {
+    "1m": timedelta(minutes=1),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+}
+
+# metrics "system" key -> rollup column prefix
+SYSTEM_STATS = {
+    "cpu_percent": "cpu",
+    "mem_used_mb": "mem",
+    "disk_used_percent": "disk",
+}
+
+
+def bucket_start(ts: datetime, resolution: str) -> datetime:
+    ts = ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    if resolution == "1m":
+        return ts.replace(second=0, microsecond=0)
+    if resolution == "1h":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@dataclass
+class _Bucket:
+    samples: int = 0
+    rx_bytes: int = 0
+    tx_bytes: int = 0
+    stats: dict[str, list[float]] = field(default_factory=dict)  # prefix -> [min, max, sum, count]
+
+    def add(self, system: dict[str, float], rx: int, tx: int) -> None:
+        self.samples += 1
+        self.rx_bytes += rx
+        self.tx_bytes += tx
+        for prefix, value in system.items():
+            agg = self.stats.get(prefix)
+            if agg is None:
+                self.stats[prefix] = [value, value, value, 1]
+            else:
+                agg[0] = min(agg[0], value)
+                agg[1] = max(agg[1], value)
+                agg[2] += value
+                agg[3] += 1
+
+    def row(self) -> dict[str, Any]:
+        row = {
+            "samples": self.samples,
+            "rx_bytes": self.rx_bytes,
+            "tx_bytes": self.tx_bytes,
+        }
+        for prefix in SYSTEM_STATS.values():
+            lo, hi, total, count = self.stats.get(prefix, (None, None, None, 0))
+            row.update({f"{prefix}_min": lo, f"{prefix}_max": hi, f"{prefix}_sum": total, f"{prefix}_count": count})
+        return row
+
+
+def aggregate(
+    batch: list[tuple[uuid.UUID, datetime, dict[str, Any]]],
+    peer_samples: list[list[dict[str, Any]]],
+) -> list[dict[str, Any]]:
+    """
+    Rollup rows for a batch of (agent_id, timestamp, data), one per (agent, resolution, bucket).
+
+    peer_samples[i] holds the typed peer samples split from batch[i]; their
+    rx/tx deltas are summed into the bucket's traffic.
+    """
+    buckets: dict[tuple[uuid.UUID, str, datetime], _Bucket] = {}
+    for (agent_id, ts, data), peers in zip(batch, peer_samples):
+        system_raw = data.get("system") or {}
+        system = {
+            prefix: float(system_raw[key])
+            for key, prefix in SYSTEM_STATS.items()
+            if isinstance(system_raw.get(key), (int, float))
+        }
+        rx = sum(p["rx_delta"] for p in peers)
+        tx = sum(p["tx_delta"] for p in peers)
+        for resolution in RESOLUTIONS:
+            key = (agent_id, resolution, bucket_start(ts, resolution))
+            buckets.setdefault(key, _Bucket()).add(system, rx, tx)
+    return [
+        {"agent_id": agent_id, "resolution": resolution, "bucket": bucket, **b.row()}
+        for (agent_id, resolution, bucket), b in buckets.items()
+    ]
+
+
+async def upsert_rollups(rows: list[dict[str, Any]], db: AsyncSession) -> None:
+    """Merge pre-aggregated bucket rows into metric_rollups in one INSERT ... ON CONFLICT."""
+    if not rows:
+        return
+    stmt = insert(MetricRollup).values(rows)
+    t, ex = MetricRollup.__table__.c, stmt.excluded
+    set_ = {
+        "samples": t.samples + ex.samples,
+        "rx_bytes": t.rx_bytes + ex.rx_bytes,
+        "tx_bytes": t.tx_bytes + ex.tx_bytes,
+    }
+    for prefix in SYSTEM_STATS.values():
+        # LEAST/GREATEST ignore NULLs; the sum keeps whichever side is non-NULL
+        set_[f"{prefix}_min"] = func.least(t[f"{prefix}_min"], ex[f"{prefix}_min"])
+        set_[f"{prefix}_max"] = func.greatest(t[f"{prefix}_max"], ex[f"{prefix}_max"])
+        set_[f"{prefix}_sum"] = func.coalesce(
+            t[f"{prefix}_sum"] + ex[f"{prefix}_sum"], t[f"{prefix}_sum"], ex[f"{prefix}_sum"]
+        )
+        set_[f"{prefix}_count"] = t[f"{prefix}_count"] + ex[f"{prefix}_count"]
+    await db.execute(stmt.on_conflict_do_update(index_elements=["agent_id", "resolution", "bucket"], set_=set_))
+
+
+def pick_resolution(start: datetime, end: datetime, max_points: int) -> str:
+    """Finest resolution whose bucket count over [start, end) stays within max_points."""
+    span = end - start
+    for resolution, step in RESOLUTIONS.items():
+        if span / step <= max_points:
+            return resolution
+    return "1d"
+
+
+async def query_rollups(
+    agent_id: str,
+    start: datetime,
+    end: datetime,
+    resolution: str,
+    db: AsyncSession,
+) -> list[dict[str, Any]]:
+    result = await db.execute(
+        select(MetricRollup)
+        .where(
+            MetricRollup.agent_id == agent_id,
+            MetricRollup.resolution == resolution,
+            MetricRollup.bucket >= bucket_start(start, resolution),
+            MetricRollup.bucket < end,
+        )
+        .order_by(MetricRollup.bucket)
+    )
+    points = []
+    for r in result.scalars():
+        point = {"bucket": r.bucket, "samples": r.samples, "rx_bytes": r.rx_bytes, "tx_bytes": r.tx_bytes}
+        for prefix in SYSTEM_STATS.values():
+            total, count = getattr(r, f"{prefix}_sum"), getattr(r, f"{prefix}_count")
+            point[prefix] = {
+                "min": getattr(r, f"{prefix}_min"),
+                "max": getattr(r, f"{prefix}_max"),
+                "avg": total / count if total is not None and count else None,
+            }
+        points.append(point)
+    return points
+
+
+async def prune_rollups(db: AsyncSession) -> None:
+    """Drop rollup buckets older than their resolution's retention."""
+    now = datetime.now(timezone.utc)
+    retention = {
+        "1m": settings.ROLLUP_1M_RETENTION_DAYS,
+        "1h": settings.ROLLUP_1H_RETENTION_DAYS,
+        "1d": settings.ROLLUP_1D_RETENTION_DAYS,
+    }
+    for resolution, days in retention.items():
+        if days <= 0:
+            continue
+        await db.execute(
+            delete(MetricRollup).where(
+                MetricRollup.resolution == resolution,
+                MetricRollup.bucket < now - timedelta(days=days),
+            )
+        )
+    await db.commit()
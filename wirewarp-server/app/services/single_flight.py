@@ -0,0 +1,62 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.config import settings
+
+
+class SingleFlight:
+    """Coalesces identical concurrent reads into one load and caches the result briefly.
+
+    Entries are keyed by (key, version); callers pass the table change version
+    (see change_versions), so a committed write makes the next read miss
+    without explicit invalidation. Loads run as their own task, so a caller
+    that disconnects does not cancel the load other callers are waiting on.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache: dict[Hashable, tuple[str, float, Any]] = {}  # key -> (version, expires, result)
+        self._inflight: dict[tuple[Hashable, str], asyncio.Future] = {}
+        self.hits = 0
+        self.shared = 0
+        self.loads = 0
+
+    async def get(self, key: Hashable, version: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version and cached[1] > time.monotonic():
+            self.hits += 1
+            return cached[2]
+
+        flight = self._inflight.get((key, version))
+        if flight is None:
+            self.loads += 1
+            flight = self._inflight[(key, version)] = asyncio.ensure_future(load())
+            flight.add_done_callback(lambda f: self._landed(key, version, f))
+        else:
+            self.shared += 1
+        return await asyncio.shield(flight)
+
+    def _landed(self, key: Hashable, version: str, flight: asyncio.Future) -> None:
+        self._inflight.pop((key, version), None)
+        if not flight.cancelled() and flight.exception() is None:
+            now = time.monotonic()
+            # Re-inserted so the dict stays ordered oldest-first
+            self._cache.pop(key, None)
+            if len(self._cache) >= self.max_entries:
+                self._cache = {k: v for k, v in self._cache.items() if v[1] > now}
+                # Still full of fresh entries (many distinct keys within one TTL): evict the oldest
+                while len(self._cache) >= self.max_entries:
+                    del self._cache[next(iter(self._cache))]
+            self._cache[key] = (version, now + self.ttl, flight.result())
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+
+# Module-level singleton shared by the list endpoints; keys are (endpoint, filters)
+reads = SingleFlight(settings.READ_CACHE_TTL_SECONDS)
@@ -0,0 +1,37 @@
+from datetime import datetime
+from typing import Any, Iterator
+
+
+def peer_counters(peers: list[dict[str, Any]] | None) -> Iterator[tuple[str, int, int, dict[str, Any]]]:
+    """(public_key, rx_bytes, tx_bytes, peer) for each well-formed entry of a metrics frame's peers array."""
+    for peer in peers or ():
+        key = peer.get("public_key") if isinstance(peer, dict) else None
+        if not key:
+            continue
+        try:
+            rx, tx = int(peer.get("rx_bytes") or 0), int(peer.get("tx_bytes") or 0)
+        except (TypeError, ValueError):
+            continue
+        yield key, rx, tx, peer
+
+
+def handshake_time(value: Any) -> datetime | None:
+    """A peer's last_handshake as a datetime; None if missing, malformed or never completed."""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    # WireGuard reports the zero time for peers that never completed a handshake
+    return parsed if parsed.year > 1970 else None
+
+
+def counter_delta(current, previous):
+    """Bytes a cumulative WireGuard counter grew by since previous.
+
+    A counter that went backwards was reset (interface recreated, agent
+    restarted) and is counted from zero. Works elementwise on NumPy arrays.
+    """
+    delta = current - previous
+    return delta + previous * (delta < 0)
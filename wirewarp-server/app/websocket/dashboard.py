@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from typing import Any, Callable
+
+from fastapi import WebSocket
+
+from app.codec import codec
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardClient:
+    """A browser socket with a bounded queue of pre-serialized frames and its own writer."""
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.writer: asyncio.Task | None = None
+
+
+class DashboardHub:
+    """Pushes live changes to dashboard tabs.
+
+    Handlers publish events keyed by what they describe (an agent, a command,
+    a port forward). Events for the same key within DASHBOARD_COALESCE_SECONDS
+    are merged, and each flush is serialized once and queued to every tab, so
+    N open tabs cost N queue puts rather than N list queries.
+    """
+
+    def __init__(
+        self,
+        coalesce_seconds: float = settings.DASHBOARD_COALESCE_SECONDS,
+        queue_size: int = settings.DASHBOARD_QUEUE_SIZE,
+    ):
+        self.coalesce_seconds = coalesce_seconds
+        self.queue_size = queue_size
+        self._clients: set[DashboardClient] = set()
+        self._pending: dict[tuple[str, str], dict[str, Any]] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # Set by the cross-worker relay while tabs are connected to other workers, which then
+        # get this worker's events too; and told when this worker's first tab opens or last closes
+        self.on_flush: Callable[[list[dict[str, Any]]], None] | None = None
+        self.on_clients: Callable[[bool], None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def connect(self, websocket: WebSocket) -> DashboardClient:
+        client = DashboardClient(websocket, self.queue_size)
+        client.writer = asyncio.create_task(self._writer(client), name="ws-dashboard-writer")
+        self._clients.add(client)
+        if len(self._clients) == 1 and self.on_clients is not None:
+            self.on_clients(True)
+        return client
+
+    def disconnect(self, client: DashboardClient) -> None:
+        if client in self._clients:
+            self._clients.discard(client)
+            if not self._clients and self.on_clients is not None:
+                self.on_clients(False)
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+    def publish(self, event_type: str, key: str, payload: dict[str, Any]) -> None:
+        """Queue an event; fields of a pending event with the same type and key are merged."""
+        if not self._clients and self.on_flush is None:
+            return
+        pending = self._pending.get((event_type, key))
+        if pending is None:
+            self._pending[(event_type, key)] = dict(payload)
+        else:
+            pending.update(payload)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.coalesce_seconds, self._flush)
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        if not self._pending:
+            return
+        events = [{"type": event_type, **payload} for (event_type, _), payload in self._pending.items()]
+        self._pending = {}
+        if self.on_flush is not None:
+            self.on_flush(events)
+        self.deliver(events)
+
+    def deliver(self, events: list[dict[str, Any]]) -> None:
+        """Send one batch frame to every tab connected to this worker."""
+        if not self._clients:
+            return
+        frame = codec.dumps({"type": "batch", "events": events}, default=str)
+        for client in list(self._clients):
+            try:
+                client.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # A tab this far behind is better off reconnecting and refetching
+                logger.warning("Dashboard client too slow — disconnecting")
+                self.disconnect(client)
+                asyncio.create_task(_close_quietly(client.websocket))
+
+    async def _writer(self, client: DashboardClient) -> None:
+        try:
+            while True:
+                frame = await client.queue.get()
+                await client.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(client)
+
+
+async def _close_quietly(websocket: WebSocket) -> None:
+    try:
+        await asyncio.wait_for(websocket.close(code=1013), timeout=5)
+    except Exception:
+        pass
+
+
+# Module-level singleton shared by the agent handlers, routers and /ws/dashboard
+dashboard = DashboardHub()
@@ -1,3 +1,4 @@
+import json
 import logging
 import re
 from datetime import datetime, timezone
@@ -5,70 +6,101 @@ from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from app.models.agent import Agent
 from app.models.command_log import CommandLog
-from app.models.metric import Metric
 from app.models.tunnel_server import TunnelServer
 from app.models.tunnel_client import TunnelClient
+from app.services import outbox
 from app.services.agent_commands import send_command
+from app.services.alerts import alerts
+from app.services.command_log import store_output, full_output
+from app.services.fleet import fleet_traffic
+from app.services.live_metrics import live_metrics
+from app.services.metrics import metrics_ingest
+from app.services.pending_commands import pending_commands
+from app.services.presence import presence
+from app.services.agent_state import peer_params, configured_peer_params, record_peer_change
+from app.websocket.dashboard import dashboard
+from app.websocket.relay import relay
+from app.websocket.unit_of_work import UnitOfWork
 
 logger = logging.getLogger(__name__)
 
 
-async def handle_heartbeat(agent_id: str, msg: dict, db: AsyncSession) -> None:
-    result = await db.execute(select(Agent).where(Agent.id == agent_id))
-    agent = result.scalar_one_or_none()
-    if not agent:
+async def handle_heartbeat(uow: UnitOfWork, msg: dict) -> None:
+    # last_seen is tracked in memory and flushed in batches; only touch the DB
+    # when the agent reports a new version or public IP
+    agent_id, db = uow.agent_id, uow.db
+    if not presence.touch(agent_id, version=msg.get("version"), public_ip=msg.get("public_ip")):
         return
 
-    agent.last_seen = datetime.now(timezone.utc)
-
-    if version := msg.get("version"):
-        agent.version = version
-
-    public_ip = msg.get("public_ip")
-    if public_ip and public_ip != agent.public_ip:
-        agent.public_ip = public_ip
-        # For server agents, also propagate to tunnel_server.public_ip so the
-        # WireGuard endpoint is always current without manual configuration.
-        if agent.type == "server":
-            srv_result = await db.execute(
-                select(TunnelServer).where(TunnelServer.agent_id == agent_id)
-            )
-            server = srv_result.scalar_one_or_none()
-            if server and server.public_ip != public_ip:
-                server.public_ip = public_ip
-                logger.info("Auto-updated tunnel server public IP to %s for agent %s", public_ip, agent_id)
-
-    await db.commit()
-
+    # Only frames that change something get a SAVEPOINT (see UnitOfWork.isolated)
+    async with uow.isolated():
+        agent = await uow.agent()
+        if agent is None:
+            return
+        agent.last_seen = datetime.now(timezone.utc)
 
-async def handle_command_result(agent_id: str, msg: dict, db: AsyncSession) -> None:
+        if version := msg.get("version"):
+            agent.version = version
+
+        public_ip = msg.get("public_ip")
+        if public_ip and public_ip != agent.public_ip:
+            agent.public_ip = public_ip
+            # For server agents, also propagate to tunnel_server.public_ip so the
+            # WireGuard endpoint is always current without manual configuration.
+            if agent.type == "server":
+                srv_result = await db.execute(
+                    select(TunnelServer).where(TunnelServer.agent_id == agent_id)
+                )
+                server = srv_result.scalar_one_or_none()
+                if server and server.public_ip != public_ip:
+                    server.public_ip = public_ip
+                    logger.info("Auto-updated tunnel server public IP to %s for agent %s", public_ip, agent_id)
+
+
+async def handle_command_result(uow: UnitOfWork, msg: dict) -> None:
     """Update the command_log entry, extract public keys, and trigger follow-up commands."""
+    agent_id, db = uow.agent_id, uow.db
     command_id = msg.get("command_id")
     success = msg.get("success", False)
     output = msg.get("output", "")
 
     command_type = None
+    report = None
     if command_id:
-        result = await db.execute(select(CommandLog).where(CommandLog.id == command_id))
-        log = result.scalar_one_or_none()
+        await outbox.acknowledge(agent_id, command_id, db)
+        log = await uow.get(CommandLog, command_id)
         if log:
-            log.success = success
-            log.output = output
             command_type = log.command_type
-            await db.commit()
-
-    # Always update last_seen
-    result = await db.execute(select(Agent).where(Agent.id == agent_id))
-    agent = result.scalar_one_or_none()
-    if agent:
-        agent.last_seen = datetime.now(timezone.utc)
-        await db.commit()
+            if command_type == "report_state":
+                # The output is the agent's full rule set — keep only a summary in the log
+                report = _parse_state_report(output) if success else None
+                log.success = success and report is not None
+                stored = (
+                    f"{len(report.get('forwards') or [])} forward(s), {len(report.get('peers') or [])} peer(s) reported"
+                    if report is not None else output
+                )
+            elif command_type == "apply_state" and log.success is not None:
+                # Chunked apply_state: one result per frame, all must succeed
+                log.success = log.success and success
+                previous = await full_output(log, db)
+                stored = f"{previous}\n{output}" if previous else output
+            else:
+                log.success = success
+                stored = output
+            await store_output(log, stored, db)
+            uow.after_commit(lambda: _result_stored(agent_id, log, command_type, stored or ""))
+
+    presence.touch(agent_id)
 
     if not success:
         return
 
+    if report is not None:
+        from app.services.reconciler import reconcile
+        await reconcile(agent_id, report, db)
+        return
+
     # Extract and store public keys from wg_init / wg_configure results
     public_key = _extract_public_key(output)
 
@@ -79,7 +111,6 @@ async def handle_command_result(agent_id: str, msg: dict, db: AsyncSession) -> N
         server = result.scalar_one_or_none()
         if server:
             server.wg_public_key = public_key
-            await db.commit()
             logger.info("Stored server public key for agent %s", agent_id)
 
     elif command_type == "wg_configure" and public_key:
@@ -88,38 +119,43 @@ async def handle_command_result(agent_id: str, msg: dict, db: AsyncSession) -> N
         )
         client = result.scalar_one_or_none()
         if client:
+            old_peer = configured_peer_params(client)
             client.wg_public_key = public_key
             client.status = "connected"
-            await db.commit()
+            await db.flush()
+            state = await record_peer_change(client.tunnel_server_id, old_peer, client, db)
             logger.info("Stored client public key for agent %s", agent_id)
 
             # Now that we have the client's public key, add it as a peer on the server
             if client.tunnel_server_id:
-                await _add_peer_to_server(client, db)
+                await _add_peer_to_server(client, db, state)
+
 
+def _result_stored(agent_id: str, log: CommandLog, command_type: str, output: str) -> None:
+    """Wake whoever waits on a command's result, once the result is committed."""
+    command_id = str(log.id)
+    if not pending_commands.resolve(command_id, log.success, output):
+        # The command may have been sent from another worker that has a caller waiting
+        relay.resolve_elsewhere(command_id, log.success, output)
+    dashboard.publish("command_result", command_id, {
+        "command_id": command_id,
+        "agent_id": agent_id,
+        "command_type": command_type,
+        "success": log.success,
+        "output": log.output,
+    })
 
-async def _add_peer_to_server(client: TunnelClient, db: AsyncSession) -> None:
+
+async def _add_peer_to_server(client: TunnelClient, db: AsyncSession, state: dict | None = None) -> None:
     """Send wg_add_peer to the tunnel server agent with the client's public key."""
-    result = await db.execute(
-        select(TunnelServer).where(TunnelServer.id == client.tunnel_server_id)
-    )
-    server = result.scalar_one_or_none()
+    server = await db.get(TunnelServer, client.tunnel_server_id)
     if not server:
         return
 
-    allowed_ips = [client.tunnel_ip + "/32"]
-    if client.is_gateway and client.vm_network:
-        allowed_ips.append(client.vm_network)
-
     sent, cmd_id = await send_command(
         agent_id=str(server.agent_id),
         command_type="wg_add_peer",
-        params={
-            "peer_name": f"client-{client.tunnel_ip}",
-            "public_key": client.wg_public_key,
-            "tunnel_ip": client.tunnel_ip,
-            "allowed_ips": allowed_ips,
-        },
+        params={**peer_params(client), **(state or {})},
         db=db,
     )
     if sent:
@@ -129,40 +165,47 @@ async def _add_peer_to_server(client: TunnelClient, db: AsyncSession) -> None:
         logger.warning("Server agent %s not connected — wg_add_peer not delivered", server.agent_id)
 
 
+def _parse_state_report(output: str) -> dict | None:
+    try:
+        report = json.loads(output)
+    except (TypeError, ValueError):
+        return None
+    return report if isinstance(report, dict) else None
+
+
 def _extract_public_key(output: str) -> str | None:
     """Extract a WireGuard public key from command output like 'public key: abc123...'"""
     match = re.search(r"public key:\s*(\S+)", output, re.IGNORECASE)
     return match.group(1) if match else None
 
 
-async def handle_metrics(agent_id: str, msg: dict, db: AsyncSession) -> None:
+async def handle_metrics(uow: UnitOfWork, msg: dict) -> None:
+    agent_id = uow.agent_id
     timestamp_raw = msg.get("timestamp")
     try:
         timestamp = datetime.fromisoformat(timestamp_raw) if timestamp_raw else datetime.now(timezone.utc)
     except ValueError:
         timestamp = datetime.now(timezone.utc)
 
-    metric = Metric(
-        agent_id=agent_id,
-        timestamp=timestamp,
-        data={k: v for k, v in msg.items() if k not in ("type", "timestamp")},
-    )
-    db.add(metric)
-
-    result = await db.execute(select(Agent).where(Agent.id == agent_id))
-    agent = result.scalar_one_or_none()
-    if agent:
-        agent.last_seen = datetime.now(timezone.utc)
-
-    await db.commit()
+    data = {k: v for k, v in msg.items() if k not in ("type", "timestamp")}
+    live_metrics.record(agent_id, timestamp, data)
+    alerts.process(agent_id, timestamp, data)
+    if uow.ctx.agent_type == "server":
+        fleet_traffic.update(agent_id, timestamp, data.get("peers"))
+    # Written in bulk by the metrics ingest task, not one transaction per sample
+    metrics_ingest.submit(agent_id, timestamp, data)
+    presence.touch(agent_id)
 
 
-async def dispatch(agent_id: str, msg: dict, db: AsyncSession) -> None:
+async def dispatch(uow: UnitOfWork, msg: dict) -> None:
+    """Handle one inbound frame; the caller commits once for the whole batch."""
     msg_type = msg.get("type")
+    # Writes run in their own SAVEPOINT (heartbeats only when they write); metrics never touch the session
     if msg_type == "heartbeat":
-        await handle_heartbeat(agent_id, msg, db)
+        await handle_heartbeat(uow, msg)
     elif msg_type == "command_result":
-        await handle_command_result(agent_id, msg, db)
+        async with uow.isolated():
+            await handle_command_result(uow, msg)
     elif msg_type == "metrics":
-        await handle_metrics(agent_id, msg, db)
+        await handle_metrics(uow, msg)
     # Unknown message types are silently ignored
@@ -1,44 +1,328 @@
-import json
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
 from typing import Any
 
 from fastapi import WebSocket
 
+from app.codec import codec
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = {"drop", "disconnect", "block"}
+
+
+class AgentConnection:
+    """A connected agent socket with its own bounded send queue and writer task.
+
+    Callers enqueue serialized frames; the writer task is the only coroutine that
+    ever awaits ws.send_text, so a slow socket only delays its own queue.
+    """
+
+    def __init__(self, agent_id: str, websocket: WebSocket, agent_type: str | None, queue_size: int):
+        self.agent_id = agent_id
+        self.websocket = websocket
+        self.agent_type = agent_type  # 'server' | 'client'
+        # (frame, ack) — ack resolves to True once the frame is on the wire, False if the send failed
+        self.queue: asyncio.Queue[tuple[str, asyncio.Future | None]] = asyncio.Queue()
+        # Non-priority frames sent while the connection is held (see ConnectionManager.connect);
+        # they join the queue on release, behind whatever the outbox drain queued
+        self.held: deque[tuple[str, asyncio.Future | None]] = deque()
+        self.capacity = queue_size  # bound on queued + held frames
+        self.room = asyncio.Event()  # set by the writer whenever it takes a frame
+        self.writer: asyncio.Task | None = None
+        self.closed = False
+        self.ready = asyncio.Event()  # cleared while the connection is held
+        self.sent = 0
+        self.dropped = 0
+        self.last_send_latency: float | None = None  # seconds
+        self.avg_send_latency: float | None = None  # EWMA, seconds
+        self.max_send_latency = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize() + len(self.held)
+
+    def record_latency(self, latency: float) -> None:
+        self.sent += 1
+        self.last_send_latency = latency
+        self.max_send_latency = max(self.max_send_latency, latency)
+        if self.avg_send_latency is None:
+            self.avg_send_latency = latency
+        else:
+            self.avg_send_latency = 0.8 * self.avg_send_latency + 0.2 * latency
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "agent_id": self.agent_id,
+            "agent_type": self.agent_type,
+            "queue_depth": self.depth,
+            "queue_size": self.capacity,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "last_send_latency_ms": _ms(self.last_send_latency),
+            "avg_send_latency_ms": _ms(self.avg_send_latency),
+            "max_send_latency_ms": _ms(self.max_send_latency),
+        }
+
+
+@dataclass
+class BroadcastResult:
+    delivered: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+
+
+def _ms(seconds: float | None) -> float | None:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
 
 class ConnectionManager:
-    def __init__(self):
-        # agent_id (str) -> WebSocket
-        self._connections: dict[str, WebSocket] = {}
+    def __init__(
+        self,
+        queue_size: int = settings.WS_SEND_QUEUE_SIZE,
+        overflow_policy: str = settings.WS_SEND_OVERFLOW_POLICY,
+        block_timeout: float = settings.WS_SEND_BLOCK_TIMEOUT,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        # agent_id (str) -> AgentConnection
+        self._connections: dict[str, AgentConnection] = {}
+        # agent_type -> set of connected agent_ids, so broadcasts only touch their targets
+        self._by_type: dict[str, set[str]] = {}
+        # Socket close tasks, referenced until done so they are not garbage-collected mid-close
+        self._tasks: set[asyncio.Task] = set()
 
     def is_connected(self, agent_id: str) -> bool:
         return agent_id in self._connections
 
-    async def connect(self, agent_id: str, websocket: WebSocket) -> None:
-        self._connections[agent_id] = websocket
+    def agent_type(self, agent_id: str) -> str | None:
+        conn = self._connections.get(agent_id)
+        return conn.agent_type if conn else None
+
+    def agent_ids_of_type(self, agent_type: str) -> list[str]:
+        return list(self._by_type.get(agent_type, ()))
 
-    def disconnect(self, agent_id: str) -> None:
-        self._connections.pop(agent_id, None)
+    async def connect(
+        self,
+        agent_id: str,
+        websocket: WebSocket,
+        agent_type: str | None = None,
+        held: bool = False,
+    ) -> None:
+        """Register an agent socket and start its writer.
 
-    async def send(self, agent_id: str, message: dict[str, Any]) -> bool:
-        """Send a message to a specific agent. Returns False if agent not connected."""
-        ws = self._connections.get(agent_id)
-        if ws is None:
+        A held connection puts other sends aside until release() is called,
+        so priority sends (commands queued while the agent was offline) go out
+        before anything sent after it reconnected.
+        """
+        old = self._connections.get(agent_id)
+        if old is not None:
+            # Agent reconnected before the old socket was torn down
+            self._close(old)
+        conn = AgentConnection(agent_id, websocket, agent_type, self.queue_size)
+        if not held:
+            conn.ready.set()
+        conn.writer = asyncio.create_task(self._writer(conn), name=f"ws-writer-{agent_id}")
+        self._connections[agent_id] = conn
+        if agent_type:
+            self._by_type.setdefault(agent_type, set()).add(agent_id)
+
+    def release(self, agent_id: str, websocket: WebSocket) -> None:
+        """Let sends held back by connect(held=True) through, if websocket still owns the connection."""
+        conn = self._connections.get(agent_id)
+        if conn is None or conn.websocket is not websocket or conn.ready.is_set():
+            return
+        conn.ready.set()
+        while conn.held:
+            conn.queue.put_nowait(conn.held.popleft())
+
+    def disconnect(self, agent_id: str, websocket: WebSocket | None = None) -> None:
+        """Drop an agent's connection and stop its writer.
+
+        If websocket is given, only drop the connection if it still belongs to
+        that socket — a stale handler must not evict a newer reconnect.
+        """
+        conn = self._connections.get(agent_id)
+        if conn is None or (websocket is not None and conn.websocket is not websocket):
+            return
+        self._evict(conn)
+        self._stop_writer(conn)
+
+    def close(self, agent_id: str) -> None:
+        """Drop an agent's connection and close its socket so its receive loop exits."""
+        conn = self._connections.get(agent_id)
+        if conn is not None:
+            self._close(conn)
+
+    async def send(self, agent_id: str, message: dict[str, Any], priority: bool = False) -> bool:
+        """Queue a message for a specific agent.
+
+        Returns once the frame is queued (or put aside on a held connection,
+        see connect), without waiting for it to be sent. Returns False if the
+        agent is not connected or the frame was rejected by the overflow policy.
+        """
+        conn = self._connections.get(agent_id)
+        if conn is None:
+            return False
+        return await self._enqueue(conn, codec.dumps(message), priority=priority)
+
+    async def _enqueue(
+        self,
+        conn: AgentConnection,
+        frame: str,
+        ack: asyncio.Future | None = None,
+        priority: bool = False,
+    ) -> bool:
+        if conn.closed:
+            return False
+        if conn.depth >= conn.capacity and not await self._wait_for_room(conn):
             return False
-        await ws.send_text(json.dumps(message))
+        if priority or conn.ready.is_set():
+            conn.queue.put_nowait((frame, ack))
+        else:
+            conn.held.append((frame, ack))
         return True
 
-    async def broadcast(self, agent_type: str, message: dict[str, Any], agent_types: dict[str, str]) -> None:
-        """Broadcast to all connected agents of a given type.
+    async def _wait_for_room(self, conn: AgentConnection) -> bool:
+        """Apply the overflow policy to a full connection; True once there is room for one more frame."""
+        if self.overflow_policy == "block":
+            try:
+                async with asyncio.timeout(self.block_timeout):
+                    while conn.depth >= conn.capacity and not conn.closed:
+                        conn.room.clear()
+                        await conn.room.wait()
+            except TimeoutError:
+                conn.dropped += 1
+                logger.warning("Send queue for agent %s still full after %.1fs — frame dropped",
+                               conn.agent_id, self.block_timeout)
+                return False
+            # The connection may have gone away while we waited for room
+            return not conn.closed
+
+        conn.dropped += 1
+        if self.overflow_policy == "disconnect":
+            logger.warning("Send queue for agent %s full — disconnecting slow agent", conn.agent_id)
+            self._close(conn)
+        else:
+            logger.warning("Send queue for agent %s full — frame dropped", conn.agent_id)
+        return False
+
+    async def _writer(self, conn: AgentConnection) -> None:
+        """Drain one agent's queue onto its socket until cancelled or the socket fails."""
+        try:
+            while True:
+                frame, ack = await conn.queue.get()
+                conn.room.set()
+                started = time.perf_counter()
+                try:
+                    await conn.websocket.send_text(frame)
+                except BaseException:
+                    if ack is not None and not ack.done():
+                        ack.set_result(False)
+                    raise
+                conn.record_latency(time.perf_counter() - started)
+                if ack is not None and not ack.done():
+                    ack.set_result(True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("Send to agent %s failed: %s", conn.agent_id, exc)
+            if self._connections.get(conn.agent_id) is conn:
+                self._close(conn)
+
+    def _close(self, conn: AgentConnection) -> None:
+        """Evict a connection and close its socket so the receive loop exits."""
+        self._evict(conn)
+        self._stop_writer(conn)
+        task = asyncio.create_task(_close_quietly(conn.websocket))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
 
-        agent_types is a mapping of agent_id -> agent_type, maintained by the caller.
+    def _stop_writer(self, conn: AgentConnection) -> None:
+        """Cancel the writer and fail every queued frame, so pending acked sends return at once."""
+        conn.closed = True
+        conn.room.set()  # wake blocked senders; they see the connection closed
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        self._fail_queued(conn)
+
+    @staticmethod
+    def _fail_queued(conn: AgentConnection) -> None:
+        while conn.held:
+            _, ack = conn.held.popleft()
+            if ack is not None and not ack.done():
+                ack.set_result(False)
+        while True:
+            try:
+                _, ack = conn.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if ack is not None and not ack.done():
+                ack.set_result(False)
+
+    def _evict(self, conn: AgentConnection) -> None:
+        if self._connections.get(conn.agent_id) is not conn:
+            return
+        self._connections.pop(conn.agent_id, None)
+        if conn.agent_type:
+            ids = self._by_type.get(conn.agent_type)
+            if ids is not None:
+                ids.discard(conn.agent_id)
+
+    async def broadcast(
+        self,
+        agent_type: str,
+        message: dict[str, Any],
+        timeout: float = settings.WS_BROADCAST_TIMEOUT,
+    ) -> BroadcastResult:
+        """Send a message to every connected agent of a given type, concurrently.
+
+        Each send is bounded by timeout (seconds, measured until the frame is on
+        the wire), so one stuck socket cannot hold up the rest of the fan-out.
         """
-        for agent_id, ws in list(self._connections.items()):
-            if agent_types.get(agent_id) == agent_type:
-                await ws.send_text(json.dumps(message))
+        frame = codec.dumps(message)
+        targets = [self._connections[a] for a in self.agent_ids_of_type(agent_type) if a in self._connections]
+        outcomes = await asyncio.gather(*(self._send_acked(conn, frame, timeout) for conn in targets))
+
+        result = BroadcastResult()
+        for conn, ok in zip(targets, outcomes):
+            (result.delivered if ok else result.failed).append(conn.agent_id)
+        if result.failed:
+            logger.warning("Broadcast to %d %s agent(s) failed or timed out: %s",
+                           len(result.failed), agent_type, result.failed)
+        return result
+
+    async def _send_acked(self, conn: AgentConnection, frame: str, timeout: float) -> bool:
+        ack = asyncio.get_running_loop().create_future()
+        try:
+            async with asyncio.timeout(timeout):
+                if not await self._enqueue(conn, frame, ack):
+                    return False
+                return await ack
+        except TimeoutError:
+            return False
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Per-agent queue depth and send latency, for monitoring."""
+        return [conn.stats() for conn in self._connections.values()]
 
     @property
     def connected_agent_ids(self) -> list[str]:
         return list(self._connections.keys())
 
 
+async def _close_quietly(websocket: WebSocket) -> None:
+    try:
+        await asyncio.wait_for(websocket.close(code=1013), timeout=5)
+    except Exception:
+        pass
+
+
 # Module-level singleton used by the WebSocket endpoint and command dispatch service
 manager = ConnectionManager()
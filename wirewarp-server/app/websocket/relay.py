@@ -0,0 +1,353 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any
+
+import asyncpg
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.alerts import alerts
+from app.services.change_versions import changes
+from app.services.pending_commands import pending_commands
+from app.websocket.dashboard import dashboard
+from app.websocket.hub import manager
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "wirewarp_relay"
+# Relay connections identify their worker in pg_stat_activity, so routes left by a
+# worker that died without running stop() can be told apart from live ones
+APPLICATION_NAME_PREFIX = "wirewarp-relay-"
+# NOTIFY payloads must stay under 8000 bytes; larger messages go through relay_messages
+INLINE_PAYLOAD_MAX = 7000
+
+
+class Relay:
+    """Routes commands to agents held by other uvicorn workers over Postgres LISTEN/NOTIFY.
+
+    Each worker owns the WebSockets of the agents that connected to it and
+    records them in agent_routes. A send for an agent held elsewhere is
+    published to the owning worker, which queues it on the socket and answers
+    with an ack. The same channel carries command results (to wake ?wait=
+    callers on the worker that sent the command), table change versions,
+    alert rule changes and dashboard events. Dashboard events are only relayed
+    while some other worker has a tab open. Messages from a worker are
+    ignored by that worker.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.routes: dict[str, str] = {}  # agent_id -> worker_id, for agents held by other workers
+        self._conn: asyncpg.Connection | None = None
+        self._lock = asyncio.Lock()  # one query at a time on the relay connection
+        self._acks: dict[str, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+        # Other workers with dashboard tabs open -> time.monotonic() they last said so
+        self._dashboard_workers: dict[str, float] = {}
+
+    @property
+    def active(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def start(self) -> None:
+        if not settings.RELAY_ENABLED:
+            return
+        await self._connect()
+        changes.on_bump = lambda tables: self.publish_nowait("changed", {"tables": sorted(tables)})
+        dashboard.on_clients = lambda present: self.publish_nowait("dashboard_on" if present else "dashboard_off", {})
+        # Workers with tabs open answer with dashboard_on
+        await self.publish("dashboard_query", {})
+        logger.info("Relay started for worker %s (%d agent route(s) on other workers)",
+                    self.worker_id, len(self.routes))
+
+    async def _connect(self) -> None:
+        conn = await asyncpg.connect(
+            settings.DATABASE_URL.replace("+asyncpg", "", 1),
+            server_settings={"application_name": APPLICATION_NAME_PREFIX + self.worker_id},
+        )
+        await conn.add_listener(CHANNEL, self._on_notify)
+        self._conn = conn
+        await self._prune_dead_routes()
+        await self._restore_routes()
+        rows = await self._fetch("SELECT agent_id, worker_id FROM agent_routes WHERE worker_id <> $1", self.worker_id)
+        self.routes = {str(r["agent_id"]): r["worker_id"] for r in rows}
+
+    async def _prune_dead_routes(self) -> None:
+        """Delete routes of workers that no longer have a relay connection and mark their agents disconnected."""
+        rows = await self._fetch(
+            """
+            WITH gone AS (
+                DELETE FROM agent_routes r
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM pg_stat_activity a WHERE a.application_name = $1 || r.worker_id
+                )
+                RETURNING r.agent_id
+            ), marked AS (
+                UPDATE agents SET status = 'disconnected'
+                WHERE id IN (SELECT agent_id FROM gone) AND status = 'connected'
+            )
+            SELECT agent_id FROM gone
+            """,
+            APPLICATION_NAME_PREFIX,
+        )
+        if not rows:
+            return
+        for row in rows:
+            self.routes.pop(str(row["agent_id"]), None)
+        changes.bump({"agents"})
+        logger.info("Dropped %d agent route(s) left by workers that are gone", len(rows))
+
+    async def _restore_routes(self) -> None:
+        """Re-record routes for sockets this worker still holds, in case they were pruned while it was offline."""
+        held = [uuid.UUID(agent_id) for agent_id in manager.connected_agent_ids]
+        if not held:
+            return
+        await self._execute(
+            """
+            WITH restored AS (
+                INSERT INTO agent_routes (agent_id, worker_id, connected_at)
+                SELECT id, $2, now() FROM agents WHERE id = ANY($1::uuid[])
+                ON CONFLICT (agent_id) DO NOTHING
+                RETURNING agent_id
+            )
+            UPDATE agents SET status = 'connected' WHERE id IN (SELECT agent_id FROM restored)
+            """,
+            held, self.worker_id,
+        )
+
+    async def stop(self) -> None:
+        changes.on_bump = None
+        dashboard.on_flush = None
+        dashboard.on_clients = None
+        if not self.active:
+            return
+        try:
+            if len(dashboard):
+                await self.publish("dashboard_off", {})
+            await self._execute("DELETE FROM agent_routes WHERE worker_id = $1", self.worker_id)
+        finally:
+            await self._conn.close()
+            self._conn = None
+
+    async def run(self) -> None:
+        """
+        Background task: reconnect the listener if it drops, prune routes of dead
+        workers and stale oversized messages, and refresh dashboard subscriptions.
+        """
+        if not settings.RELAY_ENABLED:
+            return
+        while True:
+            await asyncio.sleep(settings.RELAY_MAINTENANCE_INTERVAL_SECONDS)
+            try:
+                if not self.active:
+                    logger.warning("Relay connection lost — reconnecting")
+                    await self._connect()
+                else:
+                    await self._prune_dead_routes()
+                await self._execute(
+                    "DELETE FROM relay_messages WHERE created_at < now() - make_interval(secs => $1)",
+                    float(settings.RELAY_MESSAGE_TTL_SECONDS),
+                )
+                # Subscriptions are re-announced every interval; a worker that died
+                # without saying dashboard_off stops being relayed to after a few
+                cutoff = time.monotonic() - 3 * settings.RELAY_MAINTENANCE_INTERVAL_SECONDS
+                self._dashboard_workers = {w: t for w, t in self._dashboard_workers.items() if t >= cutoff}
+                self._update_dashboard_relay()
+                if len(dashboard):
+                    await self.publish("dashboard_on", {})
+            except Exception:
+                logger.exception("Relay maintenance failed")
+
+    def _update_dashboard_relay(self) -> None:
+        """Forward this worker's dashboard events only while another worker has tabs open."""
+        if self._dashboard_workers:
+            dashboard.on_flush = lambda events: self.publish_nowait("dashboard", {"events": events})
+        else:
+            dashboard.on_flush = None
+
+    # -- routes ------------------------------------------------------------
+
+    async def route(self, agent_id: str) -> None:
+        """Record that this worker now holds agent_id's socket."""
+        self.routes.pop(agent_id, None)
+        if not self.active:
+            return
+        await self._execute(
+            """
+            INSERT INTO agent_routes (agent_id, worker_id, connected_at) VALUES ($1, $2, now())
+            ON CONFLICT (agent_id) DO UPDATE SET worker_id = EXCLUDED.worker_id, connected_at = EXCLUDED.connected_at
+            """,
+            uuid.UUID(agent_id), self.worker_id,
+        )
+        await self.publish("route", {"agent_id": agent_id})
+
+    async def unroute(self, agent_id: str) -> bool:
+        """
+        Drop this worker's route for agent_id.
+
+        Returns False if another worker has taken the agent over since, in which
+        case the caller must not mark the agent disconnected.
+        """
+        if not self.active:
+            return agent_id not in self.routes
+        row = await self._fetch(
+            "DELETE FROM agent_routes WHERE agent_id = $1 AND worker_id = $2 RETURNING agent_id",
+            uuid.UUID(agent_id), self.worker_id,
+        )
+        if not row:
+            return False
+        await self.publish("unroute", {"agent_id": agent_id})
+        return True
+
+    def is_connected(self, agent_id: str) -> bool:
+        """Whether any worker holds a socket for agent_id."""
+        return manager.is_connected(agent_id) or agent_id in self.routes
+
+    # -- sending -----------------------------------------------------------
+
+    async def send(self, agent_id: str, message: dict[str, Any]) -> bool:
+        """
+        Queue a message for an agent on whichever worker holds its socket.
+
+        Same contract as manager.send: False if the agent is not connected
+        anywhere, the owning worker rejected the frame, or it did not ack within
+        RELAY_ACK_TIMEOUT (never less than the owner may spend waiting for room
+        in a full queue).
+        """
+        if manager.is_connected(agent_id):
+            return await manager.send(agent_id, message)
+        worker = self.routes.get(agent_id)
+        if worker is None or not self.active:
+            return False
+        request_id = uuid.uuid4().hex
+        ack = self._acks[request_id] = asyncio.get_running_loop().create_future()
+        try:
+            await self.publish("send", {"agent_id": agent_id, "message": message, "request": request_id}, to=worker)
+            timeout = max(settings.RELAY_ACK_TIMEOUT, settings.WS_SEND_BLOCK_TIMEOUT + 1.0)
+            return await asyncio.wait_for(ack, timeout=timeout)
+        except asyncio.TimeoutError:
+            # The owning worker is gone or wedged; stop routing to it until the agent reconnects
+            logger.warning("Worker %s did not ack a send to agent %s — dropping route", worker, agent_id)
+            if self.routes.get(agent_id) == worker:
+                del self.routes[agent_id]
+            return False
+        finally:
+            self._acks.pop(request_id, None)
+
+    def rules_changed(self) -> None:
+        """Tell the other workers to reload their alert rules."""
+        self.publish_nowait("rules_changed", {})
+
+    def resolve_elsewhere(self, command_id: str, success: bool, output: str) -> None:
+        """Forward a command result that no local caller was waiting for to the other workers."""
+        self.publish_nowait("result", {"command_id": command_id, "success": success, "output": output})
+
+    # -- transport ---------------------------------------------------------
+
+    async def publish(self, op: str, body: dict[str, Any], to: str | None = None) -> None:
+        if not self.active:
+            return
+        payload = json.dumps({"op": op, "from": self.worker_id, "to": to, **body}, default=str)
+        if len(payload.encode()) > INLINE_PAYLOAD_MAX:
+            ref = await self._fetchval("INSERT INTO relay_messages (payload) VALUES ($1) RETURNING id", payload)
+            payload = json.dumps({"op": op, "from": self.worker_id, "to": to, "ref": ref})
+        await self._execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+
+    def publish_nowait(self, op: str, body: dict[str, Any], to: str | None = None) -> None:
+        """Publish from synchronous code (session events, timer callbacks)."""
+        if not self.active:
+            return
+        task = asyncio.get_running_loop().create_task(self._publish_logged(op, body, to))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _publish_logged(self, op: str, body: dict[str, Any], to: str | None) -> None:
+        try:
+            await self.publish(op, body, to)
+        except Exception:
+            logger.exception("Relay publish of %s failed", op)
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            return
+        if msg.get("from") == self.worker_id or msg.get("to") not in (None, self.worker_id):
+            return
+        task = asyncio.get_running_loop().create_task(self._handle(msg))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, msg: dict[str, Any]) -> None:
+        try:
+            if "ref" in msg:
+                msg = await self._load(msg)
+                if msg is None:
+                    return
+            await self._dispatch(msg["op"], msg["from"], msg)
+        except Exception:
+            logger.exception("Relay message %s failed", msg.get("op"))
+
+    async def _load(self, msg: dict[str, Any]) -> dict[str, Any] | None:
+        # Messages addressed to one worker are consumed; broadcasts are pruned by age
+        if msg.get("to"):
+            payload = await self._fetchval("DELETE FROM relay_messages WHERE id = $1 RETURNING payload", msg["ref"])
+        else:
+            payload = await self._fetchval("SELECT payload FROM relay_messages WHERE id = $1", msg["ref"])
+        return json.loads(payload) if payload is not None else None
+
+    async def _dispatch(self, op: str, sender: str, msg: dict[str, Any]) -> None:
+        if op == "send":
+            ok = await manager.send(msg["agent_id"], msg["message"])
+            await self.publish("ack", {"request": msg["request"], "ok": ok}, to=sender)
+        elif op == "ack":
+            ack = self._acks.get(msg["request"])
+            if ack is not None and not ack.done():
+                ack.set_result(bool(msg["ok"]))
+        elif op == "route":
+            self.routes[msg["agent_id"]] = sender
+            if manager.is_connected(msg["agent_id"]):
+                # The agent reconnected to another worker; close this stale socket so its receive loop ends
+                manager.close(msg["agent_id"])
+        elif op == "unroute":
+            if self.routes.get(msg["agent_id"]) == sender:
+                del self.routes[msg["agent_id"]]
+        elif op == "result":
+            pending_commands.resolve(msg["command_id"], msg["success"], msg["output"])
+        elif op == "changed":
+            changes.bump(set(msg["tables"]), notify=False)
+        elif op == "rules_changed":
+            async with SessionLocal() as db:
+                await alerts.reload_rules(db)
+        elif op == "dashboard":
+            dashboard.deliver(msg["events"])
+        elif op == "dashboard_on":
+            self._dashboard_workers[sender] = time.monotonic()
+            self._update_dashboard_relay()
+        elif op == "dashboard_off":
+            self._dashboard_workers.pop(sender, None)
+            self._update_dashboard_relay()
+        elif op == "dashboard_query":
+            if len(dashboard):
+                await self.publish("dashboard_on", {}, to=sender)
+
+    async def _execute(self, query: str, *args: Any) -> None:
+        async with self._lock:
+            await self._conn.execute(query, *args)
+
+    async def _fetch(self, query: str, *args: Any) -> list:
+        async with self._lock:
+            return await self._conn.fetch(query, *args)
+
+    async def _fetchval(self, query: str, *args: Any) -> Any:
+        async with self._lock:
+            return await self._conn.fetchval(query, *args)
+
+
+# Module-level singleton; started in the app lifespan when RELAY_ENABLED
+relay = Relay()
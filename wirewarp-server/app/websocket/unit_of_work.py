@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.agent import Agent
+
+logger = logging.getLogger(__name__)
+
+
+class AgentContext:
+    """What the message loop knows about the agent on the other end, kept for the life of its socket.
+
+    Only identity is kept: the agent row itself may be changed or deleted
+    through the API meanwhile, so handlers load it per batch (UnitOfWork.agent).
+    """
+
+    def __init__(self, agent: Agent):
+        self.id = agent.id
+        self.agent_id = str(agent.id)
+        self.agent_type = agent.type  # 'server' | 'client'
+
+
+async def next_batch(inbox: asyncio.Queue, limit: int) -> list:
+    """Wait for one frame, then take whatever else is already buffered, up to limit frames in all."""
+    batch = [await inbox.get()]
+    while len(batch) < limit and not inbox.empty():
+        batch.append(inbox.get_nowait())
+    return batch
+
+
+class UnitOfWork:
+    """One session and one commit for a batch of inbound frames from one agent.
+
+    Handlers flush rather than commit; effects that other coroutines can observe
+    (waking ?wait= callers, dashboard events) are registered with after_commit so
+    nobody sees a result before it is in the database. Sending a command still
+    commits on the spot, since the agent's reply must find its command_log row.
+    Frames that write run in isolated(), so one failing frame does not take the
+    rest of the batch down with it.
+    """
+
+    def __init__(self, ctx: AgentContext, db: AsyncSession):
+        self.ctx = ctx
+        self.db = db
+        self._agent: Agent | None = None
+        self._after_commit: list[Callable[[], Any]] = []
+
+    @property
+    def agent_id(self) -> str:
+        return self.ctx.agent_id
+
+    async def agent(self) -> Agent | None:
+        """The connection's agent row, loaded at most once per batch; None if it has been deleted."""
+        if self._agent is None:
+            self._agent = await self.db.get(Agent, self.ctx.id)
+        return self._agent
+
+    @asynccontextmanager
+    async def isolated(self):
+        """
+        Run one frame's writes in a SAVEPOINT; if they fail, only that frame is undone.
+
+        The exception is logged and swallowed so the rest of the batch still
+        commits. If the frame sent a command (which commits the batch so far)
+        before failing, what it wrote after that is rolled back instead.
+        """
+        callbacks = len(self._after_commit)
+        savepoint = await self.db.begin_nested()
+        try:
+            yield
+            if savepoint.is_active:
+                await savepoint.commit()
+        except Exception:
+            logger.exception("Frame from agent %s failed; its changes were rolled back", self.agent_id)
+            del self._after_commit[callbacks:]
+            if savepoint.is_active:
+                await savepoint.rollback()
+            else:
+                await self.db.rollback()
+            self._agent = None
+
+    async def get(self, model: Any, key: Any) -> Any:
+        """Primary-key lookup through the session's identity map; None for a malformed UUID."""
+        if not isinstance(key, uuid.UUID):
+            try:
+                key = uuid.UUID(str(key))
+            except ValueError:
+                return None
+        return await self.db.get(model, key)
+
+    def after_commit(self, fn: Callable[[], Any]) -> None:
+        self._after_commit.append(fn)
+
+    async def commit(self) -> None:
+        await self.db.commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for fn in callbacks:
+            fn()
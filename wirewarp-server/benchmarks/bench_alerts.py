@@ -0,0 +1,85 @@
+"""
+Per-frame cost of the alert evaluator on the metrics ingest path.
+
+Compares the work handle_metrics already does for a frame (JSON decode,
+live ring buffers, ingest enqueue) with the same work plus alert
+evaluation, for servers with different peer counts.
+
+Run from wirewarp-server/:
+
+    PYTHONPATH=. python benchmarks/bench_alerts.py
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.services.alerts import AlertEvaluator, Rule, BUILTIN_RULES
+from app.services.live_metrics import LiveMetrics
+from app.services.metrics import MetricsIngest
+
+
+def make_frames(peers: int, count: int) -> list[str]:
+    start = datetime.now(timezone.utc) - timedelta(seconds=10 * count)
+    frames = []
+    for i in range(count):
+        ts = start + timedelta(seconds=10 * i)
+        frames.append(json.dumps({
+            "type": "metrics",
+            "timestamp": ts.isoformat(),
+            "system": {"cpu_percent": 20 + i % 70, "mem_used_mb": 512, "disk_used_percent": 40.0},
+            "peers": [
+                {
+                    "public_key": f"peer-{p:05d}",
+                    "endpoint": "203.0.113.1:51820",
+                    # Every tenth peer stops handshaking and receiving, so alerts do fire
+                    "last_handshake": (ts - timedelta(seconds=600 if p % 10 == 0 else 30)).isoformat(),
+                    "rx_bytes": 1_000_000 + (0 if p % 10 == 0 else i * 4096),
+                    "tx_bytes": 500_000 + i * 2048,
+                }
+                for p in range(peers)
+            ],
+        }))
+    return frames
+
+
+def run(frames: list[str], evaluator: AlertEvaluator | None) -> float:
+    """Seconds per frame for the in-handler work, optionally with alert evaluation."""
+    agent_id = str(uuid.uuid4())
+    live = LiveMetrics(window_seconds=3600, sample_seconds=10)
+    ingest = MetricsIngest(queue_size=len(frames) + 1)
+    started = time.perf_counter()
+    for raw in frames:
+        msg = json.loads(raw)
+        timestamp = datetime.fromisoformat(msg["timestamp"])
+        data = {k: v for k, v in msg.items() if k not in ("type", "timestamp")}
+        live.record(agent_id, timestamp, data)
+        if evaluator is not None:
+            evaluator.evaluate(agent_id, timestamp.timestamp(), data)
+        ingest.submit(agent_id, timestamp, data)
+    return (time.perf_counter() - started) / len(frames)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--peers", type=int, nargs="+", default=[1, 10, 100, 1000])
+    args = parser.parse_args()
+
+    rules = [
+        Rule(uuid.uuid4(), r["name"], r["kind"], float(r["threshold"]), float(r["duration_seconds"]))
+        for r in BUILTIN_RULES
+    ]
+    print(f"{'peers':>6} {'baseline us/frame':>18} {'with alerts':>12} {'added us/peer':>14}")
+    for peers in args.peers:
+        frames = make_frames(peers, args.frames)
+        run(frames[:10], None)  # warm up
+        baseline = min(run(frames, None) for _ in range(3))
+        with_alerts = min(run(frames, AlertEvaluator(rules)) for _ in range(3))
+        per_peer = (with_alerts - baseline) / peers
+        print(f"{peers:>6} {baseline * 1e6:>18.1f} {with_alerts * 1e6:>12.1f} {per_peer * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
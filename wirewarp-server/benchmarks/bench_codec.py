@@ -0,0 +1,160 @@
+"""
+Per-frame and per-response cost of the stdlib and orjson codecs.
+
+Frames are what actually crosses /ws/agent: heartbeats and command results
+inbound, metrics frames with a peer list per server, and outbound apply_state
+chunks of STATE_REPLAY_CHUNK_SIZE forwards. List responses are the agent and
+port forward lists at the default and maximum page sizes, rendered through
+FastAPI's JSONResponse and through CodecJSONResponse.
+
+Run from wirewarp-server/:
+
+    PYTHONPATH=. python benchmarks/bench_codec.py
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.codec import CodecJSONResponse, get_codec, orjson
+from app.schemas.agent import AgentRead
+from app.schemas.port_forward import PortForwardRead
+
+
+def heartbeat() -> dict:
+    return {"type": "heartbeat", "timestamp": datetime.now(timezone.utc).isoformat(), "version": "1.4.2",
+            "public_ip": "203.0.113.10"}
+
+
+def command_result() -> dict:
+    return {"type": "command_result", "command_id": str(uuid.uuid4()), "success": True,
+            "output": "interface wg0 configured\npublic key: " + "A" * 43 + "=\n" * 4}
+
+
+def metrics(peers: int) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "type": "metrics",
+        "timestamp": now.isoformat(),
+        "system": {"cpu_percent": 23.5, "mem_used_mb": 812, "disk_used_percent": 41.2},
+        "peers": [
+            {"public_key": f"{p:043d}=", "endpoint": f"198.51.100.{p % 250}:51820",
+             "last_handshake": (now - timedelta(seconds=p % 120)).isoformat(),
+             "rx_bytes": 1_000_000 * p, "tx_bytes": 750_000 * p}
+            for p in range(peers)
+        ],
+    }
+
+
+def apply_state(forwards: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "type": "apply_state",
+        "params": {
+            "mode": "full", "chunk": 0, "chunks": 1, "generation": 4821, "state_hash": "f" * 64,
+            "forwards": [
+                {"protocol": "tcp", "public_port": 10000 + f, "destination_ip": f"10.0.{f // 250}.{f % 250}",
+                 "destination_port": 8000 + f % 100}
+                for f in range(forwards)
+            ],
+            "peers": [],
+        },
+    }
+
+
+def agents(rows: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        AgentRead.model_validate({
+            "id": uuid.uuid4(), "name": f"agent-{i}", "type": "server" if i % 5 == 0 else "client",
+            "hostname": f"host-{i}.example.net", "public_ip": f"203.0.113.{i % 250}", "status": "connected",
+            "version": "1.4.2", "last_seen": now, "created_at": now - timedelta(days=i),
+        })
+        for i in range(rows)
+    ]
+
+
+def port_forwards(rows: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        PortForwardRead.model_validate({
+            "id": uuid.uuid4(), "tunnel_server_id": uuid.uuid4(), "tunnel_client_id": uuid.uuid4(),
+            "protocol": "tcp", "public_port": 10000 + i, "destination_ip": f"10.0.{i // 250}.{i % 250}",
+            "destination_port": 8000 + i % 100, "description": f"forward {i}", "active": True, "created_at": now,
+        })
+        for i in range(rows)
+    ]
+
+
+def per_call(fn, min_seconds: float) -> float:
+    """Seconds per call, from the best of three runs of at least min_seconds each."""
+    n, best = 1, float("inf")
+    while True:
+        started = time.perf_counter()
+        for _ in range(n):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            break
+        n *= 2
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, (time.perf_counter() - started) / n)
+    return best
+
+
+def row(label: str, size: int, baseline: float, fast: float | None) -> None:
+    if fast is None:
+        print(f"{label:<34} {size:>9} {baseline * 1e6:>12.1f} {'-':>12} {'-':>8}")
+    else:
+        print(f"{label:<34} {size:>9} {baseline * 1e6:>12.1f} {fast * 1e6:>12.1f} {baseline / fast:>7.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="minimum duration of each timed run")
+    args = parser.parse_args()
+
+    stdlib = get_codec("json")
+    fast = get_codec("orjson") if orjson is not None else None
+    if fast is None:
+        print("orjson is not installed — only the stdlib codec is measured\n")
+
+    frames = [
+        ("heartbeat", heartbeat()),
+        ("command_result", command_result()),
+        ("metrics, 10 peers", metrics(10)),
+        ("metrics, 250 peers", metrics(250)),
+        ("apply_state, 1000 forwards", apply_state(1000)),
+    ]
+    print(f"{'frame':<34} {'bytes':>9} {'json us':>12} {'orjson us':>12} {'speedup':>8}")
+    for label, frame in frames:
+        raw = stdlib.dumps(frame)
+        size = len(raw.encode())
+        row(f"encode {label}", size, per_call(lambda: stdlib.dumps(frame), args.min_seconds),
+            per_call(lambda: fast.dumps(frame), args.min_seconds) if fast else None)
+        row(f"decode {label}", size, per_call(lambda: stdlib.loads(raw), args.min_seconds),
+            per_call(lambda: fast.loads(raw), args.min_seconds) if fast else None)
+
+    # What FastAPI hands the response class after validating against response_model
+    lists = [
+        ("agents", 200, agents(200)),
+        ("agents", 1000, agents(1000)),
+        ("port forwards", 200, port_forwards(200)),
+        ("port forwards", 1000, port_forwards(1000)),
+    ]
+    print(f"\n{'list response':<34} {'bytes':>9} {'stdlib us':>12} {'codec us':>12} {'speedup':>8}")
+    for label, rows, models in lists:
+        content = jsonable_encoder(models)
+        size = len(CodecJSONResponse(content).body)
+        row(f"{label}, {rows} rows", size, per_call(lambda: JSONResponse(content), args.min_seconds),
+            per_call(lambda: CodecJSONResponse(content), args.min_seconds))
+
+
+if __name__ == "__main__":
+    main()
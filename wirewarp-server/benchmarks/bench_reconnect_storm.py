@@ -0,0 +1,156 @@
+"""
+Time to full convergence when every agent reconnects at once.
+
+Simulates N agents hitting /ws/agent together (as after a server restart)
+and running the connect path against a DB pool of the engine's default size:
+auth, outbox delivery and the state replay, each in its own session. Without
+admission control every agent contends for the pool, queries slow down with
+the number in flight, and agents (or heartbeats of agents already back) that
+wait past the pool timeout fail and back off. With the AdmissionController
+only a bounded number run at once, the rest are admitted in arrival order and
+the overflow is told when to come back.
+
+Times are simulated seconds; --scale shrinks them to keep the run short (too
+small a scale and asyncio timer overhead, not the database, sets the pace).
+
+Run from wirewarp-server/:
+
+    PYTHONPATH=. python benchmarks/bench_reconnect_storm.py
+"""
+import argparse
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager, nullcontext
+
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class SimulatedDB:
+    """A connection pool in front of a database whose queries slow down past `cores` in flight."""
+
+    def __init__(self, pool_size: int, pool_timeout: float, cores: int, query_seconds: float, scale: float):
+        self.pool = asyncio.Semaphore(pool_size)
+        self.pool_timeout = pool_timeout
+        self.cores = cores
+        self.query_seconds = query_seconds
+        self.scale = scale
+        self.in_flight = 0
+
+    @asynccontextmanager
+    async def session(self):
+        try:
+            await asyncio.wait_for(self.pool.acquire(), self.pool_timeout * self.scale)
+        except asyncio.TimeoutError:
+            raise PoolTimeout
+        try:
+            yield
+        finally:
+            self.pool.release()
+
+    async def query(self, count: int) -> None:
+        for _ in range(count):
+            self.in_flight += 1
+            try:
+                await asyncio.sleep(self.query_seconds * max(1.0, self.in_flight / self.cores) * self.scale)
+            finally:
+                self.in_flight -= 1
+
+
+class Stats:
+    def __init__(self):
+        self.converged: list[float] = []
+        self.pool_timeouts = 0
+        self.retry_hints = 0
+        self.heartbeat_timeouts = 0
+        self.done = False
+
+
+async def agent(db: SimulatedDB, gate: AdmissionController | None, args, started: float, stats: Stats) -> None:
+    # Agents come back spread over a second or so of their own reconnect jitter
+    await asyncio.sleep(random.uniform(0, args.arrival_spread) * args.scale)
+    backoff = 1.0
+    while True:
+        try:
+            async with gate.slot() if gate else nullcontext():
+                async with db.session():
+                    await db.query(2)  # token/agent lookup and status update
+                async with db.session():
+                    await db.query(1)  # outbox
+                async with db.session():
+                    await db.query(args.replay_queries)  # desired state snapshot or delta
+            stats.converged.append((time.perf_counter() - started) / args.scale)
+            break
+        except AdmissionRejected as exc:
+            # The hint is already jittered; the Go client waits exactly this long
+            stats.retry_hints += 1
+            await asyncio.sleep(exc.retry_after)
+        except PoolTimeout:
+            stats.pool_timeouts += 1
+            await asyncio.sleep(backoff * random.uniform(0.75, 1.25) * args.scale)
+            backoff = min(backoff * 2, 60.0)
+    # Connected agents keep using the pool: a heartbeat every 30s, each in its own session
+    await asyncio.sleep(random.uniform(0, 30) * args.scale)
+    while not stats.done:
+        try:
+            async with db.session():
+                await db.query(1)
+        except PoolTimeout:
+            stats.heartbeat_timeouts += 1
+        await asyncio.sleep(30 * args.scale)
+
+
+async def storm(agents: int, gated: bool, args) -> Stats:
+    db = SimulatedDB(args.pool_size, args.pool_timeout, args.cores, args.query_ms / 1000, args.scale)
+    gate = AdmissionController(
+        max_active=args.max_active,
+        max_waiting=args.max_waiting,
+        retry_min=2.0 * args.scale,
+        retry_jitter=1.0 * args.scale,
+    ) if gated else None
+    stats = Stats()
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(agent(db, gate, args, started, stats)) for _ in range(agents)]
+    while len(stats.converged) < agents:
+        await asyncio.sleep(0.01)
+    stats.done = True
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--agents", type=int, nargs="+", default=[100, 500, 1000, 2000])
+    parser.add_argument("--pool-size", type=int, default=15, help="pool_size + max_overflow of the engine")
+    parser.add_argument("--pool-timeout", type=float, default=30.0)
+    parser.add_argument("--cores", type=int, default=4, help="queries the database runs without slowing down")
+    parser.add_argument("--query-ms", type=float, default=5.0)
+    parser.add_argument("--replay-queries", type=int, default=6)
+    parser.add_argument("--arrival-spread", type=float, default=1.0, help="seconds over which agents reconnect")
+    parser.add_argument("--max-active", type=int, default=10)
+    parser.add_argument("--max-waiting", type=int, default=200)
+    parser.add_argument("--scale", type=float, default=0.2, help="wall seconds per simulated second")
+    args = parser.parse_args()
+
+    print(f"{'agents':>6} {'gate':>5} {'p50 s':>8} {'p99 s':>8} {'all in s':>9} {'pool timeouts':>14} {'retry hints':>12} {'hb timeouts':>12}")
+    for agents in args.agents:
+        for gated in (False, True):
+            stats = asyncio.run(storm(agents, gated, args))
+            print(
+                f"{agents:>6} {'on' if gated else 'off':>5} {percentile(stats.converged, 0.5):>8.2f} "
+                f"{percentile(stats.converged, 0.99):>8.2f} {max(stats.converged):>9.2f} "
+                f"{stats.pool_timeouts:>14} {stats.retry_hints:>12} {stats.heartbeat_timeouts:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+def controller(**kwargs) -> AdmissionController:
+    options = {"max_active": 1, "max_waiting": 1, "retry_min": 1.0, "retry_jitter": 0.0, **kwargs}
+    return AdmissionController(**options)
+
+
+async def test_admits_up_to_max_active_at_once():
+    admission = controller(max_active=2)
+    async with admission.slot():
+        async with admission.slot():
+            assert admission.active == 2
+    assert admission.active == 0
+    assert admission.admitted == 2
+
+
+async def test_waiters_are_admitted_in_arrival_order():
+    admission = controller(max_waiting=5)
+    order = []
+
+    async def connect(name):
+        async with admission.slot():
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async with admission.slot():
+        tasks = [asyncio.create_task(connect(n)) for n in range(3)]
+        await asyncio.sleep(0)
+        assert admission.waiting == 3
+    await asyncio.gather(*tasks)
+    assert order == [0, 1, 2]
+    assert admission.active == 0
+
+
+async def test_full_queue_rejects_with_a_retry_hint():
+    admission = controller()
+    async with admission.slot():
+        waiter = asyncio.create_task(admission._acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as exc:
+            async with admission.slot():
+                pass
+        assert exc.value.retry_after == 1.0  # no hold time measured yet: retry_min
+        assert admission.rejected == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+    assert admission.waiting == 0
+    assert admission.active == 0
+
+
+def test_retry_hints_are_spread_at_the_drain_rate():
+    admission = controller(max_active=2, retry_min=0.0)
+    admission.avg_hold = 4.0  # a slot frees up every 2s
+    admission.active = 2
+    hints = [admission.retry_after() for _ in range(3)]
+    # The backlog of 2 drains first, then each rejected agent gets the next turn
+    assert hints == pytest.approx([6.0, 8.0, 10.0], abs=0.1)
+
+
+def test_retry_hint_never_goes_below_the_minimum():
+    admission = controller(retry_min=5.0)
+    admission.avg_hold = 0.1
+    assert admission.retry_after() == 5.0
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    admission = controller(max_waiting=2)
+    async with admission.slot():
+        first = asyncio.create_task(admission._acquire())
+        second = asyncio.create_task(admission._acquire())
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert admission.waiting == 1
+    await second
+    assert admission.active == 1
+
+
+async def test_hold_time_is_averaged():
+    admission = controller()
+    async with admission.slot():
+        pass
+    assert admission.avg_hold is not None
+    assert admission.stats()["admitted"] == 1
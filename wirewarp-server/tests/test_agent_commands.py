@@ -0,0 +1,121 @@
+import uuid
+
+from app.services import agent_commands
+from app.services.agent_commands import send_command
+from app.services.pending_commands import pending_commands
+
+AGENT = str(uuid.uuid4())
+
+
+class Session:
+    def __init__(self):
+        self.added = []
+        self.commits = 0
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        self.commits += 1
+
+
+async def test_frame_turned_away_by_a_connected_agent_fails_the_command(monkeypatch):
+    async def send(agent_id, message):
+        return False
+
+    async def enqueue(*args):
+        raise AssertionError("a connected agent's command must not wait for a reconnect")
+
+    monkeypatch.setattr(agent_commands.relay, "send", send)
+    monkeypatch.setattr(agent_commands.relay, "is_connected", lambda agent_id: True)
+    monkeypatch.setattr(agent_commands.outbox, "enqueue", enqueue)
+    db = Session()
+    sent, command_id = await send_command(AGENT, "wg_configure", {}, db)
+    log = db.added[0]
+    assert not sent
+    assert log.success is False
+    assert "queue full" in log.output
+    assert not pending_commands.is_pending(command_id)
+
+
+async def test_offline_agent_command_goes_to_the_outbox(monkeypatch):
+    queued = []
+
+    async def send(agent_id, message):
+        return False
+
+    async def enqueue(agent_id, command_id, command_type, params, db):
+        queued.append(command_id)
+        return True
+
+    monkeypatch.setattr(agent_commands.relay, "send", send)
+    monkeypatch.setattr(agent_commands.relay, "is_connected", lambda agent_id: False)
+    monkeypatch.setattr(agent_commands.outbox, "enqueue", enqueue)
+    db = Session()
+    sent, command_id = await send_command(AGENT, "wg_configure", {}, db)
+    assert not sent
+    assert queued == [command_id]
+    assert db.added[0].success is None
+
+
+async def test_chunked_state_is_answered_once_every_frame_reports(monkeypatch):
+    frames = []
+
+    async def send(agent_id, message):
+        frames.append(message)
+        return True
+
+    monkeypatch.setattr(agent_commands.relay, "send", send)
+    monkeypatch.setattr(agent_commands.settings, "STATE_REPLAY_CHUNK_SIZE", 2)
+    forwards = [{"public_port": port} for port in range(5)]
+    sent, command_id = await agent_commands.send_state(AGENT, forwards, [], Session())
+    assert sent
+    assert [f["params"]["chunk"] for f in frames] == [0, 1, 2]
+    assert {f["id"] for f in frames} == {command_id}
+    for _ in frames[:-1]:
+        assert pending_commands.resolve(command_id, True, "ok")
+        assert pending_commands.is_pending(command_id)
+    assert pending_commands.resolve(command_id, True, "ok")
+    assert not pending_commands.is_pending(command_id)
+
+
+async def test_state_not_sent_to_an_offline_agent_is_failed(monkeypatch):
+    failed = []
+
+    async def send(agent_id, message):
+        return False
+
+    async def enqueue(agent_id, command_id, command_type, params, db):
+        failed.append((command_id, command_type))
+        return False
+
+    monkeypatch.setattr(agent_commands.relay, "send", send)
+    monkeypatch.setattr(agent_commands.relay, "is_connected", lambda agent_id: False)
+    monkeypatch.setattr(agent_commands.outbox, "enqueue", enqueue)
+    sent, command_id = await agent_commands.send_state(AGENT, [], [], Session())
+    assert not sent
+    assert failed == [(command_id, "apply_state")]
+    assert not pending_commands.is_pending(command_id)
+
+
+async def test_state_frames_send_removals_first(monkeypatch):
+    frames = []
+
+    async def send(agent_id, message):
+        frames.append(message["params"])
+        return True
+
+    monkeypatch.setattr(agent_commands.relay, "send", send)
+    monkeypatch.setattr(agent_commands.settings, "STATE_REPLAY_CHUNK_SIZE", 2)
+    db = Session()
+    _, command_id = await agent_commands.send_state(
+        AGENT, [{"public_port": 80}], [{"public_key": "new="}], db,
+        remove_peers=[{"public_key": "old="}], mode="delta", generation=7, state_hash="ab",
+    )
+    pending_commands.discard(command_id)
+    assert [(f["remove_peers"], f["forwards"], f["peers"]) for f in frames] == [
+        ([{"public_key": "old="}], [{"public_port": 80}], []),
+        ([], [], [{"public_key": "new="}]),
+    ]
+    assert all((f["mode"], f["generation"], f["state_hash"], f["chunks"]) == ("delta", 7, "ab", 2) for f in frames)
+    assert db.added[0].params["chunks"] == 2
@@ -0,0 +1,168 @@
+import uuid
+
+import pytest
+
+from app.models.port_forward import PortForward
+from app.models.state_change import StateChange
+from app.models.tunnel_client import TunnelClient
+from app.models.tunnel_server import TunnelServer
+from app.services import agent_commands, agent_state
+from app.services.agent_state import (
+    client_removal_changes, collapse_changes, entry_key, peer_params, state_hash, sync_agent_state,
+    update_state_hash,
+)
+
+FORWARD = {"protocol": "tcp", "public_port": 80, "destination_ip": "10.0.0.2", "destination_port": 8080}
+OTHER_FORWARD = {"protocol": "udp", "public_port": 53, "destination_ip": "10.0.0.3", "destination_port": 53}
+PEER = {"public_key": "abc=", "allowed_ips": ["10.0.0.5/32"]}
+
+
+def test_state_hash_ignores_order():
+    assert state_hash([FORWARD, OTHER_FORWARD], [PEER]) == state_hash([OTHER_FORWARD, FORWARD], [PEER])
+
+
+def test_state_hash_depends_on_peer_allowed_ips():
+    moved = {**PEER, "allowed_ips": ["10.0.0.6/32"]}
+    assert state_hash([], [PEER]) != state_hash([], [moved])
+
+
+def test_update_state_hash_matches_a_full_rehash():
+    current = state_hash([FORWARD], [PEER])
+    updated = update_state_hash(current, [("forward", "add", OTHER_FORWARD), ("forward", "remove", FORWARD)])
+    assert updated == state_hash([OTHER_FORWARD], [PEER])
+
+
+def test_changed_peer_is_a_remove_plus_an_add():
+    moved = {**PEER, "allowed_ips": ["10.0.0.5/32", "192.168.1.0/24"]}
+    updated = update_state_hash(state_hash([], [PEER]), [("peer", "remove", PEER), ("peer", "add", moved)])
+    assert updated == state_hash([], [moved])
+
+
+def test_add_then_remove_restores_the_hash():
+    current = state_hash([FORWARD], [])
+    assert update_state_hash(current, [("peer", "add", PEER), ("peer", "remove", PEER)]) == current
+
+
+def test_reset_changes_leave_the_hash_alone():
+    current = state_hash([FORWARD], [PEER])
+    assert update_state_hash(current, [("reset", "add", None)]) == current
+
+
+def test_entry_key_replaces_peers_by_public_key():
+    assert entry_key("peer", PEER) == entry_key("peer", {"public_key": "abc="})
+    assert entry_key("forward", FORWARD) != entry_key("forward", OTHER_FORWARD)
+
+
+def test_deleting_a_client_journals_its_peer_and_active_forwards():
+    server_id = uuid.uuid4()
+    client = TunnelClient(id=uuid.uuid4(), tunnel_server_id=server_id, wg_public_key="abc=",
+                          tunnel_ip="10.0.0.5", is_gateway=False)
+    kept = PortForward(tunnel_server_id=server_id, active=True, **FORWARD)
+    inactive = PortForward(tunnel_server_id=server_id, active=False, **OTHER_FORWARD)
+    other_peer = {"public_key": "xyz=", "allowed_ips": ["10.0.0.6/32"]}
+    before = state_hash([FORWARD], [peer_params(client), other_peer])
+
+    changes = client_removal_changes(client, [kept, inactive])
+    assert list(changes) == [server_id]
+    assert update_state_hash(before, changes[server_id]) == state_hash([], [other_peer])
+
+    journal = [StateChange(kind=kind, op=op, params=params) for kind, op, params in changes[server_id]]
+    delta = collapse_changes(journal)
+    assert delta["remove_peers"] == [peer_params(client)]
+    assert delta["remove_forwards"] == [FORWARD]
+    assert delta["forwards"] == delta["peers"] == []
+
+
+def test_unconfigured_client_removal_journals_nothing():
+    assert client_removal_changes(TunnelClient(id=uuid.uuid4()), []) == {}
+
+
+def test_collapsed_journal_keeps_the_last_change_to_each_rule():
+    journal = [
+        StateChange(kind="forward", op="add", params=FORWARD),
+        StateChange(kind="forward", op="remove", params=FORWARD),
+        StateChange(kind="peer", op="remove", params={"public_key": "abc="}),
+        StateChange(kind="peer", op="add", params=PEER),
+    ]
+    delta = collapse_changes(journal)
+    assert delta == {"forwards": [], "peers": [PEER], "remove_forwards": [FORWARD], "remove_peers": []}
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalar_one_or_none(self):
+        return self.rows[0] if self.rows else None
+
+    def scalars(self):
+        return iter(self.rows)
+
+
+class Session:
+    """Answers sync_agent_state's two queries: the tunnel server, then its journal."""
+
+    def __init__(self, server: TunnelServer, journal: list[StateChange]):
+        self.results = [Result([server]), Result(journal)]
+
+    async def execute(self, statement):
+        return self.results.pop(0)
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    calls = []
+
+    async def send_state(agent_id, forwards, peers, db, **kwargs):
+        calls.append({"forwards": forwards, "peers": peers, **kwargs})
+        return True, "cmd"
+
+    async def load_desired_state(agent_id, db):
+        return [FORWARD], [PEER]
+
+    monkeypatch.setattr(agent_commands, "send_state", send_state)
+    monkeypatch.setattr(agent_state, "load_desired_state", load_desired_state)
+    return calls
+
+
+def server(generation: int) -> TunnelServer:
+    return TunnelServer(id=uuid.uuid4(), state_generation=generation,
+                        state_hash=state_hash([FORWARD], [PEER]))
+
+
+async def test_agent_at_the_current_generation_gets_nothing(sent):
+    current = server(3)
+    assert await sync_agent_state("a", 3, current.state_hash, Session(current, [])) == "none"
+    assert sent == []
+
+
+async def test_gap_covered_by_the_journal_is_sent_as_a_delta(sent):
+    current = server(3)
+    journal = [
+        StateChange(generation=2, kind="forward", op="add", params=FORWARD),
+        StateChange(generation=3, kind="peer", op="remove", params=PEER),
+    ]
+    assert await sync_agent_state("a", 1, None, Session(current, journal)) == "delta"
+    assert sent == [{
+        "forwards": [FORWARD], "peers": [], "remove_forwards": [], "remove_peers": [PEER],
+        "mode": "delta", "generation": 3, "state_hash": current.state_hash,
+    }]
+
+
+@pytest.mark.parametrize("journal", [
+    [StateChange(generation=3, kind="forward", op="add", params=FORWARD)],  # generation 2 already pruned
+    [StateChange(generation=2, kind="reset", op="add", params=None),
+     StateChange(generation=3, kind="forward", op="add", params=FORWARD)],
+], ids=["pruned", "reset"])
+async def test_gap_the_journal_cannot_cover_gets_a_full_snapshot(sent, journal):
+    current = server(3)
+    assert await sync_agent_state("a", 1, None, Session(current, journal)) == "full"
+    assert sent == [{"forwards": [FORWARD], "peers": [PEER], "generation": 3, "state_hash": current.state_hash}]
+
+
+async def test_agent_with_a_drifted_hash_gets_a_full_snapshot(sent):
+    current = server(3)
+    assert await sync_agent_state("a", 3, "stale", Session(current, [])) == "full"
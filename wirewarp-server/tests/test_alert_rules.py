@@ -0,0 +1,55 @@
+import uuid
+
+from app.models.alert_rule import AlertRule
+from app.routers.alerts import update_rule
+from app.schemas.alert import AlertRuleUpdate
+
+
+class Result:
+    def scalars(self):
+        return []
+
+
+class Session:
+    """Holds one rule and records the UPDATE statements run against it."""
+
+    def __init__(self, rule: AlertRule):
+        self.rule = rule
+        self.updates: list[str] = []
+        self.committed = False
+
+    async def get(self, model, key):
+        return self.rule
+
+    async def execute(self, statement):
+        if statement.is_dml:
+            self.updates.append(str(statement))
+        return Result()
+
+    async def commit(self):
+        self.committed = True
+
+    async def refresh(self, obj):
+        pass
+
+
+def rule(enabled: bool) -> AlertRule:
+    return AlertRule(id=uuid.uuid4(), name="High CPU", kind="cpu_high", threshold=90, enabled=enabled)
+
+
+async def test_disabling_a_rule_resolves_its_firing_alerts():
+    db = Session(rule(enabled=True))
+    await update_rule(str(db.rule.id), AlertRuleUpdate(enabled=False), db)
+    assert len(db.updates) == 1
+    assert db.updates[0].startswith("UPDATE alerts SET state=")
+    assert "WHERE alerts.rule_id = " in db.updates[0]
+    assert "alerts.state = " in db.updates[0]
+    assert db.committed
+
+
+async def test_other_rule_changes_leave_alerts_alone():
+    db = Session(rule(enabled=True))
+    await update_rule(str(db.rule.id), AlertRuleUpdate(threshold=80), db)
+    db_disabled = Session(rule(enabled=False))
+    await update_rule(str(db_disabled.rule.id), AlertRuleUpdate(enabled=False), db_disabled)
+    assert db.updates == db_disabled.updates == []
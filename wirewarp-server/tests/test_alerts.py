@@ -0,0 +1,107 @@
+import uuid
+
+from app.services.alerts import AlertEvaluator, Rule
+
+AGENT = str(uuid.uuid4())
+CPU = Rule(uuid.uuid4(), "High CPU", "cpu_high", threshold=90, duration=300)
+STALE = Rule(uuid.uuid4(), "Stale handshake", "handshake_stale", threshold=300, duration=0)
+STALLED = Rule(uuid.uuid4(), "RX stalled", "rx_stalled", threshold=600, duration=0)
+
+T0 = 1_767_225_600.0  # 2026-01-01T00:00:00Z
+
+
+def cpu(percent: float) -> dict:
+    return {"system": {"cpu_percent": percent}}
+
+
+def peer(key: str = "abc=", rx: int = 0, handshake: str = "2026-01-01T00:00:00Z") -> dict:
+    return {"public_key": key, "rx_bytes": rx, "tx_bytes": 0, "last_handshake": handshake}
+
+
+def ops(events) -> list[tuple[str, str | None]]:
+    return [(e.op, e.subject) for e in events]
+
+
+def test_cpu_fires_only_after_holding_for_the_duration():
+    evaluator = AlertEvaluator([CPU])
+    assert evaluator.evaluate(AGENT, T0, cpu(95)) == []
+    assert evaluator.evaluate(AGENT, T0 + 299, cpu(95)) == []
+    events = evaluator.evaluate(AGENT, T0 + 300, cpu(95))
+    assert ops(events) == [("fire", None)]
+    assert events[0].value == 95.0
+    # Steady state produces nothing
+    assert evaluator.evaluate(AGENT, T0 + 400, cpu(99)) == []
+    assert ops(evaluator.evaluate(AGENT, T0 + 500, cpu(10))) == [("resolve", None)]
+
+
+def test_cpu_dip_restarts_the_duration():
+    evaluator = AlertEvaluator([CPU])
+    evaluator.evaluate(AGENT, T0, cpu(95))
+    evaluator.evaluate(AGENT, T0 + 200, cpu(50))
+    assert evaluator.evaluate(AGENT, T0 + 300, cpu(95)) == []
+    assert ops(evaluator.evaluate(AGENT, T0 + 600, cpu(95))) == [("fire", None)]
+
+
+def test_frames_without_cpu_are_skipped():
+    evaluator = AlertEvaluator([CPU])
+    assert evaluator.evaluate(AGENT, T0, {"system": {}}) == []
+
+
+def test_stale_handshake_fires_and_resolves_per_peer():
+    evaluator = AlertEvaluator([STALE])
+    assert evaluator.evaluate(AGENT, T0 + 100, {"peers": [peer()]}) == []
+    events = evaluator.evaluate(AGENT, T0 + 400, {"peers": [peer()]})
+    assert ops(events) == [("fire", "abc=")]
+    assert events[0].value == 400
+    fresh = peer(handshake="2026-01-01T00:06:30Z")
+    assert ops(evaluator.evaluate(AGENT, T0 + 400, {"peers": [fresh]})) == [("resolve", "abc=")]
+
+
+def test_peer_that_never_handshook_is_stale():
+    evaluator = AlertEvaluator([STALE])
+    events = evaluator.evaluate(AGENT, T0, {"peers": [peer(handshake="0001-01-01T00:00:00Z")]})
+    assert ops(events) == [("fire", "abc=")]
+    assert events[0].message == "Stale handshake: Peer never completed a handshake"
+
+
+def test_rx_stalled_tracks_when_the_counter_last_moved():
+    evaluator = AlertEvaluator([STALLED])
+    evaluator.evaluate(AGENT, T0, {"peers": [peer(rx=100)]})
+    assert evaluator.evaluate(AGENT, T0 + 500, {"peers": [peer(rx=100)]}) == []
+    assert ops(evaluator.evaluate(AGENT, T0 + 600, {"peers": [peer(rx=100)]})) == [("fire", "abc=")]
+    assert ops(evaluator.evaluate(AGENT, T0 + 601, {"peers": [peer(rx=200)]})) == [("resolve", "abc=")]
+
+
+def test_removed_peer_resolves_its_alert():
+    evaluator = AlertEvaluator([STALE])
+    evaluator.evaluate(AGENT, T0 + 400, {"peers": [peer("a="), peer("b=")]})
+    events = evaluator.evaluate(AGENT, T0 + 401, {"peers": [peer("b=")]})
+    assert ops(events) == [("resolve", "a=")]
+    assert events[0].message == "Peer removed"
+
+
+def test_restored_alert_is_resolved_not_re_fired():
+    evaluator = AlertEvaluator([CPU])
+    evaluator.mark_firing(CPU.id, AGENT, None)
+    assert evaluator.evaluate(AGENT, T0 + 1000, cpu(95)) == []
+    assert ops(evaluator.evaluate(AGENT, T0 + 1001, cpu(10))) == [("resolve", None)]
+
+
+def test_set_rules_keeps_state_only_for_remaining_rules():
+    evaluator = AlertEvaluator([CPU, STALE])
+    evaluator.evaluate(AGENT, T0, cpu(95))
+    evaluator.evaluate(AGENT, T0 + 400, {"peers": [peer()]})
+    evaluator.set_rules([CPU])
+    assert ops(evaluator.evaluate(AGENT, T0 + 300, cpu(95))) == [("fire", None)]
+    evaluator.set_rules([CPU, STALE])
+    # The stale-handshake state was dropped, so it fires again
+    assert ops(evaluator.evaluate(AGENT, T0 + 400, {"peers": [peer()]})) == [("fire", "abc=")]
+
+
+def test_agents_are_evaluated_independently():
+    evaluator = AlertEvaluator([CPU])
+    other = str(uuid.uuid4())
+    evaluator.evaluate(AGENT, T0, cpu(95))
+    evaluator.evaluate(other, T0 + 200, cpu(95))
+    assert [e.agent_id for e in evaluator.evaluate(AGENT, T0 + 300, cpu(95))] == [AGENT]
+    assert evaluator.evaluate(other, T0 + 300, cpu(95)) == []
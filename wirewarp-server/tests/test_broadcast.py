@@ -0,0 +1,63 @@
+import asyncio
+
+from app.codec import codec
+from app.websocket.hub import BroadcastResult, ConnectionManager
+
+
+class Socket:
+    def __init__(self, paused: bool = False, fails: bool = False):
+        self.frames: list[dict] = []
+        self.flowing = asyncio.Event()
+        if not paused:
+            self.flowing.set()
+        self.fails = fails
+
+    async def send_text(self, frame: str) -> None:
+        await self.flowing.wait()
+        if self.fails:
+            raise ConnectionError("socket gone")
+        self.frames.append(codec.loads(frame))
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+async def test_broadcast_only_reaches_the_given_type():
+    manager = ConnectionManager()
+    server, client = Socket(), Socket()
+    await manager.connect("s", server, "server")
+    await manager.connect("c", client, "client")
+    result = await manager.broadcast("server", {"type": "ping"}, timeout=1)
+    assert result == BroadcastResult(delivered=["s"], failed=[])
+    assert server.frames == [{"type": "ping"}]
+    assert client.frames == []
+
+
+async def test_stuck_agent_times_out_without_holding_up_the_rest():
+    manager = ConnectionManager()
+    await manager.connect("ok", Socket(), "server")
+    await manager.connect("stuck", Socket(paused=True), "server")
+    result = await asyncio.wait_for(manager.broadcast("server", {"type": "ping"}, timeout=0.05), timeout=1)
+    assert result.delivered == ["ok"]
+    assert result.failed == ["stuck"]
+
+
+async def test_failed_socket_is_reported_and_evicted():
+    manager = ConnectionManager()
+    await manager.connect("bad", Socket(fails=True), "server")
+    result = await manager.broadcast("server", {"type": "ping"}, timeout=1)
+    assert result.failed == ["bad"]
+    assert not manager.is_connected("bad")
+    assert manager.agent_ids_of_type("server") == []
+
+
+async def test_disconnect_during_broadcast_fails_at_once():
+    manager = ConnectionManager()
+    ws = Socket(paused=True)
+    await manager.connect("a", ws, "server")
+    await manager.send("a", {"n": 0})  # occupies the writer
+    broadcast = asyncio.create_task(manager.broadcast("server", {"type": "ping"}, timeout=10))
+    await asyncio.sleep(0)
+    manager.disconnect("a", ws)
+    result = await asyncio.wait_for(broadcast, timeout=1)
+    assert result.failed == ["a"]
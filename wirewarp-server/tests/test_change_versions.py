@@ -0,0 +1,57 @@
+from starlette.requests import Request
+
+from app.models.port_forward import PortForward
+from app.models.tunnel_client import TunnelClient
+from app.models.tunnel_server import TunnelServer
+from app.services.change_versions import ChangeVersions, _cascades, not_modified
+
+
+def request(if_none_match: str | None = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/api/agents", "headers": headers})
+
+
+def test_etag_changes_only_with_its_tables():
+    versions = ChangeVersions()
+    etag = versions.etag("agents", "tunnel_clients")
+    assert etag.startswith('W/"')
+    versions.bump({"command_log"})
+    assert versions.etag("agents", "tunnel_clients") == etag
+    versions.bump({"tunnel_clients"})
+    assert versions.etag("agents", "tunnel_clients") != etag
+
+
+def test_extra_version_is_part_of_the_etag():
+    versions = ChangeVersions()
+    assert versions.etag("agents", extra=1) != versions.etag("agents", extra=2)
+
+
+def test_matching_if_none_match_is_answered_with_304():
+    etag = ChangeVersions().etag("agents")
+    response = not_modified(request(f'W/"other", {etag}'), etag)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert not_modified(request("*"), etag).status_code == 304
+
+
+def test_stale_or_missing_if_none_match_is_served():
+    versions = ChangeVersions()
+    stale = versions.etag("agents")
+    versions.bump({"agents"})
+    assert not_modified(request(stale), versions.etag("agents")) is None
+    assert not_modified(request(), versions.etag("agents")) is None
+
+
+def test_other_workers_hear_only_about_etag_tables():
+    versions = ChangeVersions()
+    relayed = []
+    versions.on_bump = relayed.append
+    versions.bump({"metrics", "agents"})
+    versions.bump({"command_log"})
+    versions.bump({"port_forwards"}, notify=False)
+    assert relayed == [{"agents"}]
+
+
+def test_deleting_an_agent_changes_what_cascades_from_it():
+    tables = {TunnelServer.__tablename__, TunnelClient.__tablename__, PortForward.__tablename__}
+    assert tables <= _cascades("agents")
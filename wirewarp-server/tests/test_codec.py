@@ -0,0 +1,33 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.codec import DecodeError, get_codec
+
+CODECS = [get_codec("json"), get_codec("orjson")]
+FRAME = {
+    "id": uuid.UUID("7d3c0f4e-5a41-4c3e-9a51-0f5e2c9a1b11"),
+    "type": "apply_state",
+    "params": {"forwards": [{"public_port": 443, "protocol": "tcp"}], "remove_peers": [], "note": "é"},
+    "executed_at": datetime(2026, 1, 1, 12, 30, tzinfo=timezone.utc),
+    "success": None,
+}
+EXPECTED = {**FRAME, "id": str(FRAME["id"]), "executed_at": "2026-01-01T12:30:00+00:00"}
+
+
+@pytest.mark.parametrize("codec", CODECS, ids=lambda c: c.name)
+def test_round_trip(codec):
+    assert codec.loads(codec.dumps(FRAME)) == EXPECTED
+    assert codec.loads(codec.dumpb(FRAME)) == EXPECTED
+
+
+def test_codecs_agree_on_the_wire():
+    stdlib, fast = CODECS
+    assert stdlib.dumps(FRAME) == fast.dumps(FRAME)
+
+
+@pytest.mark.parametrize("codec", CODECS, ids=lambda c: c.name)
+def test_malformed_input_raises_decode_error(codec):
+    with pytest.raises(DecodeError):
+        codec.loads(b'{"id": ')
@@ -0,0 +1,78 @@
+import sqlite3
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.models.command_log import CommandLog
+from app.services import command_log
+from app.services.command_log import PREVIEW_CHARS, _EXPIRED_SQL, compress_output, decompress_output, store_output
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+CUTOFF = NOW - timedelta(days=30)
+
+
+def prune(rows: list[tuple], keep: int, batch: int = 1000) -> set[str]:
+    """Run the retention DELETE over rows of (id, agent_id, command_type, days_ago, success); the ids left."""
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE command_log (id TEXT, agent_id TEXT, command_type TEXT, executed_at TEXT, success BOOLEAN)")
+    db.executemany(
+        "INSERT INTO command_log VALUES (?, ?, ?, ?, ?)",
+        [(id_, agent, type_, (NOW - timedelta(days=days)).isoformat(), ok) for id_, agent, type_, days, ok in rows],
+    )
+    db.execute(_EXPIRED_SQL.text, {"cutoff": CUTOFF.isoformat(), "keep": keep, "batch": batch})
+    return {row[0] for row in db.execute("SELECT id FROM command_log")}
+
+
+def test_old_results_beyond_the_latest_n_per_type_are_deleted():
+    rows = [(f"init-{days}", "a", "wg_init", days, True) for days in (40, 50, 60, 70)]
+    assert prune(rows, keep=2) == {"init-40", "init-50"}
+
+
+def test_latest_n_are_counted_per_agent_and_type():
+    rows = [
+        ("a-init", "a", "wg_init", 60, True),
+        ("a-peer", "a", "wg_add_peer", 60, True),
+        ("b-init", "b", "wg_init", 60, True),
+        ("a-init-new", "a", "wg_init", 1, True),
+    ]
+    assert prune(rows, keep=1) == {"a-init-new", "a-peer", "b-init"}
+
+
+def test_recent_pending_and_orphaned_rows():
+    rows = [
+        ("recent", "a", "wg_init", 1, True),
+        ("pending", "a", "wg_init", 90, None),
+        ("orphan", None, "wg_init", 90, False),
+    ]
+    assert prune(rows, keep=5) == {"recent", "pending"}
+
+
+def test_delete_is_batched():
+    rows = [(f"init-{days}", "a", "wg_init", days, True) for days in range(40, 50)]
+    assert len(prune(rows, keep=0, batch=3)) == 7
+
+
+class Session:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+
+
+async def test_large_output_moves_out_of_line(monkeypatch):
+    monkeypatch.setattr(command_log.settings, "COMMAND_OUTPUT_INLINE_MAX", 16)
+    log, db = CommandLog(id=uuid.uuid4(), output_external=False), Session()
+    output = "x" * (PREVIEW_CHARS + 100)
+    await store_output(log, output, db)
+    assert log.output_external
+    assert log.output == output[:PREVIEW_CHARS]
+    assert decompress_output(db.statements[0].compile().params["data"]) == output
+
+    await store_output(log, "short", db)
+    assert (log.output, log.output_external) == ("short", False)
+    assert len(db.statements) == 2  # the out-of-line copy is deleted
+
+
+def test_compression_round_trip():
+    output = "peer added\n" * 1000
+    assert decompress_output(compress_output(output)) == output
@@ -0,0 +1,71 @@
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.models.command_log import CommandLog
+from app.pagination import PageParams, decode_cursor, keyset, split_page
+from app.routers.commands import CommandFilters
+
+EXECUTED = datetime(2026, 1, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def compiled(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_no_filters_leave_the_query_alone():
+    assert "WHERE" not in compiled(CommandFilters().apply(select(CommandLog)))
+
+
+def test_filters_combine():
+    filters = CommandFilters(
+        agent_id=uuid.uuid4(),
+        command_type="wg_add_peer",
+        success=False,
+        since=EXECUTED,
+        until=EXECUTED,
+    )
+    sql = compiled(filters.apply(select(CommandLog)))
+    for clause in (
+        "command_log.agent_id = ",
+        "command_log.command_type = ",
+        "command_log.success = ",
+        "command_log.executed_at >= ",
+        "command_log.executed_at < ",
+    ):
+        assert clause in sql
+
+
+def test_pending_filter_matches_on_missing_result():
+    assert "command_log.success IS NULL" in compiled(CommandFilters(pending=True).apply(select(CommandLog)))
+    assert "command_log.success IS NOT NULL" in compiled(CommandFilters(pending=False).apply(select(CommandLog)))
+
+
+def test_command_pages_seek_on_executed_at():
+    page = PageParams(limit=1, after=(EXECUTED, uuid.uuid4()))
+    sql = compiled(keyset(select(CommandLog), CommandLog, page, sort="executed_at"))
+    assert "(command_log.executed_at, command_log.id) < (" in sql
+    assert "ORDER BY command_log.executed_at DESC, command_log.id DESC" in sql
+
+
+def test_command_page_cursor_carries_executed_at():
+    fetched = [SimpleNamespace(id=uuid.uuid4(), executed_at=EXECUTED) for _ in range(2)]
+    _, cursor = split_page(fetched, PageParams(limit=1), sort="executed_at")
+    assert decode_cursor(cursor) == (EXECUTED, fetched[0].id)
+
+
+async def test_export_serializes_through_the_codec(monkeypatch):
+    from app.routers import commands
+
+    async def rows(filters):
+        yield {"id": "1", "agent_id": None, "command_type": "wg_init", "params": {"wg_port": 51820},
+               "success": True, "output": "ok", "executed_at": EXECUTED.isoformat()}
+
+    monkeypatch.setattr(commands, "_export_rows", rows)
+    lines = [line async for line in commands._ndjson(CommandFilters())]
+    assert commands.codec.loads(lines[0])["params"] == {"wg_port": 51820}
+    csv_body = "".join([chunk async for chunk in commands._csv(CommandFilters())])
+    assert commands.codec.dumps({"wg_port": 51820}).replace('"', '""') in csv_body
@@ -0,0 +1,101 @@
+import asyncio
+
+from app.codec import codec
+from app.websocket.dashboard import DashboardHub
+
+
+class Socket:
+    """Records frames; send_text blocks until released when the socket is paused."""
+
+    def __init__(self, paused: bool = False):
+        self.frames: list[dict] = []
+        self.flowing = asyncio.Event()
+        if not paused:
+            self.flowing.set()
+        self.closed_with: int | None = None
+
+    async def send_text(self, frame: str) -> None:
+        await self.flowing.wait()
+        self.frames.append(codec.loads(frame))
+
+    async def close(self, code: int) -> None:
+        self.closed_with = code
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_one_batch_reaches_every_tab():
+    hub = DashboardHub(coalesce_seconds=0, queue_size=8)
+    sockets = [Socket(), Socket()]
+    clients = [hub.connect(s) for s in sockets]
+    hub.publish("agent", "a", {"id": "a", "status": "connected"})
+    hub.publish("port_forward", "f", {"id": "f", "op": "created"})
+    await asyncio.sleep(0.01)
+    await settle()
+    for socket in sockets:
+        assert socket.frames == [{"type": "batch", "events": [
+            {"type": "agent", "id": "a", "status": "connected"},
+            {"type": "port_forward", "id": "f", "op": "created"},
+        ]}]
+    for client in clients:
+        hub.disconnect(client)
+
+
+async def test_events_for_the_same_key_are_merged():
+    hub = DashboardHub(coalesce_seconds=0, queue_size=8)
+    socket = Socket()
+    client = hub.connect(socket)
+    hub.publish("agent", "a", {"id": "a", "status": "connected", "version": "1.0"})
+    hub.publish("agent", "a", {"status": "disconnected"})
+    await asyncio.sleep(0.01)
+    await settle()
+    assert socket.frames[0]["events"] == [{"type": "agent", "id": "a", "status": "disconnected", "version": "1.0"}]
+    hub.disconnect(client)
+
+
+async def test_events_without_tabs_are_not_kept():
+    hub = DashboardHub(coalesce_seconds=0, queue_size=8)
+    hub.publish("agent", "a", {"id": "a"})
+    socket = Socket()
+    client = hub.connect(socket)
+    hub.publish("agent", "b", {"id": "b"})
+    await asyncio.sleep(0.01)
+    await settle()
+    assert socket.frames == [{"type": "batch", "events": [{"type": "agent", "id": "b"}]}]
+    hub.disconnect(client)
+
+
+async def test_slow_tab_is_dropped_without_holding_up_the_others():
+    hub = DashboardHub(coalesce_seconds=0, queue_size=1)
+    slow, fast = Socket(paused=True), Socket()
+    hub.connect(slow)
+    fast_client = hub.connect(fast)
+    for n in range(3):
+        hub.deliver([{"type": "agent", "id": str(n)}])
+        await settle()
+    assert len(hub) == 1
+    assert slow.closed_with == 1013
+    assert [f["events"][0]["id"] for f in fast.frames] == ["0", "1", "2"]
+    hub.disconnect(fast_client)
+
+
+async def test_first_and_last_tab_are_reported():
+    hub = DashboardHub(coalesce_seconds=0, queue_size=8)
+    seen = []
+    hub.on_clients = seen.append
+    first, second = hub.connect(Socket()), hub.connect(Socket())
+    hub.disconnect(first)
+    hub.disconnect(second)
+    assert seen == [True, False]
+
+
+async def test_flush_is_shared_with_other_workers():
+    hub = DashboardHub(coalesce_seconds=0, queue_size=8)
+    relayed = []
+    hub.on_flush = relayed.append
+    hub.publish("command_result", "c", {"command_id": "c", "success": True})
+    await asyncio.sleep(0.01)
+    assert relayed == [[{"type": "command_result", "command_id": "c", "success": True}]]
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from app.codec import codec
+from app.websocket.hub import ConnectionManager
+
+
+class Socket:
+    """Records frames; send_text blocks while the socket is paused, like a slow consumer."""
+
+    def __init__(self, paused: bool = False):
+        self.frames: list[dict] = []
+        self.flowing = asyncio.Event()
+        if not paused:
+            self.flowing.set()
+        self.closed = False
+
+    async def send_text(self, frame: str) -> None:
+        await self.flowing.wait()
+        self.frames.append(codec.loads(frame))
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed = True
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+async def manager():
+    manager = ConnectionManager(queue_size=2, overflow_policy="drop", block_timeout=0.05)
+    yield manager
+    for agent_id in manager.connected_agent_ids:
+        manager.disconnect(agent_id)
+    await settle()
+
+
+async def test_frames_are_written_in_order(manager):
+    ws = Socket()
+    await manager.connect("a", ws, "server")
+    for n in range(2):
+        assert await manager.send("a", {"n": n})
+    await settle()
+    assert ws.frames == [{"n": 0}, {"n": 1}]
+    assert manager.stats()[0]["sent"] == 2
+
+
+async def test_send_to_unknown_agent_fails(manager):
+    assert not await manager.send("nobody", {})
+
+
+async def test_full_queue_drops_the_frame(manager):
+    ws = Socket(paused=True)
+    await manager.connect("a", ws)
+    await manager.send("a", {"n": 0})
+    await settle()  # the writer now holds frame 0 and waits on the socket
+    assert await manager.send("a", {"n": 1})
+    assert await manager.send("a", {"n": 2})
+    assert not await manager.send("a", {"n": 3})
+    assert manager.stats()[0]["dropped"] == 1
+    ws.flowing.set()
+    await settle()
+    assert ws.frames == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+async def test_disconnect_policy_closes_a_slow_agent():
+    manager = ConnectionManager(queue_size=1, overflow_policy="disconnect")
+    ws = Socket(paused=True)
+    await manager.connect("a", ws)
+    await manager.send("a", {"n": 0})
+    await settle()
+    await manager.send("a", {"n": 1})
+    assert not await manager.send("a", {"n": 2})
+    await settle()
+    assert not manager.is_connected("a")
+    assert ws.closed
+
+
+async def test_block_policy_waits_for_room_then_gives_up():
+    manager = ConnectionManager(queue_size=1, overflow_policy="block", block_timeout=0.05)
+    ws = Socket(paused=True)
+    await manager.connect("a", ws)
+    await manager.send("a", {"n": 0})
+    await settle()
+    await manager.send("a", {"n": 1})
+    assert not await manager.send("a", {"n": 2})  # nothing drains within block_timeout
+
+    blocked = asyncio.create_task(manager.send("a", {"n": 3}))
+    await settle()
+    assert not blocked.done()
+    ws.flowing.set()
+    assert await blocked
+    await settle()
+    assert [f["n"] for f in ws.frames] == [0, 1, 3]
+    manager.disconnect("a")
+
+
+async def test_slow_agent_does_not_hold_up_others(manager):
+    slow, fast = Socket(paused=True), Socket()
+    await manager.connect("slow", slow)
+    await manager.connect("fast", fast)
+    for n in range(3):
+        await manager.send("slow", {"n": n})
+        assert await manager.send("fast", {"n": n})
+        await settle()
+    assert len(fast.frames) == 3
+    assert slow.frames == []
+
+
+async def test_held_connection_sends_priority_frames_first(manager):
+    ws = Socket()
+    await manager.connect("a", ws, held=True)
+    # Does not wait for release
+    assert await asyncio.wait_for(manager.send("a", {"cmd": "new"}), timeout=1)
+    assert await manager.send("a", {"cmd": "queued"}, priority=True)
+    await settle()
+    assert ws.frames == [{"cmd": "queued"}]
+    manager.release("a", ws)
+    await settle()
+    assert ws.frames == [{"cmd": "queued"}, {"cmd": "new"}]
+
+
+async def test_held_frames_count_against_the_queue(manager):
+    await manager.connect("a", Socket(), held=True)
+    assert await manager.send("a", {"n": 0})
+    assert await manager.send("a", {"n": 1})
+    assert not await manager.send("a", {"n": 2})
+
+
+async def test_release_by_a_stale_socket_is_ignored(manager):
+    old, new = Socket(), Socket()
+    await manager.connect("a", new, held=True)
+    await manager.send("a", {"n": 0})
+    manager.release("a", old)
+    await settle()
+    assert new.frames == []
+
+
+async def test_disconnect_fails_frames_still_waiting(manager):
+    ws = Socket(paused=True)
+    await manager.connect("a", ws, held=True)
+    conn = manager._connections["a"]
+    ack = asyncio.get_running_loop().create_future()
+    assert await manager._enqueue(conn, codec.dumps({"n": 0}), ack)
+    manager.disconnect("a", ws)
+    assert ack.done() and ack.result() is False
+    assert not await manager.send("a", {"n": 1})
+
+
+async def test_stale_handler_cannot_evict_a_reconnect(manager):
+    old, new = Socket(), Socket()
+    await manager.connect("a", old)
+    await manager.connect("a", new)
+    await settle()
+    assert old.closed
+    manager.disconnect("a", old)
+    assert manager.is_connected("a")
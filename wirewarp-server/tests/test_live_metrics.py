@@ -0,0 +1,76 @@
+import math
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.services.live_metrics import LiveMetrics, RingBuffer
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_ring_buffer_returns_samples_oldest_first():
+    ring = RingBuffer(4, ("v",))
+    for i in range(3):
+        ring.append(float(i), v=i * 10.0)
+    assert ring.series() == {"timestamps": [0.0, 1.0, 2.0], "v": [0.0, 10.0, 20.0]}
+    assert ring.last_timestamp == 2.0
+
+
+def test_ring_buffer_overwrites_the_oldest_sample_when_full():
+    ring = RingBuffer(3, ("v",))
+    for i in range(5):
+        ring.append(float(i), v=float(i))
+    assert ring.series()["timestamps"] == [2.0, 3.0, 4.0]
+    assert ring.count == 3
+
+
+def test_ring_buffer_missing_values_become_none():
+    ring = RingBuffer(2, ("a", "b"))
+    ring.append(1.0, a=1.5)
+    assert math.isnan(ring.columns["b"][0])
+    assert ring.series() == {"timestamps": [1.0], "a": [1.5], "b": [None]}
+
+
+def test_ring_buffer_series_since_skips_older_samples():
+    ring = RingBuffer(5, ("v",))
+    for i in range(5):
+        ring.append(float(i), v=float(i))
+    assert ring.series(since=3.0) == {"timestamps": [3.0, 4.0], "v": [3.0, 4.0]}
+
+
+def sample(rx: int, tx: int) -> dict:
+    return {"system": {"cpu_percent": 5}, "peers": [{"public_key": "abc=", "rx_bytes": rx, "tx_bytes": tx}]}
+
+
+def test_peer_rates_come_from_consecutive_counters():
+    live = LiveMetrics(window_seconds=60, sample_seconds=5)
+    agent_id = str(uuid.uuid4())
+    live.record(agent_id, T0, sample(1000, 500))
+    live.record(agent_id, T0 + timedelta(seconds=10), sample(3000, 1500))
+
+    snapshot = live.snapshot(agent_id)
+    assert snapshot["capacity"] == 12
+    assert snapshot["peers"]["abc="]["rx_rate"] == [200.0]
+    assert snapshot["peers"]["abc="]["tx_rate"] == [100.0]
+    # The first sample has no previous counters, so no agent-wide rate either
+    assert snapshot["rx_rate"] == [None, 200.0]
+    assert snapshot["cpu_percent"] == [5.0, 5.0]
+
+
+def test_counter_reset_counts_from_zero():
+    live = LiveMetrics(window_seconds=60, sample_seconds=5)
+    agent_id = str(uuid.uuid4())
+    live.record(agent_id, T0, sample(5000, 5000))
+    live.record(agent_id, T0 + timedelta(seconds=10), sample(1000, 0))
+    assert live.snapshot(agent_id)["peers"]["abc="]["rx_rate"] == [100.0]
+
+
+def test_peers_not_heard_from_for_a_window_are_evicted():
+    live = LiveMetrics(window_seconds=60, sample_seconds=5)
+    agent_id = str(uuid.uuid4())
+    live.record(agent_id, T0, sample(0, 0))
+    live.record(agent_id, T0 + timedelta(seconds=61), {"peers": []})
+    assert live.snapshot(agent_id)["peers"] == {}
+
+
+def test_unknown_agent_has_no_snapshot():
+    assert LiveMetrics().snapshot(str(uuid.uuid4())) is None
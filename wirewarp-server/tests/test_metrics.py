@@ -0,0 +1,65 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services import metrics
+from app.services.metrics import MetricsIngest
+
+AGENT = str(uuid.uuid4())
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_full_queue_drops_and_counts():
+    ingest = MetricsIngest(queue_size=1)
+    assert ingest.submit(AGENT, T0, {})
+    assert not ingest.submit(AGENT, T0, {})
+    assert ingest.dropped == 1
+
+
+def test_naive_timestamps_are_taken_as_utc():
+    ingest = MetricsIngest()
+    ingest.submit(AGENT, datetime(2026, 1, 1), {})
+    assert ingest.queue.get_nowait()[1] == T0
+
+
+async def test_insert_fallback_counts_only_rows_written(monkeypatch):
+    async def copy_fails(batch, rollups, peers):
+        raise RuntimeError("agent deleted")
+
+    async def insert_one(batch, rollups, peers):
+        return 1
+
+    monkeypatch.setattr(metrics, "_copy_rows", copy_fails)
+    monkeypatch.setattr(metrics, "_insert_rows", insert_one)
+    ingest = MetricsIngest()
+    await ingest.write([(uuid.UUID(AGENT), T0, {}), (uuid.uuid4(), T0, {})])
+    assert (ingest.written, ingest.failed, ingest.batches) == (1, 1, 1)
+
+
+async def test_writer_survives_a_failing_batch(monkeypatch):
+    written = []
+
+    async def copy_rows(batch, rollups, peers):
+        written.extend(batch)
+
+    def aggregate(batch, peer_samples):
+        if any(data.get("bad") for _, _, data in batch):
+            raise ValueError("bad sample")
+        return []
+
+    monkeypatch.setattr(metrics, "_copy_rows", copy_rows)
+    monkeypatch.setattr(metrics, "aggregate", aggregate)
+    ingest = MetricsIngest(batch_size=1, flush_interval=0)
+    task = asyncio.create_task(ingest.run())
+    ingest.submit(AGENT, T0, {"bad": True})
+    ingest.submit(AGENT, T0, {"cpu": 1})
+    for _ in range(20):
+        await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert ingest.failed == 1
+    assert ingest.written == 1
+    assert [data for _, _, data in written] == [{"cpu": 1}]
@@ -0,0 +1,87 @@
+import uuid
+
+from app.models.agent_outbox import AgentOutbox
+from app.services.outbox import coalesce_key, enqueue
+
+AGENT = str(uuid.uuid4())
+FORWARD = {"protocol": "tcp", "public_port": 443, "destination_ip": "10.0.0.2", "destination_port": 8443}
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return iter(self.rows)
+
+
+class Session:
+    """An outbox of pending entries; records what enqueue adds, deletes and marks superseded."""
+
+    def __init__(self, pending: list[AgentOutbox] = ()):
+        self.pending = list(pending)
+        self.added: list[AgentOutbox] = []
+        self.deleted: list[AgentOutbox] = []
+        self.superseded: list = []
+
+    async def execute(self, statement):
+        if statement.is_select:
+            return Result(self.pending)
+        # _mark_superseded: UPDATE command_log ... WHERE id IN (...)
+        self.superseded += statement.compile().params["id_1"]
+        return Result([])
+
+    async def delete(self, obj):
+        self.deleted.append(obj)
+
+    def add(self, obj):
+        self.added.append(obj)
+
+
+def entry(command_type: str, params: dict) -> AgentOutbox:
+    return AgentOutbox(
+        agent_id=AGENT,
+        command_id=uuid.uuid4(),
+        command_type=command_type,
+        params=params,
+        coalesce_key=coalesce_key(command_type, params),
+    )
+
+
+def test_gateway_up_and_down_share_a_key():
+    assert coalesce_key("gateway_up", {}) == coalesce_key("gateway_down", {})
+    assert coalesce_key("wg_configure", {}) != coalesce_key("gateway_up", {})
+
+
+async def test_command_is_queued():
+    db = Session()
+    command_id = uuid.uuid4()
+    assert await enqueue(AGENT, command_id, "wg_configure", {"tunnel_ip": "10.0.0.5"}, db)
+    assert [(e.command_id, e.coalesce_key) for e in db.added] == [(command_id, "wg_configure")]
+    assert db.superseded == []
+
+
+async def test_latest_command_replaces_pending_ones_with_the_same_key():
+    older = [entry("gateway_up", {}), entry("gateway_down", {})]
+    db = Session(older)
+    assert await enqueue(AGENT, uuid.uuid4(), "gateway_up", {}, db)
+    assert db.deleted == older
+    assert db.superseded == [e.command_id for e in older]
+    assert len(db.added) == 1
+
+
+async def test_forward_and_peer_commands_are_left_to_the_state_resync():
+    for command_type, params in (("iptables_add_forward", FORWARD), ("wg_remove_peer", {"public_key": "abc="})):
+        db = Session()
+        command_id = uuid.uuid4()
+        assert not await enqueue(AGENT, command_id, command_type, params, db)
+        assert db.added == []
+        assert db.superseded == [command_id]
+
+
+async def test_state_commands_are_not_queued():
+    db = Session()
+    command_id = uuid.uuid4()
+    assert not await enqueue(AGENT, command_id, "report_state", {}, db)
+    assert db.added == []
+    assert db.superseded == [command_id]
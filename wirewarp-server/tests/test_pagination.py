@@ -0,0 +1,60 @@
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.models.agent import Agent
+from app.pagination import PageParams, decode_cursor, encode_cursor, keyset, split_page
+
+CREATED = datetime(2026, 1, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def compiled(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def rows(n: int) -> list[SimpleNamespace]:
+    return [SimpleNamespace(id=uuid.uuid4(), created_at=CREATED) for _ in range(n)]
+
+
+def test_cursor_round_trips():
+    id = uuid.uuid4()
+    cursor = encode_cursor(CREATED, id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (CREATED, id)
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(CREATED, uuid.uuid4())[:-4], "bm9waXBl"])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_last_page_has_no_cursor():
+    fetched = rows(3)
+    assert split_page(fetched, PageParams(limit=3)) == (fetched, None)
+
+
+def test_full_page_points_at_its_last_row():
+    page = PageParams(limit=2)
+    fetched = rows(3)  # keyset asks for one extra row
+    page_rows, cursor = split_page(fetched, page)
+    assert page_rows == fetched[:2]
+    assert decode_cursor(cursor) == (CREATED, fetched[1].id)
+
+
+def test_keyset_orders_newest_first_and_fetches_one_extra_row():
+    query = keyset(select(Agent), Agent, PageParams(limit=10))
+    assert "ORDER BY agents.created_at DESC, agents.id DESC" in compiled(query)
+    assert "WHERE" not in compiled(query)
+    assert query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}).string.endswith("LIMIT 11")
+
+
+def test_keyset_seeks_past_the_cursor():
+    sql = compiled(keyset(select(Agent), Agent, PageParams(limit=10, after=(CREATED, uuid.uuid4()))))
+    assert "(agents.created_at, agents.id) < (" in sql
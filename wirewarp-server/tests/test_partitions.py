@@ -0,0 +1,20 @@
+from datetime import date
+
+from app.services.partitions import _partition_day, partition_bounds, partition_name
+
+
+def test_partition_bounds_are_utc_days():
+    assert partition_bounds(date(2026, 2, 28)) == (
+        "FOR VALUES FROM ('2026-02-28 00:00:00+00') TO ('2026-03-01 00:00:00+00')"
+    )
+
+
+def test_partition_names_round_trip():
+    name = partition_name("metrics", date(2026, 1, 9))
+    assert name == "metrics_p20260109"
+    assert _partition_day("metrics", name) == date(2026, 1, 9)
+
+
+def test_other_partitions_have_no_day():
+    assert _partition_day("metrics", "metrics_default") is None
+    assert _partition_day("metrics", "peer_traffic_p20260109") is None
@@ -0,0 +1,76 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.models.peer_traffic import PeerTraffic
+from app.services.peer_traffic import MAX_BIND_PARAMS, TrafficCounters, insert_peer_traffic
+
+AGENT = uuid.uuid4()
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_deltas_follow_each_peer_from_its_first_sample():
+    counters = TrafficCounters()
+    first = counters.split(AGENT, T0, [{"public_key": "a=", "rx_bytes": 100, "tx_bytes": 10}])
+    second = counters.split(AGENT, T0 + timedelta(seconds=10), [
+        {"public_key": "a=", "rx_bytes": 250, "tx_bytes": 5},  # tx counter reset
+        {"public_key": "b=", "rx_bytes": 7, "tx_bytes": 7},
+    ])
+    assert [(s["rx_delta"], s["tx_delta"]) for s in first] == [(0, 0)]
+    assert [(s["public_key"], s["rx_delta"], s["tx_delta"]) for s in second] == [("a=", 150, 5), ("b=", 0, 0)]
+    assert len(counters) == 2
+
+
+def test_same_key_on_two_agents_is_tracked_separately():
+    counters = TrafficCounters()
+    other = uuid.uuid4()
+    counters.split(AGENT, T0, [{"public_key": "a=", "rx_bytes": 100, "tx_bytes": 0}])
+    [sample] = counters.split(other, T0, [{"public_key": "a=", "rx_bytes": 500, "tx_bytes": 0}])
+    assert sample["rx_delta"] == 0
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class Session:
+    """Knows one tunnel client; records the INSERTs insert_peer_traffic issues."""
+
+    def __init__(self, clients: dict[str, uuid.UUID]):
+        self.clients = clients
+        self.inserts: list[int] = []
+
+    async def execute(self, statement):
+        if statement.is_select:
+            return Result(list(self.clients.items()))
+        self.inserts.append(len(statement.compile().params) // len(PeerTraffic.__table__.columns))
+
+
+def samples(count: int, key: str = "a=") -> list[dict]:
+    return [
+        {"public_key": key, "timestamp": T0 + timedelta(seconds=n), "rx_bytes": n, "tx_bytes": n,
+         "rx_delta": 1, "tx_delta": 1, "last_handshake": None}
+        for n in range(count)
+    ]
+
+
+async def test_unknown_peers_are_skipped():
+    db = Session({"a=": uuid.uuid4()})
+    assert await insert_peer_traffic(samples(2) + samples(3, key="stranger="), db) == 2
+    assert db.inserts == [2]
+
+
+async def test_large_batch_is_chunked_under_the_bind_parameter_limit():
+    per_statement = MAX_BIND_PARAMS // len(PeerTraffic.__table__.columns)
+    db = Session({"a=": uuid.uuid4()})
+    assert await insert_peer_traffic(samples(per_statement + 10), db) == per_statement + 10
+    assert db.inserts == [per_statement, 10]
+
+
+async def test_no_samples_no_queries():
+    db = Session({})
+    assert await insert_peer_traffic([], db) == 0
+    assert db.inserts == []
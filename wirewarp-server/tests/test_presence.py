@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import presence as presence_module
+from app.services.presence import PresenceTable, shown_last_seen
+
+AGENT = "6f1c7c55-2a57-4c51-9d3c-7b4a0f1e2d3c"
+T0 = datetime(2026, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self):
+        self.now_value = T0
+
+    def now(self, tz=None):
+        return self.now_value
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(presence_module, "datetime", clock)
+    monkeypatch.setattr(presence_module.settings, "PRESENCE_LAST_SEEN_RESOLUTION_SECONDS", 60)
+    return clock
+
+
+def test_shown_last_seen_is_floored(clock):
+    assert shown_last_seen(T0 + timedelta(seconds=59, microseconds=5)) == T0
+    assert shown_last_seen(T0 + timedelta(seconds=61)) == T0 + timedelta(seconds=60)
+
+
+def test_frames_within_the_resolution_keep_the_version(clock):
+    table = PresenceTable()
+    table.seed(AGENT, "1.0", "203.0.113.1")
+    version = table.version
+    for seconds in (5, 30, 59):
+        clock.now_value = T0 + timedelta(seconds=seconds)
+        assert not table.touch(AGENT)
+    assert table.version == version
+    clock.now_value = T0 + timedelta(seconds=60)
+    table.touch(AGENT)
+    assert table.version == version + 1
+
+
+def test_new_version_or_ip_bumps(clock):
+    table = PresenceTable()
+    table.seed(AGENT, "1.0", "203.0.113.1")
+    version = table.version
+    assert table.touch(AGENT, version="1.1")
+    assert table.touch(AGENT, public_ip="203.0.113.2")
+    assert table.version == version + 2
+
+
+def test_drain_does_not_bump(clock):
+    table = PresenceTable()
+    table.seed(AGENT, "1.0", None)
+    table.touch(AGENT)
+    version = table.version
+    assert table.drain_dirty() == [(AGENT, T0)]
+    assert table.drain_dirty() == []
+    assert table.version == version
+
+
+def test_flush_only_stales_other_workers_when_shown_last_seen_moves(clock):
+    table = PresenceTable()
+    table.seed(AGENT, "1.0", None)
+    assert table.shown_moved([(AGENT, T0 + timedelta(seconds=5))])
+    assert not table.shown_moved([(AGENT, T0 + timedelta(seconds=50))])
+    assert table.shown_moved([(AGENT, T0 + timedelta(seconds=65))])
+
+
+def test_unknown_agent_is_written_through(clock):
+    table = PresenceTable()
+    assert table.touch(AGENT, version="1.0")
+    assert table.get(AGENT).dirty
+    version = table.version
+    assert table.forget(AGENT) is not None
+    assert table.version == version + 1 and len(table) == 0
+
+
+class Session:
+    executed: list = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params):
+        self.executed.append(params)
+
+    async def commit(self):
+        pass
+
+
+async def test_flush_writes_every_dirty_agent_in_one_statement(clock, monkeypatch):
+    other = "0b7c2f6e-9a1d-4e8b-8f3a-5c6d7e8f9a0b"
+    table = PresenceTable()
+    for agent_id in (AGENT, other):
+        table.seed(agent_id, "1.0", None)
+        table.touch(agent_id)
+    bumped = []
+    monkeypatch.setattr(presence_module, "presence", table)
+    monkeypatch.setattr(presence_module, "SessionLocal", Session)
+    monkeypatch.setattr(Session, "executed", [])
+    monkeypatch.setattr(presence_module.changes, "bump", bumped.append)
+
+    assert await presence_module.flush_presence() == 2
+    [params] = Session.executed
+    assert [str(i) for i in params["ids"]] == [AGENT, other]
+    assert params["last_seen"] == [T0, T0]
+    assert bumped == [{"agents"}]
+
+    assert await presence_module.flush_presence() == 0
+    assert len(Session.executed) == 1
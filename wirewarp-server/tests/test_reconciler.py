@@ -0,0 +1,47 @@
+import ipaddress
+
+from app.services.reconciler import diff_state
+
+FORWARD = {"protocol": "tcp", "public_port": 80, "destination_ip": "10.0.0.2", "destination_port": 8080}
+PEER = {"public_key": "abc=", "allowed_ips": ["10.0.0.5/32"]}
+
+
+def test_matching_state_is_empty():
+    assert diff_state([FORWARD], [PEER], [FORWARD], [PEER]).empty
+
+
+def test_reported_ports_as_strings_still_match():
+    reported = {**FORWARD, "public_port": "80", "destination_port": "8080"}
+    assert diff_state([FORWARD], [], [reported], []).empty
+
+
+def test_missing_rules_are_added():
+    diff = diff_state([FORWARD], [PEER], [], [])
+    assert diff.add_forwards == [FORWARD]
+    assert diff.add_peers == [PEER]
+    assert not diff.remove_forwards and not diff.remove_peers
+
+
+def test_unknown_rules_are_removed():
+    diff = diff_state([], [], [FORWARD], [PEER])
+    assert diff.remove_forwards == [FORWARD]
+    assert diff.remove_peers == [{"public_key": "abc="}]
+
+
+def test_forwards_outside_managed_networks_are_left_alone():
+    foreign = {**FORWARD, "destination_ip": "172.16.0.9"}
+    diff = diff_state([], [], [FORWARD, foreign], [], managed_networks=[ipaddress.ip_network("10.0.0.0/24")])
+    assert diff.remove_forwards == [FORWARD]
+
+
+def test_peer_with_drifted_allowed_ips_is_re_added_not_removed():
+    drifted = {**PEER, "allowed_ips": ["10.0.0.99/32"]}
+    diff = diff_state([], [PEER], [], [drifted])
+    assert diff.add_peers == [PEER]
+    assert diff.remove_peers == []
+
+
+def test_allowed_ips_order_does_not_matter():
+    desired = {**PEER, "allowed_ips": ["10.0.0.5/32", "192.168.1.0/24"]}
+    reported = {**PEER, "allowed_ips": ["192.168.1.0/24", "10.0.0.5/32"]}
+    assert diff_state([], [desired], [], [reported]).empty
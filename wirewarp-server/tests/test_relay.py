@@ -0,0 +1,127 @@
+import asyncio
+import json
+import uuid
+
+from app.services.change_versions import changes
+from app.websocket.relay import INLINE_PAYLOAD_MAX, Relay
+
+
+class Connection:
+    """Stands in for the relay's asyncpg connection: records queries and answers from canned rows."""
+
+    def __init__(self, fetch_rows=(), fetchval=None):
+        self.queries: list[tuple[str, tuple]] = []
+        self.fetch_rows = list(fetch_rows)
+        self.fetchval_result = fetchval
+
+    def is_closed(self) -> bool:
+        return False
+
+    async def execute(self, query, *args):
+        self.queries.append((query, args))
+
+    async def fetch(self, query, *args):
+        self.queries.append((query, args))
+        return self.fetch_rows
+
+    async def fetchval(self, query, *args):
+        self.queries.append((query, args))
+        return self.fetchval_result
+
+    def notified(self) -> list[dict]:
+        return [json.loads(args[1]) for query, args in self.queries if "pg_notify" in query]
+
+
+def relay_with(conn: Connection) -> Relay:
+    relay = Relay()
+    relay._conn = conn
+    return relay
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_small_messages_go_inline():
+    conn = Connection()
+    relay = relay_with(conn)
+    await relay.publish("result", {"command_id": "c1", "success": True, "output": "ok"}, to="w2")
+    assert conn.notified() == [{
+        "op": "result", "from": relay.worker_id, "to": "w2", "command_id": "c1", "success": True, "output": "ok",
+    }]
+
+
+async def test_oversized_messages_go_through_relay_messages():
+    conn = Connection(fetchval=42)
+    relay = relay_with(conn)
+    await relay.publish("dashboard", {"events": ["x" * INLINE_PAYLOAD_MAX]})
+    insert, payload = conn.queries[0]
+    assert insert.startswith("INSERT INTO relay_messages")
+    assert json.loads(payload[0])["events"] == ["x" * INLINE_PAYLOAD_MAX]
+    assert conn.notified() == [{"op": "dashboard", "from": relay.worker_id, "to": None, "ref": 42}]
+
+
+async def test_oversized_message_is_loaded_and_consumed_by_its_addressee():
+    body = {"op": "result", "from": "w1", "to": None, "command_id": "c1", "success": True, "output": "big"}
+    conn = Connection(fetchval=json.dumps(body))
+    relay = relay_with(conn)
+    loaded = await relay._load({"op": "result", "from": "w1", "to": relay.worker_id, "ref": 7})
+    assert loaded == body
+    assert conn.queries[0] == ("DELETE FROM relay_messages WHERE id = $1 RETURNING payload", (7,))
+
+
+async def test_notifications_from_other_workers_are_applied():
+    relay = relay_with(Connection())
+    before = changes.get("port_forwards")
+    payload = json.dumps({"op": "changed", "from": "other", "to": None, "tables": ["port_forwards"]})
+    relay._on_notify(None, 0, "wirewarp_relay", payload)
+    await settle()
+    assert changes.get("port_forwards") == before + 1
+
+
+async def test_own_and_misaddressed_notifications_are_ignored():
+    relay = relay_with(Connection())
+    before = changes.get("port_forwards")
+    for sender, to in ((relay.worker_id, None), ("other", "someone-else")):
+        relay._on_notify(None, 0, "wirewarp_relay", json.dumps(
+            {"op": "changed", "from": sender, "to": to, "tables": ["port_forwards"]}
+        ))
+    relay._on_notify(None, 0, "wirewarp_relay", "not json")
+    await settle()
+    assert changes.get("port_forwards") == before
+
+
+async def test_routes_of_dead_workers_are_pruned():
+    dead_agent = uuid.uuid4()
+    conn = Connection(fetch_rows=[{"agent_id": dead_agent}])
+    relay = relay_with(conn)
+    relay.routes = {str(dead_agent): "dead-worker", "live-agent": "live-worker"}
+    before = changes.get("agents")
+    await relay._prune_dead_routes()
+    assert relay.routes == {"live-agent": "live-worker"}
+    assert changes.get("agents") == before + 1
+    assert "pg_stat_activity" in conn.queries[0][0]
+
+
+async def test_only_etag_tables_are_announced():
+    announced = []
+    changes.on_bump = announced.append
+    try:
+        changes.bump({"command_log", "agent_outbox"})
+        changes.bump({"command_log", "agents"})
+    finally:
+        changes.on_bump = None
+    assert announced == [{"agents"}]
+
+
+async def test_send_to_an_agent_on_another_worker_waits_for_its_ack():
+    conn = Connection()
+    relay = relay_with(conn)
+    relay.routes["agent"] = "owner"
+    send = asyncio.create_task(relay.send("agent", {"type": "ping"}))
+    await settle()
+    [published] = conn.notified()
+    assert (published["op"], published["to"], published["message"]) == ("send", "owner", {"type": "ping"})
+    await relay._dispatch("ack", "owner", {"request": published["request"], "ok": True})
+    assert await send
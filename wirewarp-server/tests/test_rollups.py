@@ -0,0 +1,55 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models.metric_rollup import MetricRollup
+from app.services.rollups import aggregate, bucket_start, pick_resolution
+
+AGENT = uuid.uuid4()
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_pick_resolution_prefers_the_finest_that_fits():
+    assert pick_resolution(START, START + timedelta(hours=2), 500) == "1m"
+    assert pick_resolution(START, START + timedelta(days=7), 500) == "1h"
+    assert pick_resolution(START, START + timedelta(days=90), 500) == "1d"
+    assert pick_resolution(START, START + timedelta(days=3650), 500) == "1d"
+
+
+def test_pick_resolution_boundary_is_inclusive():
+    assert pick_resolution(START, START + timedelta(minutes=500), 500) == "1m"
+    assert pick_resolution(START, START + timedelta(minutes=501), 500) == "1h"
+
+
+def test_naive_timestamps_bucket_as_utc():
+    ts = datetime(2026, 1, 1, 13, 45, 30)
+    assert bucket_start(ts, "1m") == datetime(2026, 1, 1, 13, 45, tzinfo=timezone.utc)
+    assert bucket_start(ts, "1h") == datetime(2026, 1, 1, 13, tzinfo=timezone.utc)
+    assert bucket_start(ts, "1d") == START
+
+
+def test_aggregate_folds_samples_into_each_resolution():
+    batch = [
+        (AGENT, START + timedelta(seconds=10), {"system": {"cpu_percent": 10, "mem_used_mb": "n/a"}}),
+        (AGENT, START + timedelta(seconds=40), {"system": {"cpu_percent": 30}}),
+        (AGENT, START + timedelta(minutes=5), {}),
+    ]
+    peers = [[{"rx_delta": 100, "tx_delta": 1}], [{"rx_delta": 50, "tx_delta": 2}], []]
+    rows = {(r["resolution"], r["bucket"]): r for r in aggregate(batch, peers)}
+    assert len(rows) == 4  # two 1m buckets, one 1h, one 1d
+
+    minute = rows[("1m", START)]
+    assert (minute["samples"], minute["rx_bytes"], minute["tx_bytes"]) == (2, 150, 3)
+    assert (minute["cpu_min"], minute["cpu_max"], minute["cpu_sum"], minute["cpu_count"]) == (10, 30, 40, 2)
+    assert minute["mem_count"] == 0 and minute["mem_min"] is None
+
+    day = rows[("1d", START)]
+    assert day["samples"] == 3 and day["cpu_count"] == 2
+
+
+def test_rows_fit_the_rollup_table():
+    rows = aggregate([(AGENT, START, {"system": {"disk_used_percent": 50.0}})], [[]])
+    sql = str(insert(MetricRollup).values(rows).compile(dialect=postgresql.dialect()))
+    assert "INSERT INTO metric_rollups" in sql
@@ -0,0 +1,65 @@
+import asyncio
+
+from app.services.single_flight import SingleFlight
+
+
+async def test_concurrent_reads_share_one_load():
+    cache = SingleFlight(ttl=60)
+    release = asyncio.Event()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return b"[]"
+
+    readers = [asyncio.create_task(cache.get("agents", "v1", load)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*readers) == [b"[]"] * 3
+    assert calls == 1
+    assert (cache.loads, cache.shared) == (1, 2)
+
+
+async def test_new_version_misses_the_cache():
+    cache = SingleFlight(ttl=60)
+    versions = iter(["first", "second"])
+
+    async def load():
+        return next(versions)
+
+    assert await cache.get("agents", "v1", load) == "first"
+    assert await cache.get("agents", "v1", load) == "first"
+    assert await cache.get("agents", "v2", load) == "second"
+    assert cache.hits == 1
+
+
+async def test_cancelled_caller_does_not_cancel_the_load():
+    cache = SingleFlight(ttl=60)
+    release = asyncio.Event()
+
+    async def load():
+        await release.wait()
+        return "rows"
+
+    leaving = asyncio.create_task(cache.get("agents", "v1", load))
+    staying = asyncio.create_task(cache.get("agents", "v1", load))
+    await asyncio.sleep(0)
+    leaving.cancel()
+    release.set()
+    assert await staying == "rows"
+
+
+async def test_full_cache_evicts_the_oldest_fresh_entry():
+    cache = SingleFlight(ttl=60, max_entries=2)
+
+    async def load():
+        return "rows"
+
+    for key in ("a", "b", "c"):
+        await cache.get(key, "v1", load)
+    await cache.get("c", "v1", load)
+    assert (cache.loads, cache.hits) == (3, 1)
+    await cache.get("a", "v1", load)
+    assert (cache.loads, cache.hits) == (4, 1)
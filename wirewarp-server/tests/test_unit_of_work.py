@@ -0,0 +1,114 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app.websocket.unit_of_work import AgentContext, UnitOfWork, next_batch
+
+
+class Savepoint:
+    def __init__(self, db):
+        self.db = db
+        self.is_active = True
+
+    async def commit(self):
+        self.is_active = False
+        self.db.log.append("release")
+
+    async def rollback(self):
+        self.is_active = False
+        self.db.log.append("rollback to savepoint")
+
+
+class Session:
+    """Records the transaction calls a UnitOfWork makes."""
+
+    def __init__(self):
+        self.log: list[str] = []
+        self.savepoint: Savepoint | None = None
+        self.gets = 0
+
+    async def begin_nested(self):
+        self.log.append("savepoint")
+        self.savepoint = Savepoint(self)
+        return self.savepoint
+
+    async def commit(self):
+        self.log.append("commit")
+        if self.savepoint is not None:
+            self.savepoint.is_active = False
+
+    async def rollback(self):
+        self.log.append("rollback")
+
+    async def get(self, model, key):
+        self.gets += 1
+        return SimpleNamespace(id=key)
+
+
+def unit_of_work() -> tuple[UnitOfWork, Session]:
+    db = Session()
+    return UnitOfWork(AgentContext(SimpleNamespace(id=uuid.uuid4(), type="server")), db), db
+
+
+async def test_next_batch_takes_everything_buffered_up_to_the_limit():
+    inbox: asyncio.Queue = asyncio.Queue()
+    for i in range(5):
+        inbox.put_nowait(i)
+    assert await next_batch(inbox, 3) == [0, 1, 2]
+    assert await next_batch(inbox, 3) == [3, 4]
+
+
+async def test_next_batch_waits_for_the_first_frame():
+    inbox: asyncio.Queue = asyncio.Queue()
+    batch = asyncio.create_task(next_batch(inbox, 10))
+    await asyncio.sleep(0)
+    assert not batch.done()
+    inbox.put_nowait("frame")
+    assert await batch == ["frame"]
+
+
+async def test_callbacks_run_only_after_the_batch_commits():
+    uow, db = unit_of_work()
+    calls = []
+    uow.after_commit(lambda: calls.append(db.log[-1]))
+    assert calls == []
+    await uow.commit()
+    assert calls == ["commit"]
+
+
+async def test_failing_frame_rolls_back_only_its_savepoint():
+    uow, db = unit_of_work()
+    calls = []
+    async with uow.isolated():
+        uow.after_commit(lambda: calls.append("first"))
+    async with uow.isolated():
+        uow.after_commit(lambda: calls.append("second"))
+        raise RuntimeError("bad frame")
+    await uow.commit()
+    assert db.log == ["savepoint", "release", "savepoint", "rollback to savepoint", "commit"]
+    assert calls == ["first"]
+
+
+async def test_failure_after_a_mid_frame_commit_rolls_back_the_session():
+    uow, db = unit_of_work()
+    async with uow.isolated():
+        await db.commit()  # a command was sent, committing the batch so far
+        raise RuntimeError("bad frame")
+    assert db.log == ["savepoint", "commit", "rollback"]
+
+
+async def test_agent_is_loaded_once_per_batch_and_reloaded_after_a_failure():
+    uow, db = unit_of_work()
+    assert (await uow.agent()).id == uow.ctx.id
+    await uow.agent()
+    assert db.gets == 1
+    async with uow.isolated():
+        raise RuntimeError("bad frame")
+    await uow.agent()
+    assert db.gets == 2
+
+
+async def test_get_ignores_malformed_ids():
+    uow, db = unit_of_work()
+    assert await uow.get(object, "not-a-uuid") is None
+    assert db.gets == 0
@@ -0,0 +1,34 @@
+import numpy as np
+
+from app.services.wg_peers import counter_delta, handshake_time, peer_counters
+
+
+def test_peer_counters_skips_malformed_entries():
+    peers = [
+        {"public_key": "a=", "rx_bytes": "10", "tx_bytes": 20},
+        {"public_key": "b=", "rx_bytes": "not a number"},
+        {"rx_bytes": 1},
+        "garbage",
+        {"public_key": "c="},
+    ]
+    assert [(k, rx, tx) for k, rx, tx, _ in peer_counters(peers)] == [("a=", 10, 20), ("c=", 0, 0)]
+    assert list(peer_counters(None)) == []
+
+
+def test_counter_delta_counts_a_reset_counter_from_zero():
+    assert counter_delta(150, 100) == 50
+    assert counter_delta(30, 100) == 30
+
+
+def test_counter_delta_is_elementwise_on_arrays():
+    current = np.array([150, 30], dtype=np.int64)
+    previous = np.array([100, 100], dtype=np.int64)
+    assert counter_delta(current, previous).tolist() == [50, 30]
+
+
+def test_handshake_time():
+    assert handshake_time("2026-01-01T00:00:00Z").year == 2026
+    assert handshake_time("0001-01-01T00:00:00Z") is None
+    assert handshake_time("1970-01-01T00:00:00Z") is None
+    assert handshake_time("yesterday") is None
+    assert handshake_time(None) is None
@@ -1,5 +1,7 @@
+import { useEffect } from 'react'
 import { NavLink, Outlet, useNavigate } from 'react-router-dom'
-import { clearToken } from '../lib/api'
+import { clearToken, getToken } from '../lib/api'
+import { connectWS, disconnectWS } from '../lib/websocket'
 
 const links = [
   { to: '/', label: 'Dashboard' },
@@ -13,7 +15,14 @@ const links = [
 export default function Layout() {
   const navigate = useNavigate()
 
+  useEffect(() => {
+    const token = getToken()
+    if (token) connectWS(token)
+    return disconnectWS
+  }, [])
+
   function logout() {
+    disconnectWS()
     clearToken()
     navigate('/login')
   }
@@ -1,6 +1,6 @@
 const API_BASE = '/api'
 
-function getToken(): string | null {
+export function getToken(): string | null {
   return localStorage.getItem('token')
 }
 
@@ -16,7 +16,7 @@ export function isAuthenticated(): boolean {
   return !!getToken()
 }
 
-async function request<T>(path: string, options: RequestInit = {}): Promise<T> {
+async function send(path: string, options: RequestInit = {}): Promise<Response> {
   const token = getToken()
   const headers: Record<string, string> = {
     'Content-Type': 'application/json',
@@ -39,10 +39,28 @@ async function request<T>(path: string, options: RequestInit = {}): Promise<T> {
     throw new Error(`${res.status}: ${body}`)
   }
 
+  return res
+}
+
+async function request<T>(path: string, options: RequestInit = {}): Promise<T> {
+  const res = await send(path, options)
   if (res.status === 204) return undefined as T
   return res.json()
 }
 
+// List endpoints are keyset-paginated; follow X-Next-Cursor until the last page
+async function requestAll<T>(path: string): Promise<T[]> {
+  const rows: T[] = []
+  let cursor: string | null = null
+  do {
+    const sep = path.includes('?') ? '&' : '?'
+    const res = await send(cursor ? `${path}${sep}cursor=${encodeURIComponent(cursor)}` : path)
+    rows.push(...((await res.json()) as T[]))
+    cursor = res.headers.get('X-Next-Cursor')
+  } while (cursor)
+  return rows
+}
+
 // Auth
 export const auth = {
   login: (username: string, password: string) =>
@@ -55,7 +73,7 @@ export const auth = {
 
 // Agents
 export const agents = {
-  list: () => request<import('./types').Agent[]>('/agents'),
+  list: () => requestAll<import('./types').Agent>('/agents'),
   get: (id: string) => request<import('./types').Agent>(`/agents/${id}`),
   del: (id: string) => request<void>(`/agents/${id}`, { method: 'DELETE' }),
   createToken: (agent_type: string) =>
@@ -71,7 +89,7 @@ export const agents = {
 
 // Tunnel Servers
 export const tunnelServers = {
-  list: () => request<import('./types').TunnelServer[]>('/tunnel-servers'),
+  list: () => requestAll<import('./types').TunnelServer>('/tunnel-servers'),
   get: (id: string) => request<import('./types').TunnelServer>(`/tunnel-servers/${id}`),
   update: (id: string, data: Record<string, unknown>) =>
     request<import('./types').TunnelServer>(`/tunnel-servers/${id}`, {
@@ -83,7 +101,7 @@ export const tunnelServers = {
 
 // Tunnel Clients
 export const tunnelClients = {
-  list: () => request<import('./types').TunnelClient[]>('/tunnel-clients'),
+  list: () => requestAll<import('./types').TunnelClient>('/tunnel-clients'),
   get: (id: string) => request<import('./types').TunnelClient>(`/tunnel-clients/${id}`),
   update: (id: string, data: Record<string, unknown>) =>
     request<import('./types').TunnelClient>(`/tunnel-clients/${id}`, {
@@ -96,7 +114,7 @@ export const tunnelClients = {
 // Port Forwards
 export const portForwards = {
   list: (tunnelServerId?: string) =>
-    request<import('./types').PortForward[]>(
+    requestAll<import('./types').PortForward>(
       `/port-forwards${tunnelServerId ? `?tunnel_server_id=${tunnelServerId}` : ''}`
     ),
   create: (data: Record<string, unknown>) =>
@@ -1,35 +1,78 @@
 import { create } from 'zustand'
+import { queryClient } from './queryClient'
 import type { Agent } from './types'
 
+export interface CommandResult {
+  command_id: string
+  agent_id: string
+  command_type: string | null
+  success: boolean | null
+  output: string | null
+}
+
+type DashboardEvent =
+  | ({ type: 'agent_status' } & Partial<Agent> & { id: string })
+  | { type: 'agent_removed'; id: string }
+  | ({ type: 'command_result' } & CommandResult)
+  | { type: 'port_forward'; id: string; op: 'created' | 'updated' | 'deleted' }
+
+const MAX_COMMAND_RESULTS = 50
+
 interface WSState {
-  agents: Map<string, Agent>
   connected: boolean
-  updateAgent: (agent: Agent) => void
-  setAgents: (agents: Agent[]) => void
+  commandResults: CommandResult[]
+  addCommandResult: (result: CommandResult) => void
 }
 
 export const useWSStore = create<WSState>((set) => ({
-  agents: new Map(),
   connected: false,
-  updateAgent: (agent) =>
-    set((s) => {
-      const next = new Map(s.agents)
-      next.set(agent.id, agent)
-      return { agents: next }
-    }),
-  setAgents: (agents) =>
-    set(() => {
-      const m = new Map<string, Agent>()
-      for (const a of agents) m.set(a.id, a)
-      return { agents: m }
-    }),
+  commandResults: [],
+  addCommandResult: (result) =>
+    set((s) => ({ commandResults: [result, ...s.commandResults].slice(0, MAX_COMMAND_RESULTS) })),
 }))
 
+function applyAgentStatus({ type: _, ...patch }: Extract<DashboardEvent, { type: 'agent_status' }>) {
+  let known = false
+  queryClient.setQueryData<Agent[]>(['agents'], (list) => {
+    if (!list) return list
+    return list.map((a) => {
+      if (a.id !== patch.id) return a
+      known = true
+      return { ...a, ...patch }
+    })
+  })
+  queryClient.setQueryData<Agent>(['agent', patch.id], (agent) => (agent ? { ...agent, ...patch } : agent))
+  // A newly registered agent is not in the cached list yet
+  if (!known) queryClient.invalidateQueries({ queryKey: ['agents'] })
+}
+
+function handleEvent(event: DashboardEvent) {
+  switch (event.type) {
+    case 'agent_status':
+      applyAgentStatus(event)
+      break
+    case 'agent_removed':
+      queryClient.setQueryData<Agent[]>(['agents'], (list) => list?.filter((a) => a.id !== event.id))
+      queryClient.removeQueries({ queryKey: ['agent', event.id] })
+      break
+    case 'command_result': {
+      const { type: _, ...result } = event
+      useWSStore.getState().addCommandResult(result)
+      break
+    }
+    case 'port_forward':
+      queryClient.invalidateQueries({ queryKey: ['port-forwards'] })
+      break
+  }
+}
+
 let ws: WebSocket | null = null
 let reconnectTimer: ReturnType<typeof setTimeout> | null = null
+let stopped = false
 
 export function connectWS(token: string) {
   if (ws) return
+  stopped = false
 
   const proto = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
   const url = `${proto}//${window.location.host}/ws/dashboard?token=${encodeURIComponent(token)}`
@@ -38,23 +81,30 @@ export function connectWS(token: string) {
 
   ws.onopen = () => {
     useWSStore.setState({ connected: true })
+    // Anything that changed while disconnected was not pushed
+    queryClient.invalidateQueries({ queryKey: ['agents'] })
+    queryClient.invalidateQueries({ queryKey: ['agent'] })
+    queryClient.invalidateQueries({ queryKey: ['port-forwards'] })
   }
 
   ws.onmessage = (ev) => {
     try {
       const msg = JSON.parse(ev.data)
-      if (msg.type === 'agent_status') {
-        useWSStore.getState().updateAgent(msg.agent)
+      if (msg.type === 'batch') {
+        for (const event of msg.events as DashboardEvent[]) handleEvent(event)
       }
     } catch {
       // ignore non-JSON messages
     }
   }
 
-  ws.onclose = () => {
+  ws.onclose = (ev) => {
     ws = null
     useWSStore.setState({ connected: false })
-    reconnectTimer = setTimeout(() => connectWS(token), 5000)
+    // 4401: the token was rejected; polling takes over until the next login
+    if (!stopped && ev.code !== 4401) {
+      reconnectTimer = setTimeout(() => connectWS(token), 5000)
+    }
   }
 
   ws.onerror = () => {
@@ -63,6 +113,7 @@ export function connectWS(token: string) {
 }
 
 export function disconnectWS() {
+  stopped = true
   if (reconnectTimer) clearTimeout(reconnectTimer)
   ws?.close()
   ws = null
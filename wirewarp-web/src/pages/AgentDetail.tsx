@@ -3,17 +3,20 @@ import { useParams, useNavigate } from 'react-router-dom'
 import { useQuery, useMutation } from '@tanstack/react-query'
 import { agents } from '../lib/api'
 import StatusBadge from '../components/StatusBadge'
+import { useWSStore } from '../lib/websocket'
 
 export default function AgentDetail() {
   const { id } = useParams<{ id: string }>()
   const navigate = useNavigate()
   const [jwtModal, setJwtModal] = useState<string | null>(null)
   const [copied, setCopied] = useState(false)
+  // Pushed over /ws/dashboard while connected; poll only as a fallback
+  const live = useWSStore((s) => s.connected)
 
   const { data: agent, isLoading } = useQuery({
     queryKey: ['agent', id],
     queryFn: () => agents.get(id!),
-    refetchInterval: 5000,
+    refetchInterval: live ? false : 5000,
   })
 
   const deleteAgent = useMutation({
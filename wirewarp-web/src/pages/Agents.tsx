@@ -3,10 +3,13 @@ import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
 import { agents, settings } from '../lib/api'
 import { Link } from 'react-router-dom'
 import StatusBadge from '../components/StatusBadge'
+import { useWSStore } from '../lib/websocket'
 
 export default function Agents() {
   const qc = useQueryClient()
-  const { data: agentList = [] } = useQuery({ queryKey: ['agents'], queryFn: agents.list, refetchInterval: 5000 })
+  // Pushed over /ws/dashboard while connected; poll only as a fallback
+  const live = useWSStore((s) => s.connected)
+  const { data: agentList = [] } = useQuery({ queryKey: ['agents'], queryFn: agents.list, refetchInterval: live ? false : 5000 })
   const { data: appSettings } = useQuery({ queryKey: ['settings'], queryFn: settings.get })
 
   const [showModal, setShowModal] = useState(false)
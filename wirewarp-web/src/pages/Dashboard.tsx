@@ -2,9 +2,12 @@ import { useQuery } from '@tanstack/react-query'
 import { agents, portForwards } from '../lib/api'
 import StatusBadge from '../components/StatusBadge'
 import { Link } from 'react-router-dom'
+import { useWSStore } from '../lib/websocket'
 
 export default function Dashboard() {
-  const { data: agentList = [] } = useQuery({ queryKey: ['agents'], queryFn: agents.list, refetchInterval: 5000 })
+  // Pushed over /ws/dashboard while connected; poll only as a fallback
+  const live = useWSStore((s) => s.connected)
+  const { data: agentList = [] } = useQuery({ queryKey: ['agents'], queryFn: agents.list, refetchInterval: live ? false : 5000 })
   const { data: pfList = [] } = useQuery({ queryKey: ['port-forwards'], queryFn: () => portForwards.list() })
 
   const connected = agentList.filter((a) => a.status === 'connected').length